@@ -0,0 +1,125 @@
+"""
+ブラウザのメモリ使用量ベンチマーク
+
+従来の起動オプション (legacy) と省メモリモード (lean) で Chrome を起動してページを開き、
+プロセスグループ (chromedriver + Chrome) の RSS を一定時間サンプリングして比較します。
+結果は output/benchmarks/browser_memory.jsonl に追記します。
+
+    - startup_ms: WebDriver の起動 (Chrome の起動を含む) にかかった時間
+    - steady_mb:  ページ読み込み後、サンプリング期間の最後の RSS
+    - peak_mb:    サンプリング期間中の最大 RSS
+    - processes:  プロセス数 (最後のサンプル)
+
+Usage:
+    PYTHONPATH=. python benchmarks/browser_memory.py [--runs 3] [--url URL] [--limit-mb 512]
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from datetime import datetime
+
+from src.config import settings as config
+from src.core import browser_tuning
+from src.core.browser_registry import kill_process_group, process_group_rss
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULT_FILE = os.path.join(ROOT, "output", "benchmarks", "browser_memory.jsonl")
+MB = 1024 * 1024
+
+
+def measure_once(lean: bool, url: str, settle_sec: float, limit_mb):
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    class LimitedService(Service):
+        # Chrome を起動する前の chromedriver に上限を設定する (TouchOnTimeAutomator と同じ方法)
+        cgroup = None
+
+        def start(self):
+            super().start()
+            if lean and limit_mb:
+                self.cgroup = browser_tuning.apply_memory_limit(self.process.pid, limit_mb)
+
+    options = Options()
+    for argument in browser_tuning.chrome_arguments(headless=True, lean=lean):
+        options.add_argument(argument)
+    service = LimitedService(ChromeDriverManager().install(), popen_kw={"start_new_session": True})
+
+    started = time.perf_counter()
+    driver = webdriver.Chrome(service=service, options=options)
+    startup_ms = (time.perf_counter() - started) * 1000
+    pgid, cgroup = service.process.pid, service.cgroup
+    try:
+        driver.get(url)
+        peak, processes, rss = 0, 0, 0
+        deadline = time.monotonic() + settle_sec
+        while time.monotonic() < deadline:
+            processes, rss = process_group_rss(pgid)
+            peak = max(peak, rss)
+            time.sleep(0.2)
+        return {
+            "startup_ms": startup_ms,
+            "steady_mb": rss / MB,
+            "peak_mb": peak / MB,
+            "processes": processes,
+            **({"cgroup_peak_mb": browser_tuning.cgroup_memory(cgroup).get("peak", 0) / MB} if cgroup else {}),
+        }
+    finally:
+        try:
+            driver.quit()
+        finally:
+            kill_process_group(pgid)
+            browser_tuning.remove_cgroup(cgroup)
+
+
+def summarize(samples):
+    keys = samples[0].keys()
+    return {key: round(statistics.median(s[key] for s in samples), 1) for key in keys}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ブラウザのメモリ使用量ベンチマーク (legacy / lean)")
+    parser.add_argument("--runs", type=int, default=3, help="構成ごとの計測回数")
+    parser.add_argument("--url", default=config.TOUCH_ON_TIME_URL, help="読み込むページ")
+    parser.add_argument("--settle", type=float, default=5.0, help="ページ読み込み後にサンプリングする秒数")
+    parser.add_argument("--limit-mb", type=int, default=None, help="lean 構成に適用するメモリ上限 (MB)")
+    args = parser.parse_args()
+
+    record = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "url": args.url,
+        "runs": args.runs,
+        "limit_mb": args.limit_mb,
+        "configs": {},
+    }
+    for name, lean in (("legacy", False), ("lean", True)):
+        try:
+            samples = [measure_once(lean, args.url, args.settle, args.limit_mb) for _ in range(args.runs)]
+        except Exception as e:
+            print(f"{name:>7}: failed ({e})")
+            record["configs"][name] = None
+            continue
+        stats = summarize(samples)
+        record["configs"][name] = stats
+        print(
+            f"{name:>7}: steady {stats['steady_mb']:7.1f} MB  peak {stats['peak_mb']:7.1f} MB  "
+            f"processes {stats['processes']:.0f}  startup {stats['startup_ms']:.0f} ms"
+        )
+
+    legacy, lean = record["configs"].get("legacy"), record["configs"].get("lean")
+    if legacy and lean and legacy["steady_mb"]:
+        saved = legacy["steady_mb"] - lean["steady_mb"]
+        print(f"lean saves {saved:.1f} MB per browser ({saved / legacy['steady_mb'] * 100:.0f}%)")
+
+    os.makedirs(os.path.dirname(RESULT_FILE), exist_ok=True)
+    with open(RESULT_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"Saved: {os.path.relpath(RESULT_FILE, ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
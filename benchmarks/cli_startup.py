@@ -0,0 +1,94 @@
+"""
+CLI 起動時間ベンチマーク
+
+新しいインタプリタで以下を繰り返し計測し、結果を output/benchmarks/cli_startup.jsonl に追記します。
+前回の記録との差分も表示するため、変更ごとに実行すると起動時間の推移を追跡できます。
+
+    - help:    entrypoint.py --help (引数解析のみの経路)
+    - usecase: import src.core.usecase (打刻実行経路の import コスト)
+
+Usage:
+    PYTHONPATH=. python benchmarks/cli_startup.py [--runs 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULT_FILE = os.path.join(ROOT, "output", "benchmarks", "cli_startup.jsonl")
+
+CASES = {
+    "help": [sys.executable, "src/interfaces/cli/entrypoint.py", "--help"],
+    "usecase": [sys.executable, "-c", "import src.core.usecase"],
+}
+
+
+def measure(cmd, runs: int):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True)
+        samples.append((time.perf_counter() - started) * 1000)
+        if result.returncode != 0:
+            return None
+    return {
+        "median_ms": round(statistics.median(samples), 1),
+        "min_ms": round(min(samples), 1),
+        "max_ms": round(max(samples), 1),
+    }
+
+
+def git_revision() -> str:
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+    return result.stdout.strip() or "unknown"
+
+
+def last_record():
+    if not os.path.exists(RESULT_FILE):
+        return None
+    with open(RESULT_FILE, encoding="utf-8") as f:
+        lines = [line for line in f if line.strip()]
+    return json.loads(lines[-1]) if lines else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CLI 起動時間ベンチマーク")
+    parser.add_argument("--runs", type=int, default=10, help="ケースごとの計測回数")
+    args = parser.parse_args()
+
+    previous = last_record()
+    record = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "cases": {},
+    }
+
+    for name, cmd in CASES.items():
+        stats = measure(cmd, args.runs)
+        record["cases"][name] = stats
+        if stats is None:
+            print(f"{name:>8}: failed (依存ライブラリが不足している可能性があります)")
+            continue
+        line = f"{name:>8}: median {stats['median_ms']:7.1f} ms  (min {stats['min_ms']:.1f} / max {stats['max_ms']:.1f})"
+        before = (previous or {}).get("cases", {}).get(name)
+        if before:
+            diff = stats["median_ms"] - before["median_ms"]
+            line += f"  [{diff:+.1f} ms vs {previous['revision']}]"
+        print(line)
+
+    os.makedirs(os.path.dirname(RESULT_FILE), exist_ok=True)
+    with open(RESULT_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"Saved: {os.path.relpath(RESULT_FILE, ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""
+同時打刻の負荷試験
+
+ローカルに Touch On Time の代役サイト (ログイン画面と打刻ボタンだけの HTML) を起動し、
+実際の BackgroundScheduler + JobService の経路で合成ジョブを同じ時刻に予約して実行します。
+同時実行数 (スケジューラのワーカー数) を段階的に増やし、段階ごとに以下を記録します。
+
+    - throughput_per_sec: 成功したジョブ数 / (最後のクリック - 予約時刻)
+    - latency_p50/p95/p99_sec: 予約時刻から代役サイトがクリックを受け取るまでの秒数
+    - lag_p50/p95_sec: 予約時刻からジョブが実行され始めるまでの秒数 (ワーカー待ち)
+    - peak_rss_mb: このプロセスと起動中のブラウザの RSS 合計の最大値
+    - failure_rate: 失敗したジョブの割合 (errors にエラー種別ごとの件数)
+
+打刻は本番モード (クリックする) で実行しますが、settings.TOUCH_ON_TIME_URL を代役サイトに向け、
+ジョブごとに別のアカウント名と一時ディレクトリの打刻記録・実行履歴を使うため、実際のサイトや
+通常の状態ファイルには影響しません。ログイン数の制限 (settings.LOGIN_MAX_CONCURRENCY など) は通常どおり適用されます。
+結果は output/benchmarks/loadtest.jsonl に追記し、SLO を満たす最大の同時実行数を容量の目安として表示します。
+
+Usage:
+    PYTHONPATH=. python benchmarks/loadtest.py [--levels 1,2,4,8] [--jobs 8] [--slo-sec 30]
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.config import settings as config
+from src.core import resilience
+from src.core.browser_registry import get_browser_registry
+from src.core.resilience import IdempotencyStore, RetryPolicy
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULT_FILE = os.path.join(ROOT, "output", "benchmarks", "loadtest.jsonl")
+MB = 1024 * 1024
+SITE_PATH = "/independent/recorder/personal/"
+
+# TouchOnTimeAutomator が使う要素 (#id, #password, OK ボタン, .record-clock-in / .record-clock-out) だけを持つ画面
+STAND_IN_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>stand-in recorder</title></head>
+<body>
+<div id="login">
+  <input type="text" id="id"><input type="password" id="password">
+  <div class="btn-control-message" onclick="login()">OK</div>
+</div>
+<div id="main" style="display:none">
+  <div class="record-btn-inner record-clock-in" onclick="record('in')">出勤</div>
+  <div class="record-btn-inner record-clock-out" onclick="record('out')">退勤</div>
+</div>
+<script>
+var user = "";
+function login() {
+  user = document.getElementById("id").value;
+  document.getElementById("login").style.display = "none";
+  document.getElementById("main").style.display = "block";
+}
+function record(type) {
+  fetch("/record", {method: "POST", body: JSON.stringify({user: user, type: type})});
+}
+</script>
+</body></html>
+"""
+
+
+class StandInSite:
+    """代役サイト。クリック (POST /record) を受け取った時刻をユーザーごとに記録します"""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.clicks = {}
+        self._lock = threading.Lock()
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if latency_ms:
+                    time.sleep(latency_ms / 1000)
+                body = STAND_IN_PAGE.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                received = time.time()
+                length = int(self.headers.get("Content-Length") or 0)
+                data = json.loads(self.rfile.read(length) or b"{}")
+                with site._lock:
+                    site.clicks.setdefault(data.get("user"), received)
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}{SITE_PATH}"
+
+    def start(self) -> None:
+        threading.Thread(target=self.server.serve_forever, name="stand-in-site", daemon=True).start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def total_rss() -> int:
+    """このプロセスと登録済みブラウザの RSS 合計 (byte, /proc がない環境では 0)"""
+    try:
+        with open("/proc/self/statm") as f:
+            own = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+    return own + get_browser_registry().memory().rss_bytes
+
+
+class RssSampler:
+    """一定間隔で RSS 合計をサンプリングし、最大値を保持します"""
+
+    def __init__(self, interval: float = 0.2):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, total_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def percentile(values, pct: float):
+    """最近傍順位法によるパーセンタイル (values は昇順)"""
+    if not values:
+        return None
+    return values[max(math.ceil(pct / 100 * len(values)) - 1, 0)]
+
+
+def run_level(site: StandInSite, concurrency: int, jobs: int, lead_sec: float, attempts: int, workdir: str):
+    # JobService / APScheduler は selenium などを読み込むため、計測を始めるときに import する
+    from apscheduler.executors.pool import ThreadPoolExecutor
+    from apscheduler.schedulers.background import BackgroundScheduler
+    from src.core.services.job_service import JobService
+    from src.core.services.job_store import JobStore
+
+    # 前の段階の失敗でサーキットブレーカーが開いたままにならないようにする
+    resilience.get_breaker("site").record_success()
+    store = JobStore(os.path.join(workdir, "jobs.db"))
+    idempotency = IdempotencyStore(os.path.join(workdir, f"punch_records_{concurrency}.json"))
+    retry_policy = RetryPolicy(max_attempts=attempts)
+
+    outcomes = {}
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def run_one(account: str) -> None:
+        started = time.time()
+        service = JobService(
+            retry_policy=retry_policy,
+            idempotency=idempotency,
+            store=store,
+            credentials_provider=lambda: {"username": account, "password": "loadtest"},
+        )
+        error = None
+        try:
+            service.run_job("in", False, headless=True, job_id=account, trigger="loadtest", account=account)
+        except Exception as e:
+            error = resilience.classify_error(e)
+        with lock:
+            outcomes[account] = (started, error)
+            if len(outcomes) == jobs:
+                done.set()
+
+    scheduler = BackgroundScheduler(executors={"default": ThreadPoolExecutor(concurrency)})
+    scheduler.start()
+    run_at = datetime.now() + timedelta(seconds=lead_sec)
+    stamp = datetime.now().strftime("%H%M%S")
+    for i in range(jobs):
+        account = f"loadtest_{stamp}_c{concurrency}_{i}"
+        scheduler.add_job(run_one, trigger="date", run_date=run_at, args=[account], id=account, misfire_grace_time=3600)
+
+    # ワーカー数ごとに順番待ちが発生するため、期限は待ちの段数に比例させる
+    timeout = lead_sec + config.JOB_DEADLINE_SEC * math.ceil(jobs / concurrency) + 30
+    with RssSampler() as sampler:
+        finished = done.wait(timeout)
+    scheduler.shutdown(wait=finished)
+
+    trigger = run_at.timestamp()
+    errors = Counter()
+    latencies, lags = [], []
+    for account, (started, error) in outcomes.items():
+        lags.append(started - trigger)
+        if error is None and account not in site.clicks:
+            error = "no_click"
+        if error:
+            errors[error] += 1
+        else:
+            latencies.append(site.clicks[account] - trigger)
+    errors["unfinished"] += jobs - len(outcomes)
+    latencies.sort()
+    lags.sort()
+
+    def seconds(value):
+        return round(value, 3) if value is not None else None
+
+    return {
+        "concurrency": concurrency,
+        "jobs": jobs,
+        "succeeded": len(latencies),
+        "failure_rate": round(1 - len(latencies) / jobs, 3),
+        "errors": {kind: count for kind, count in errors.items() if count},
+        "throughput_per_sec": round(len(latencies) / latencies[-1], 3) if latencies and latencies[-1] > 0 else None,
+        "latency_p50_sec": seconds(percentile(latencies, 50)),
+        "latency_p95_sec": seconds(percentile(latencies, 95)),
+        "latency_p99_sec": seconds(percentile(latencies, 99)),
+        "lag_p50_sec": seconds(percentile(lags, 50)),
+        "lag_p95_sec": seconds(percentile(lags, 95)),
+        "peak_rss_mb": round(sampler.peak / MB, 1),
+    }
+
+
+def fmt(value, width: int, spec: str = ".2f") -> str:
+    return f"{value:>{width}{spec}}" if value is not None else f"{'-':>{width}}"
+
+
+def capacity(levels, slo_sec: float):
+    """失敗がなく p95 が SLO 以内の段階のうち、同時実行数が最大のもの"""
+    passing = [
+        level for level in levels
+        if level["failure_rate"] == 0 and level["latency_p95_sec"] is not None and level["latency_p95_sec"] <= slo_sec
+    ]
+    return max(passing, key=lambda level: level["concurrency"]) if passing else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="同時打刻の負荷試験 (代役サイトに対して実行)")
+    parser.add_argument("--levels", default="1,2,4,8", help="同時実行数 (スケジューラのワーカー数) の段階 (カンマ区切り)")
+    parser.add_argument("--jobs", type=int, default=8, help="段階ごとのジョブ数 (すべて同じ時刻に予約する)")
+    parser.add_argument("--lead", type=float, default=3.0, help="予約から実行までの秒数")
+    parser.add_argument("--attempts", type=int, default=1, help="ジョブの最大試行回数 (既定はリトライなし)")
+    parser.add_argument("--site-latency-ms", type=float, default=0.0, help="代役サイトの応答に加える遅延")
+    parser.add_argument("--slo-sec", type=float, default=30.0, help="予約からクリックまでの p95 の目標秒数")
+    args = parser.parse_args()
+    levels = [int(level) for level in args.levels.split(",") if level.strip()]
+
+    logging.basicConfig(level=logging.ERROR, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    site = StandInSite(args.site_latency_ms)
+    site.start()
+    # 打刻は本番モードで行うため、代役サイト以外に接続しないことを確認してから向け先を変える
+    assert site.url.startswith("http://127.0.0.1:"), site.url
+    config.TOUCH_ON_TIME_URL = site.url
+
+    record = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "jobs": args.jobs,
+        "attempts": args.attempts,
+        "site_latency_ms": args.site_latency_ms,
+        "slo_sec": args.slo_sec,
+        "login_max_concurrency": config.LOGIN_MAX_CONCURRENCY,
+        "baseline_rss_mb": round(total_rss() / MB, 1),
+        "levels": [],
+    }
+    print(f"{'workers':>7} {'ok':>5} {'fail%':>6} {'jobs/s':>7} {'p50':>7} {'p95':>7} {'p99':>7} {'lag p95':>8} {'peak MB':>8}")
+    try:
+        with tempfile.TemporaryDirectory(prefix="loadtest_") as workdir:
+            for concurrency in levels:
+                stats = run_level(site, concurrency, args.jobs, args.lead, args.attempts, workdir)
+                record["levels"].append(stats)
+                print(
+                    f"{concurrency:>7} {stats['succeeded']:>5} {stats['failure_rate'] * 100:>6.1f}"
+                    f" {fmt(stats['throughput_per_sec'], 7)} {fmt(stats['latency_p50_sec'], 7)}"
+                    f" {fmt(stats['latency_p95_sec'], 7)} {fmt(stats['latency_p99_sec'], 7)}"
+                    f" {fmt(stats['lag_p95_sec'], 8)} {stats['peak_rss_mb']:>8.1f}"
+                    + (f"  {stats['errors']}" if stats["errors"] else "")
+                )
+    finally:
+        site.stop()
+
+    best = capacity(record["levels"], args.slo_sec)
+    if best:
+        browsers = min(best["concurrency"], args.jobs)
+        per_browser = (best["peak_rss_mb"] - record["baseline_rss_mb"]) / browsers
+        record["capacity"] = {"concurrency": best["concurrency"], "rss_mb_per_browser": round(per_browser, 1)}
+        print(
+            f"Capacity: {best['concurrency']} concurrent jobs within p95 <= {args.slo_sec:.0f}s "
+            f"({best['throughput_per_sec']} jobs/s, ~{per_browser:.0f} MB per browser)"
+        )
+    else:
+        record["capacity"] = None
+        print(f"Capacity: no level met failure_rate = 0 and p95 <= {args.slo_sec:.0f}s")
+
+    os.makedirs(os.path.dirname(RESULT_FILE), exist_ok=True)
+    with open(RESULT_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    print(f"Saved: {os.path.relpath(RESULT_FILE, ROOT)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -28,4 +28,173 @@ DRY_RUN = True
 # ログ設定
 # -----------------------------------------------------------------------------
 LOG_LEVEL = logging.INFO
-LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# job_id は src.core.logger.ContextFilter が付与する (ジョブ外のログは '-')
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(job_id)s] %(message)s'
+LOG_DIR = "logs"
+
+# 構造化ログモード: True の場合、テキストログに加えて1レコード1行の JSON (app.jsonl) を出力する
+# (Web UI のログ概要・ログ詳細はこのファイルのフィールドで集計・絞り込む)
+LOG_STRUCTURED = True
+
+# ログローテーション
+# LOG_ROTATE_WHEN を指定すると時間ベース ('midnight' など)、None ならサイズベースでローテーションする
+LOG_ROTATE_WHEN = None
+LOG_ROTATE_MAX_BYTES = 5 * 1024 * 1024
+LOG_ROTATE_BACKUP_COUNT = 10
+# ローテーション済みのログを gzip 圧縮する
+LOG_ROTATE_COMPRESS = True
+
+# -----------------------------------------------------------------------------
+# 負荷分散設定
+# -----------------------------------------------------------------------------
+# 同時に Touch On Time へログインできるジョブ数の上限 (プロセス全体)
+LOGIN_MAX_CONCURRENCY = 2
+# ログイン開始レート (トークン/秒) とバースト数
+LOGIN_RATE_PER_SEC = 1.0
+LOGIN_BURST = 2
+
+# 同時に実行できる Bitwarden CLI (bw) プロセス数の上限
+BW_MAX_CONCURRENCY = 1
+BW_RATE_PER_SEC = 2.0
+BW_BURST = 2
+
+# ログイン以外に Touch On Time へ送るリクエスト (時刻同期など) の同時実行数とレート
+SITE_MAX_CONCURRENCY = 1
+SITE_RATE_PER_SEC = 0.2
+SITE_BURST = 1
+
+# -----------------------------------------------------------------------------
+# リトライ・障害対策設定
+# -----------------------------------------------------------------------------
+# 状態ファイル (打刻記録など) の保存先ディレクトリ
+STATE_DIR = "state"
+
+# ジョブ失敗時の最大試行回数 (初回を含む)
+RETRY_MAX_ATTEMPTS = 3
+# 指数バックオフの基準待機秒数と上限
+RETRY_BASE_DELAY_SEC = 5.0
+RETRY_MAX_DELAY_SEC = 60.0
+
+# サーキットブレーカー: 連続失敗がこの回数に達すると一定時間呼び出しを停止する
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_RESET_SEC = 300.0
+
+# -----------------------------------------------------------------------------
+# 期限・タイムアウト設定
+# -----------------------------------------------------------------------------
+# ジョブ全体 (リトライ待機を含む) の期限。超えると実行中のブラウザと bw を終了して打ち切る
+JOB_DEADLINE_SEC = 300.0
+# bw コマンド1回あたりのタイムアウト上限 (ジョブの残り時間の方が短ければそちらを使う)
+BW_TIMEOUT_SEC = 60.0
+# ページ読み込みのタイムアウト上限 (同上)
+PAGE_LOAD_TIMEOUT_SEC = 30.0
+# キャンセル時、ブラウザの正常終了 (quit) を待つ秒数。超えたらブラウザのプロセスグループを強制終了する
+BROWSER_QUIT_TIMEOUT_SEC = 5.0
+
+# -----------------------------------------------------------------------------
+# ブラウザプロセス管理設定
+# -----------------------------------------------------------------------------
+# 異常終了したジョブが残したブラウザ (Chrome / chromedriver) を回収する間隔
+BROWSER_REAP_INTERVAL_SEC = 60.0
+# 起動中のブラウザの RSS 合計がこの値 (MB) を超えたら早期警告を出す
+BROWSER_RSS_ALERT_MB = 1500
+
+# 省メモリモード: 新しいヘッドレスモード、不要な機能の無効化、レンダラー数・JS ヒープの上限
+BROWSER_LEAN = True
+BROWSER_RENDERER_PROCESS_LIMIT = 2
+BROWSER_JS_HEAP_MB = 256
+# 1ブラウザあたりのメモリ上限 (MB, None なら制限しない)
+BROWSER_MEMORY_LIMIT_MB = None
+# memory コントローラが委譲された cgroup v2 のディレクトリ (例: systemd の Delegate=yes なサービスの cgroup)。
+# 指定するとブラウザごとに子 cgroup を作り、プロセス全体の合計を制限する。未指定なら RLIMIT_DATA (プロセスごと)
+BROWSER_CGROUP_PARENT = os.environ.get("TOUCHONTIME_BROWSER_CGROUP") or None
+
+# -----------------------------------------------------------------------------
+# 時刻同期設定
+# -----------------------------------------------------------------------------
+# Touch On Time の応答 (Date ヘッダー) からローカル時計のずれを推定し、予約の実行と時間帯チェックに使う
+TIMESYNC_ENABLED = True
+# 推定値を再利用する秒数 (この間隔でスケジューラが推定し直す)
+TIMESYNC_TTL_SEC = 900.0
+# 1回の推定で送るリクエスト数 (1秒間に分散して送る)
+TIMESYNC_SAMPLES = 8
+TIMESYNC_TIMEOUT_SEC = 5.0
+# ずれがこの秒数を超えたら警告を出す
+TIMESYNC_ALERT_SEC = 2.0
+# 推定値がこの秒数以上変わったら、予約済みジョブの実行時刻を合わせ直す
+TIMESYNC_REALIGN_SEC = 0.5
+
+# -----------------------------------------------------------------------------
+# 事前チェック (カナリア) 設定
+# -----------------------------------------------------------------------------
+# 予約した打刻の前に、認証情報・保管庫・サイト・画面の要素を Dry Run で確認する
+CANARY_ENABLED = True
+# 打刻の何秒前に確認するか
+CANARY_LEAD_SEC = 900.0
+# 打刻までの残りがこの秒数未満なら確認しない (失敗の再確認も打ち切る)
+CANARY_MIN_LEAD_SEC = 120.0
+# 失敗時に再確認する間隔
+CANARY_RETRY_SEC = 120.0
+# 成功した結果を再利用する秒数 (同じ時刻に並んだ予約ごとに確認し直さない)
+CANARY_CACHE_TTL_SEC = 600.0
+# ブラウザでログインし、打刻ボタンの存在まで確認する (False なら HTTP での到達確認のみ)
+CANARY_BROWSER = True
+# 確認全体の期限
+CANARY_DEADLINE_SEC = 120.0
+
+# -----------------------------------------------------------------------------
+# メトリクス設定
+# -----------------------------------------------------------------------------
+# Prometheus テキスト形式の書き出し先 (node_exporter の textfile collector 用, 例: /var/lib/node_exporter/touchontime.prom)。
+# プロセスごとに touchontime.web.prom / touchontime.daemon.prom へ書き出す。未指定なら API の GET /metrics のみ
+METRICS_TEXTFILE = os.environ.get("TOUCHONTIME_METRICS_TEXTFILE") or None
+METRICS_TEXTFILE_INTERVAL_SEC = 15.0
+
+# -----------------------------------------------------------------------------
+# バックグラウンド実行設定
+# -----------------------------------------------------------------------------
+# 「今すぐ実行」を処理するワーカースレッド数
+RUNNER_MAX_WORKERS = 4
+# 完了済みジョブの進捗情報を保持する件数
+RUNNER_HISTORY_SIZE = 50
+
+# プロファイル (--profile / UI の「プロファイルを取得」) の保存先。ジョブごとにサブディレクトリを作る
+PROFILE_DIR = os.path.join("output", "profiles")
+
+# -----------------------------------------------------------------------------
+# ローカル制御 API 設定
+# -----------------------------------------------------------------------------
+# Web UI と同じプロセスで HTTP/JSON API を起動する
+API_ENABLED = True
+# SECURITY: 外部に公開しないよう既定はループバックのみ
+API_HOST = "127.0.0.1"
+API_PORT = 8765
+# 設定した場合、/health 以外は 'Authorization: Bearer <token>' を要求する
+API_TOKEN = os.environ.get("TOUCHONTIME_API_TOKEN") or None
+
+# -----------------------------------------------------------------------------
+# 常駐デーモン設定
+# -----------------------------------------------------------------------------
+# CLI (--daemon) との通信に使う Unix ドメインソケット
+DAEMON_SOCKET = os.path.join(STATE_DIR, "daemon.sock")
+# 待機中ブラウザ (ログイン画面読み込み済み) を作り直すまでの秒数
+DAEMON_BROWSER_MAX_AGE_SEC = 600.0
+
+# -----------------------------------------------------------------------------
+# ランチャー設定
+# -----------------------------------------------------------------------------
+# Web UI (Streamlit) のポート
+WEB_PORT = 8501
+# ランチャーを開いたときにサーバーを自動起動する
+LAUNCHER_AUTO_START = True
+# 起動後、ヘルスチェックが成功するまで待つ最大秒数
+LAUNCHER_READY_TIMEOUT_SEC = 90.0
+# 起動後のヘルスチェック間隔と、再起動までの連続失敗回数
+LAUNCHER_WATCHDOG_INTERVAL_SEC = 5.0
+LAUNCHER_WATCHDOG_FAILURES = 3
+# 無応答でも実行中のジョブ (API の /health の active_jobs) があれば、この秒数まで再起動を待つ
+LAUNCHER_WATCHDOG_DEFER_MAX_SEC = JOB_DEADLINE_SEC + 60.0
+# 再起動の上限 (LAUNCHER_RESTART_WINDOW_SEC 秒あたりの回数) と待機秒数 (回数ごとに倍にする)
+LAUNCHER_MAX_RESTARTS = 3
+LAUNCHER_RESTART_WINDOW_SEC = 3600.0
+LAUNCHER_RESTART_BACKOFF_SEC = 10.0
@@ -1,9 +1,11 @@
 """
 Touch On Time 用 Selenium 自動化モジュール
 """
+import os
 import time
 import logging
-from typing import Optional
+import threading
+from typing import Callable, List, Optional
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -13,18 +15,112 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException, ElementClickInterceptedException
-from webdriver_manager.chrome import ChromeDriverManager
 
 from src.config import settings as config
+from src.core import browser_tuning, metrics
+from src.core.browser_registry import get_browser_registry
+from src.core.context import RunContext, current_job_id
+from src.core.throttle import get_throttle
 
 logger = logging.getLogger(__name__)
 
+class _LimitedService(Service):
+    """起動直後 (Chrome を起動する前) の chromedriver にメモリ上限を設定する Service"""
+
+    cgroup: Optional[str] = None
+
+    def start(self) -> None:
+        super().start()
+        self.cgroup = browser_tuning.apply_memory_limit(self.process.pid)
+
+
 class TouchOnTimeAutomator:
     """Touch On Time 自動打刻クラス"""
 
-    def __init__(self, headless: bool = False):
+    def __init__(
+        self,
+        headless: bool = False,
+        before_click: Optional[Callable[[], None]] = None,
+        context: Optional[RunContext] = None,
+    ):
+        """
+        Args:
+            headless (bool): Trueならブラウザを表示しない
+            before_click (callable, optional): 本番クリック直前に呼び出すフック (二重打刻防止の記録など)。
+                                               例外を送出した場合、クリックは行われません。
+            context (RunContext, optional): ジョブの実行条件。省略時は settings.DRY_RUN に従います。
+        """
         self.driver: Optional[webdriver.Chrome] = None
         self.headless = headless
+        self.before_click = before_click
+        self.context = context
+        self._unregister_cancel: Optional[Callable[[], None]] = None
+        # chromedriver の PID (= ブラウザのプロセスグループID)。BrowserRegistry への登録キー
+        self._driver_pid: Optional[int] = None
+        # preload() でログイン画面を読み込み済みの場合 True (次の login で再読み込みしない)
+        self._preloaded = False
+
+    @property
+    def is_dry_run(self) -> bool:
+        """このジョブがテスト実行か (共有設定ではなくジョブごとのコンテキストを優先)"""
+        if self.context is not None:
+            return self.context.is_dry_run
+        return config.DRY_RUN
+
+    def attach(self, context: Optional[RunContext]) -> None:
+        """
+        ジョブのコンテキストを設定し、キャンセル時にブラウザを強制終了するよう登録します
+        (起動済みのブラウザを別のジョブで使う場合もこれを呼ぶ)
+        """
+        self._detach()
+        self.context = context
+        if self.driver and context and context.cancel_token:
+            self._unregister_cancel = context.cancel_token.register(self._abort)
+
+    def _detach(self) -> None:
+        if self._unregister_cancel:
+            self._unregister_cancel()
+            self._unregister_cancel = None
+
+    def _abort(self) -> None:
+        """
+        キャンセル・期限切れ時に別スレッドから呼ばれます。
+        quit を試み、応答がなければブラウザのプロセスグループを強制終了します。
+        ジョブのスレッドは以降の WebDriver 呼び出しで例外になり、すぐに終了します。
+        """
+        driver, driver_pid = self.driver, self._driver_pid
+        if driver is None:
+            return
+        logger.warning("ジョブが中断されたためブラウザを終了します")
+
+        def quit_driver() -> None:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+        def kill_if_hung() -> None:
+            quitter = threading.Thread(target=quit_driver, daemon=True)
+            quitter.start()
+            quitter.join(config.BROWSER_QUIT_TIMEOUT_SEC)
+            if quitter.is_alive() and driver_pid is not None:
+                logger.warning("ブラウザが応答しないため強制終了します")
+                get_browser_registry().kill(driver_pid)
+
+        # 呼び出し元 (UI・タイマー) を待たせない
+        threading.Thread(target=kill_if_hung, name="browser-abort", daemon=True).start()
+
+    def _budget(self, cap: float) -> float:
+        """待機の上限 cap をジョブの残り時間で切り詰めます (中断すべき場合は例外)"""
+        return self.context.budget(cap) if self.context else cap
+
+    def _wait(self, cap: float) -> WebDriverWait:
+        return WebDriverWait(self.driver, self._budget(cap))
+
+    def _get(self, url: str) -> None:
+        """ページ読み込みのタイムアウトを残り時間に合わせてから開きます"""
+        self.driver.set_page_load_timeout(self._budget(config.PAGE_LOAD_TIMEOUT_SEC))
+        self.driver.get(url)
 
     def __enter__(self):
         self.setup_driver()
@@ -35,21 +131,35 @@ class TouchOnTimeAutomator:
 
     def setup_driver(self) -> None:
         """Selenium WebDriverのセットアップ"""
+        # webdriver_manager (requests などを含む) はドライバ起動時にだけ読み込む
+        from webdriver_manager.chrome import ChromeDriverManager
+
         logger.info("WebDriverを起動しています...")
         chrome_options = Options()
-        if self.headless:
-            chrome_options.add_argument("--headless")
-        
-        # 一般的なオプション
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        
+        # 省メモリモードでは新しいヘッドレスモードと不要機能の無効化を使う (settings.BROWSER_LEAN)
+        for argument in browser_tuning.chrome_arguments(self.headless):
+            chrome_options.add_argument(argument)
+
+        # chromedriver を新しいプロセスグループで起動し、配下の Chrome ごと追跡・終了できるようにする
+        popen_kw = {"start_new_session": True} if os.name == "posix" else {}
+        started = time.perf_counter()
         try:
+            service = _LimitedService(ChromeDriverManager().install(), popen_kw=popen_kw)
             self.driver = webdriver.Chrome(
-                service=Service(ChromeDriverManager().install()),
+                service=service,
                 options=chrome_options
             )
-            self.driver.implicitly_wait(10) # デフォルト待機時間
+            self._driver_pid = service.process.pid
+            get_browser_registry().register(
+                self._driver_pid,
+                job_id=self.context.job_id if self.context else current_job_id(),
+                cgroup=service.cgroup,
+            )
+            # 暗黙的待機は明示的待機 (WebDriverWait) と重なると待ち時間が合算され、
+            # 期限を守れなくなるため使わない
+            self.driver.implicitly_wait(0)
+            self.attach(self.context)
+            metrics.WEBDRIVER_STARTUP_SECONDS.observe(time.perf_counter() - started)
             logger.info("WebDriver起動完了")
         except Exception as e:
             logger.critical(f"WebDriverの起動に失敗しました: {e}")
@@ -57,24 +167,53 @@ class TouchOnTimeAutomator:
 
     def teardown_driver(self) -> None:
         """ブラウザを閉じる"""
-        if self.driver:
+        self._detach()
+        driver, self.driver = self.driver, None
+        if driver:
             logger.info("ブラウザを終了します")
-            self.driver.quit()
-            self.driver = None
+            try:
+                driver.quit()
+            except Exception as e:
+                # キャンセルで強制終了済みの場合など
+                logger.warning(f"ブラウザの終了処理に失敗しました: {e}")
+        if self._driver_pid is not None:
+            # quit 後も残った Chrome のプロセスを終了し、登録を削除する
+            get_browser_registry().release(self._driver_pid)
+            self._driver_pid = None
+
+    def preload(self) -> None:
+        """
+        ログイン画面を事前に読み込みます (常駐デーモンの待機中ブラウザ用)。
+        次回の login() ではページを再読み込みせず、そのまま入力を開始します。
+        """
+        if not self.driver:
+            raise RuntimeError("WebDriverが起動していません")
+        self._get(config.TOUCH_ON_TIME_URL)
+        self._preloaded = True
 
     def login(self, username: str, password: str) -> None:
         """
         Touch On Time 個人画面へのログイン処理
+        同時ログイン数はプロセス全体で制限されます (throttle 'login')
         """
         if not self.driver:
             raise RuntimeError("WebDriverが起動していません")
 
+        with get_throttle("login"):
+            self._login(username, password)
+
+    def _login(self, username: str, password: str) -> None:
+
         target_url = config.TOUCH_ON_TIME_URL
-        logger.info(f"URLにアクセス: {target_url}")
-        self.driver.get(target_url)
+        if self._preloaded:
+            logger.info(f"読み込み済みのログイン画面を使用します: {target_url}")
+            self._preloaded = False
+        else:
+            logger.info(f"URLにアクセス: {target_url}")
+            self._get(target_url)
 
         try:
-            wait = WebDriverWait(self.driver, 15)
+            wait = self._wait(15)
             
             # ID入力フィールド待機 & 入力
             # HTML: <input type="text" id="id" ...>
@@ -121,6 +260,15 @@ class TouchOnTimeAutomator:
                 f.write(self.driver.page_source)
             raise
 
+    def missing_record_buttons(self) -> List[str]:
+        """
+        ログイン後の画面に見つからない打刻ボタンの CSS セレクタを返します (事前チェック用, クリックはしません)
+        """
+        if not self.driver:
+            raise RuntimeError("WebDriverが起動していません")
+        selectors = [f".record-{button_type}" for button_type in ("clock-in", "clock-out")]
+        return [css for css in selectors if not self.driver.find_elements(By.CSS_SELECTOR, css)]
+
     def clock_in(self) -> None:
         """
         出勤打刻処理
@@ -150,12 +298,12 @@ class TouchOnTimeAutomator:
             # クラス名でピンポイントに探す
             target_css = f".record-{button_type}"
             
-            wait = WebDriverWait(self.driver, 10)
+            wait = self._wait(10)
 
             # オーバーレイ（通知メッセージ）がある場合は消えるのを待つ
             try:
                 # notification_contentが表示されている場合、非表示になるまで最大5秒待つ
-                wait_overlay = WebDriverWait(self.driver, 5)
+                wait_overlay = self._wait(5)
                 wait_overlay.until(EC.invisibility_of_element_located((By.ID, "notification_content")))
             except TimeoutException:
                 # タイムアウトしても処理は続行する（次のステップでJSクリックなどでカバー）
@@ -171,12 +319,20 @@ class TouchOnTimeAutomator:
             # -----------------------------------------------------------------
             # CRITICAL SAFETY CHECK
             # -----------------------------------------------------------------
-            if config.DRY_RUN:
+            if self.is_dry_run:
                 logger.warning(f"【DRY_RUN】設定が有効です。実際の{button_label}打刻(クリック)はスキップします。")
                 logger.info("DRY_RUN: Click action skipped.")
                 return
             # -----------------------------------------------------------------
 
+            # ここから先は中断しない (クリック途中でブラウザを終了すると打刻の成否が不明になるため)
+            if self.context:
+                self.context.check()
+            self._detach()
+
+            if self.before_click:
+                self.before_click()
+
             # 本番動作 (親要素あるいはこの要素自体がクリッカブル)
             try:
                 target_button.click()
@@ -190,7 +346,7 @@ class TouchOnTimeAutomator:
             # 完了待機 (リクエスト完了を確実にするため)
             # 固定スリープの代わりに、ページ読み込み完了などの指標を使うのが理想ですが、
             # SPA的な挙動かリロードか不明なため、安全マージンとして短い待機とJS実行完了確認を行う
-            time.sleep(2) 
+            time.sleep(2)
             try:
                 # アラートが出ている場合は受け入れる (成功メッセージなどの可能性があるため)
                 if EC.alert_is_present()(self.driver):
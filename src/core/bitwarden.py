@@ -6,11 +6,35 @@ import json
 import logging
 import os
 import shutil
-from typing import Dict, Optional
+import signal
+import time
+from typing import Dict, List, Optional
+
+from src.config import settings as config
+from src.core import metrics
+from src.core.context import current_run_context
+from src.core.throttle import get_throttle
 
 # ロガーの設定
 logger = logging.getLogger(__name__)
 
+
+class BitwardenError(RuntimeError):
+    """Bitwarden CLI の呼び出しに失敗したことを表す例外"""
+
+def _kill_process_group(proc: subprocess.Popen) -> None:
+    """プロセスとその子プロセスを強制終了します"""
+    if proc.poll() is not None:
+        return
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
 class BitwardenClient:
     """Bitwarden CLI (bw) を操作するクラス"""
 
@@ -37,22 +61,76 @@ class BitwardenClient:
         if not self.session_key and "BW_SESSION" not in os.environ:
             logger.warning("環境変数 'BW_SESSION' が設定されていません。ロック解除が必要な場合があります。")
 
+    def _build_env(self) -> Dict[str, str]:
+        """セッションキーを含む環境変数を準備します"""
+        env = os.environ.copy()
+        if self.session_key:
+            env["BW_SESSION"] = self.session_key
+        return env
+
+    def _run(self, args: List[str], input: Optional[str] = None, check: bool = False, **kwargs) -> subprocess.CompletedProcess:
+        """
+        bw コマンドを実行します。
+        プロセス全体で bw の同時起動数を制限するため、必ずこのメソッドを経由します。
+
+        タイムアウトは settings.BW_TIMEOUT_SEC とジョブの残り時間の小さい方です。
+        ジョブがキャンセルされた場合は bw プロセスを強制終了します。
+
+        Raises:
+            BitwardenError: タイムアウトした場合 (保管庫側の障害として扱う)
+            JobCancelledError: 実行中にジョブがキャンセルされた、または期限を過ぎた場合
+        """
+        ctx = current_run_context()
+        cmd = [self.bw_path, *args]
+        with get_throttle("bitwarden"):
+            timeout = ctx.budget(config.BW_TIMEOUT_SEC) if ctx else config.BW_TIMEOUT_SEC
+            # bw (node) が起動した子プロセスもまとめて終了できるよう、別のプロセスグループで起動する
+            proc = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE if input is not None else None,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                start_new_session=os.name == "posix",
+                **kwargs,
+            )
+            def kill() -> None:
+                _kill_process_group(proc)
+
+            unregister = ctx.cancel_token.register(kill) if ctx and ctx.cancel_token else None
+            started = time.perf_counter()
+            try:
+                stdout, stderr = proc.communicate(input, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                kill()
+                proc.communicate()
+                metrics.BW_SECONDS.observe(time.perf_counter() - started, command=args[0], status="timeout")
+                logger.error(f"bw {args[0]} がタイムアウトしました ({timeout:.1f}秒)")
+                # ジョブの期限切れ・キャンセルによるものはそちらの例外を優先する
+                if ctx:
+                    ctx.check()
+                raise BitwardenError(f"bw {args[0]} がタイムアウトしました ({timeout:.1f}秒)") from None
+            finally:
+                if unregister:
+                    unregister()
+            metrics.BW_SECONDS.observe(
+                time.perf_counter() - started, command=args[0], status="error" if proc.returncode else "ok"
+            )
+
+        if ctx:
+            ctx.check()
+        if check and proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, cmd, stdout, stderr)
+        return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
     def get_status(self) -> str:
         """
         Bitwardenのステータスを取得します ('unlocked', 'locked', 'unauthenticated')
         """
         try:
-            # 環境変数を準備
-            env = os.environ.copy()
-            if self.session_key:
-                env["BW_SESSION"] = self.session_key
-
-            # env=os.environ.copy() はデフォルトの挙動だが、明示的に
-            res = subprocess.run(
-                [self.bw_path, "status"], 
-                capture_output=True, 
-                text=True, 
-                env=env, # 環境変数を渡す
+            res = self._run(
+                ["status"],
+                text=True,
+                env=self._build_env(), # 環境変数を渡す
                 check=True
             )
             data = json.loads(res.stdout)
@@ -78,12 +156,11 @@ class BitwardenClient:
             # note: 一部のCLIは改行を期待するため、念のため付与する
             input_pass = master_password if master_password.endswith('\n') else master_password + '\n'
 
-            proc = subprocess.run(
-                [self.bw_path, "unlock", "--raw"],
+            proc = self._run(
+                ["unlock", "--raw"],
                 input=input_pass,
                 text=True,
                 encoding="utf-8", # [エンコーディング] OSロケール依存防止
-                capture_output=True,
                 check=True
             )
             session_key = proc.stdout.strip()
@@ -92,7 +169,7 @@ class BitwardenClient:
         except subprocess.CalledProcessError as e:
             # エラーメッセージにパスワードが含まれていないか注意 (stdin経由なら通常は含まれない)
             logger.error(f"Failed to unlock: {e.stderr}")
-            raise RuntimeError(f"ロック解除に失敗しました: {e.stderr}")
+            raise BitwardenError(f"ロック解除に失敗しました: {e.stderr}")
 
     def get_login_item(self, item_name_or_id: str) -> Dict[str, str]:
         """
@@ -105,24 +182,16 @@ class BitwardenClient:
             Dict[str, str]: {'username': '...', 'password': '...'}
 
         Raises:
-            RuntimeError: 取得に失敗した場合
+            BitwardenError: 取得に失敗した場合
         """
         logger.info(f"Bitwardenからアイテム '{item_name_or_id}' を取得します...")
 
-        cmd = [self.bw_path, "get", "item", item_name_or_id]
-
         try:
-            # 環境変数を準備
-            env = os.environ.copy()
-            if self.session_key:
-                env["BW_SESSION"] = self.session_key
-
             # 実行
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
+            result = self._run(
+                ["get", "item", item_name_or_id],
                 text=True,
-                env=env,
+                env=self._build_env(),
                 check=True
             )
             
@@ -145,10 +214,10 @@ class BitwardenClient:
         except subprocess.CalledProcessError as e:
             error_msg = e.stderr.strip()
             logger.error(f"Bitwarden CLI エラー: {error_msg}")
-            raise RuntimeError(f"Bitwardenからの取得に失敗しました: {error_msg}")
+            raise BitwardenError(f"Bitwardenからの取得に失敗しました: {error_msg}")
         except json.JSONDecodeError:
             logger.error("Bitwarden CLI の出力をJSONとしてパースできませんでした。")
-            raise RuntimeError("Bitwarden出力のパースエラー")
+            raise BitwardenError("Bitwarden出力のパースエラー")
         except Exception as e:
             logger.error(f"予期せぬエラーが発生しました: {e}")
             raise
@@ -160,18 +229,13 @@ class BitwardenClient:
         """
         logger.info("Bitwarden保管庫を同期しています...")
         try:
-            env = os.environ.copy()
-            if self.session_key:
-                env["BW_SESSION"] = self.session_key
-            
-            subprocess.run(
-                [self.bw_path, "sync"],
-                env=env,
-                check=True,
-                capture_output=True
+            self._run(
+                ["sync"],
+                env=self._build_env(),
+                check=True
             )
             logger.info("同期に成功しました。")
-        except subprocess.CalledProcessError as e:
+        except (subprocess.CalledProcessError, BitwardenError) as e:
             logger.error(f"Sync failed: {e}")
             # 同期失敗は致命的ではない場合もあるが、警告を出す
             logger.warning("保管庫の同期に失敗しましたが、処理を継続します。")
@@ -0,0 +1,416 @@
+"""
+ブラウザプロセスの登録と後始末 (reaper)
+
+chromedriver を新しいプロセスグループで起動し、そのグループID・起動元プロセス・
+配下の Chrome の PID を settings.STATE_DIR/browsers/ に記録します。
+ジョブが異常終了して teardown_driver が呼ばれなかった場合でも、以下の条件で残ったプロセスを終了します。
+
+    - 起動元プロセスが終了している (プロセスごと強制終了された場合など)
+    - chromedriver が終了しているのに Chrome が残っている
+
+起動時と一定間隔 (settings.BROWSER_REAP_INTERVAL_SEC) で確認し、ブラウザが使用しているメモリ (RSS) も集計します。
+プロセス情報は Linux の /proc から読み取ります (/proc がない環境では記録と終了のみ行います)。
+"""
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.config import settings as config
+from src.core import metrics
+from src.core.browser_tuning import remove_cgroup
+
+logger = logging.getLogger(__name__)
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+@dataclass
+class BrowserMemory:
+    """登録済みブラウザのメモリ使用量"""
+    browsers: int
+    processes: int
+    rss_bytes: int
+
+    @property
+    def rss_mb(self) -> float:
+        return round(self.rss_bytes / (1024 * 1024), 1)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {**asdict(self), "rss_mb": self.rss_mb}
+
+
+# -----------------------------------------------------------------------------
+# /proc の読み取り
+# -----------------------------------------------------------------------------
+def _read_stat(pid: int) -> Optional[Tuple[int, int, int, int]]:
+    """
+    /proc/<pid>/stat から (親PID, プロセスグループID, 起動時刻 [clock tick], RSS [byte]) を返します。
+    プロセスが存在しない・読み取れない場合は None。
+    """
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            data = f.read().decode("utf-8", errors="replace")
+    except OSError:
+        return None
+    # comm (2番目の項目) は空白や括弧を含みうるため、最後の ')' より後ろを分割する
+    fields = data[data.rfind(")") + 2:].split()
+    if len(fields) < 22 or fields[0] == "Z":
+        # ゾンビは終了済みとして扱う
+        return None
+    return int(fields[1]), int(fields[2]), int(fields[19]), int(fields[21]) * _PAGE_SIZE
+
+
+def _all_pids() -> List[int]:
+    try:
+        return [int(name) for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return []
+
+
+def _start_time(pid: int) -> Optional[int]:
+    stat = _read_stat(pid)
+    return stat[2] if stat else None
+
+
+def _is_alive(pid: int, start_time: Optional[int]) -> bool:
+    """PID が同じプロセスのまま生きているか (起動時刻で PID の再利用を見分ける)"""
+    if os.path.isdir("/proc"):
+        current = _start_time(pid)
+        return current is not None and (start_time is None or current == start_time)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _descendants(root: int) -> List[int]:
+    """root の子孫プロセスの PID"""
+    children: Dict[int, List[int]] = {}
+    for pid in _all_pids():
+        stat = _read_stat(pid)
+        if stat:
+            children.setdefault(stat[0], []).append(pid)
+    found, stack = [], [root]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            found.append(child)
+            stack.append(child)
+    return found
+
+
+def _group_members(pgid: int) -> List[int]:
+    members = []
+    for pid in _all_pids():
+        stat = _read_stat(pid)
+        if stat and stat[1] == pgid:
+            members.append(pid)
+    return members
+
+
+def process_group_rss(pgid: int) -> Tuple[int, int]:
+    """プロセスグループの (プロセス数, RSS の合計 [byte])"""
+    processes, rss = 0, 0
+    for pid in _group_members(pgid):
+        stat = _read_stat(pid)
+        if stat:
+            processes += 1
+            rss += stat[3]
+    return processes, rss
+
+
+def _is_verified(pid: int, start_time: Optional[int]) -> bool:
+    """記録した起動時刻と一致する (再利用された別プロセスではない) ことを確認できるか"""
+    if os.path.isdir("/proc"):
+        return start_time is not None and _start_time(pid) == start_time
+    # 起動時刻を読めない環境では存在のみで判断する
+    return _is_alive(pid, None)
+
+
+def _in_group(pid: int, pgid: int) -> bool:
+    try:
+        return os.getpgid(pid) == pgid
+    except OSError:
+        return False
+
+
+def kill_process_group(
+    pgid: int,
+    leader_started: Optional[int] = None,
+    pids: Iterable[Tuple[int, Optional[int]]] = (),
+) -> int:
+    """
+    プロセスグループと、記録済みの PID (グループ外に出たもの) を強制終了します。
+
+    登録はOSの再起動をまたいで残るため、グループIDが別のプロセスに再利用されている可能性があります。
+    グループ全体を終了するのは、起動時刻が一致する記録済みのプロセス (chromedriver または Chrome) が
+    まだそのグループにいる場合だけで、それ以外は起動時刻が一致する記録済みの PID だけを終了します。
+
+    Args:
+        pgid (int): プロセスグループID (chromedriver の PID)
+        leader_started (int, optional): chromedriver の起動時刻
+        pids: (PID, 起動時刻) の組
+
+    Returns:
+        int: 終了したプロセス数 (/proc がない環境では概数)
+    """
+    recorded = [(pgid, leader_started), *pids]
+    verified = {pid for pid, started in recorded if _is_verified(pid, started)}
+    same_group = any(_in_group(pid, pgid) for pid in verified)
+    targets = set(_group_members(pgid)) if same_group else set()
+    targets.update(verified)
+    if same_group and os.name == "posix":
+        try:
+            os.killpg(pgid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    for pid in targets:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    return len(targets)
+
+
+def _age(path: str) -> float:
+    try:
+        return time.time() - os.stat(path).st_mtime
+    except OSError:
+        return 0.0
+
+
+# -----------------------------------------------------------------------------
+# 登録簿
+# -----------------------------------------------------------------------------
+class BrowserRegistry:
+    """
+    起動中のブラウザ (chromedriver のプロセスグループ) の登録簿
+
+    1ブラウザ1ファイル (<chromedriver の PID>.json) で記録するため、
+    Web UI・CLI・常駐デーモンの複数プロセスから同時に使えます。
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or os.path.join(config.STATE_DIR, "browsers")
+
+    def _path(self, pgid: int) -> str:
+        return os.path.join(self.directory, f"{pgid}.json")
+
+    def register(self, driver_pid: int, job_id: Optional[str] = None, cgroup: Optional[str] = None) -> None:
+        """
+        起動直後の chromedriver を登録します (配下の Chrome の PID もあわせて記録)
+
+        Args:
+            cgroup (str, optional): メモリ上限用に作成した cgroup (終了時に削除する)
+        """
+        owner = os.getpid()
+        entry = {
+            "pgid": driver_pid,
+            "driver_started": _start_time(driver_pid),
+            "owner_pid": owner,
+            "owner_started": _start_time(owner),
+            "job_id": job_id,
+            "cgroup": cgroup,
+            "registered_at": time.time(),
+            "pids": [[pid, _start_time(pid)] for pid in _descendants(driver_pid)],
+        }
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = self._path(driver_pid) + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp, self._path(driver_pid))
+        except OSError as e:
+            # 記録の失敗で打刻を止めない
+            logger.warning(f"ブラウザの登録に失敗しました: {e}")
+
+    def release(self, driver_pid: int) -> int:
+        """
+        終了処理後に呼び出し、残ったプロセスを終了して登録を削除します。
+
+        Returns:
+            int: 終了させた残存プロセス数
+        """
+        entry = self._load(self._path(driver_pid)) or {}
+        killed = self.kill(driver_pid)
+        self._remove(driver_pid)
+        remove_cgroup(entry.get("cgroup"))
+        if killed:
+            logger.warning(f"ブラウザ終了後に残ったプロセスを終了しました: {killed} 個 (pgid={driver_pid})")
+        return killed
+
+    def kill(self, driver_pid: int) -> int:
+        """ブラウザを強制終了します (キャンセル時)。登録は release() で削除します"""
+        entry = self._load(self._path(driver_pid)) or {}
+        return kill_process_group(driver_pid, entry.get("driver_started"), self._pids(entry))
+
+    @staticmethod
+    def _pids(entry: Dict) -> List[Tuple[int, Optional[int]]]:
+        """記録済みの (PID, 起動時刻)"""
+        return [(int(pid), started) for pid, started in entry.get("pids", [])]
+
+    def _load(self, path: str) -> Optional[Dict]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _remove(self, pgid: int) -> None:
+        try:
+            os.remove(self._path(pgid))
+        except FileNotFoundError:
+            pass
+
+    def entries(self) -> List[Dict]:
+        if not os.path.isdir(self.directory):
+            return []
+        result = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                entry = self._load(os.path.join(self.directory, name))
+                if entry:
+                    result.append(entry)
+        return result
+
+    def _is_orphan(self, entry: Dict) -> bool:
+        if not _is_alive(entry["owner_pid"], entry.get("owner_started")):
+            return True
+        # chromedriver が落ちて Chrome だけが残っている
+        return not _is_alive(entry["pgid"], entry.get("driver_started"))
+
+    def reap(self) -> int:
+        """
+        起動元が終了したブラウザを終了し、登録を削除します。
+
+        Returns:
+            int: 終了させたプロセス数
+        """
+        killed = 0
+        for entry in self.entries():
+            if not self._is_orphan(entry):
+                continue
+            count = kill_process_group(entry["pgid"], entry.get("driver_started"), self._pids(entry))
+            self._remove(entry["pgid"])
+            remove_cgroup(entry.get("cgroup"))
+            killed += count
+            logger.warning(
+                f"残存ブラウザを回収しました: pgid={entry['pgid']} job={entry.get('job_id')} "
+                f"owner={entry['owner_pid']} processes={count}"
+            )
+        self._sweep_cgroups()
+        return killed
+
+    def _sweep_cgroups(self) -> None:
+        """終了直後で削除できなかった (プロセスが残っていた) ブラウザ用 cgroup を削除します"""
+        parent = config.BROWSER_CGROUP_PARENT
+        if not parent or not os.path.isdir(parent):
+            return
+        in_use = {entry.get("cgroup") for entry in self.entries()}
+        for name in os.listdir(parent):
+            path = os.path.join(parent, name)
+            # 作成直後 (登録前) の cgroup は対象外
+            if name.startswith("clockin-browser-") and path not in in_use and _age(path) > 60:
+                remove_cgroup(path)
+
+    def memory(self) -> BrowserMemory:
+        """登録済みブラウザのプロセス数と RSS の合計"""
+        entries = self.entries()
+        tracked: Dict[int, Optional[int]] = {}
+        for entry in entries:
+            for pid in _group_members(entry["pgid"]):
+                tracked[pid] = None
+            for pid, started in self._pids(entry):
+                tracked.setdefault(pid, started)
+        rss = 0
+        processes = 0
+        for pid, started in tracked.items():
+            stat = _read_stat(pid)
+            if stat and (started is None or stat[2] == started):
+                rss += stat[3]
+                processes += 1
+        return BrowserMemory(browsers=len(entries), processes=processes, rss_bytes=rss)
+
+
+_registry: Optional[BrowserRegistry] = None
+_registry_lock = threading.Lock()
+_reaper_started = False
+
+
+def get_browser_registry() -> BrowserRegistry:
+    """プロセス共有の BrowserRegistry を取得します"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = BrowserRegistry()
+        return _registry
+
+
+def ensure_reaper(interval: float = config.BROWSER_REAP_INTERVAL_SEC) -> None:
+    """
+    残存ブラウザを即座に1度回収し、以降は interval 秒ごとに回収するスレッドを起動します (プロセスで1度だけ)。
+    ブラウザの RSS が settings.BROWSER_RSS_ALERT_MB を超えた場合は早期警告を出します。
+    """
+    global _reaper_started
+    with _registry_lock:
+        if _reaper_started:
+            return
+        _reaper_started = True
+
+    registry = get_browser_registry()
+
+    def loop() -> None:
+        alerted = False
+        while True:
+            try:
+                registry.reap()
+                usage = registry.memory()
+                over = usage.rss_mb > config.BROWSER_RSS_ALERT_MB
+                if over and not alerted:
+                    from src.core import resilience
+                    resilience.emit_alert(
+                        "browser_memory",
+                        f"ブラウザが {usage.rss_mb:.0f} MB 使用しています "
+                        f"({usage.browsers} ブラウザ / {usage.processes} プロセス)",
+                        **usage.to_dict(),
+                    )
+                alerted = over
+            except Exception as e:
+                logger.error(f"残存ブラウザの回収に失敗しました: {e}")
+            time.sleep(interval)
+
+    threading.Thread(target=loop, name="browser-reaper", daemon=True).start()
+
+
+# 起動中のブラウザの数とメモリ (記録はせず、メトリクスの書き出し時に /proc から読み取る)
+# 2つのゲージで /proc の走査を1回で済ませるため、直前の結果を短時間だけ再利用する
+_memory_snapshot: Tuple[float, Optional[BrowserMemory]] = (0.0, None)
+_memory_snapshot_lock = threading.Lock()
+MEMORY_SNAPSHOT_TTL_SEC = 1.0
+
+
+def _metrics_memory() -> BrowserMemory:
+    global _memory_snapshot
+    with _memory_snapshot_lock:
+        taken_at, memory = _memory_snapshot
+        if memory is None or time.monotonic() - taken_at > MEMORY_SNAPSHOT_TTL_SEC:
+            memory = get_browser_registry().memory()
+            _memory_snapshot = (time.monotonic(), memory)
+        return memory
+
+
+metrics.REGISTRY.gauge_func(
+    "touchontime_browsers", "Live browser sessions (chromedriver process groups)",
+    lambda: _metrics_memory().browsers,
+)
+metrics.REGISTRY.gauge_func(
+    "touchontime_browser_rss_bytes", "Total RSS of live browser processes",
+    lambda: _metrics_memory().rss_bytes,
+)
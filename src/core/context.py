@@ -0,0 +1,216 @@
+"""
+ジョブ実行コンテキスト
+
+RunContext は1件のジョブの実行条件 (テスト実行か, ヘッドレスか, アカウント, 期限, ジョブID) を持つ
+不変オブジェクトで、JobService -> usecase -> TouchOnTimeAutomator へ明示的に渡されます。
+共有の設定モジュール (settings.DRY_RUN) を書き換えないため、テスト実行と本番のジョブを
+別スレッドで同時に実行しても互いのモードに影響しません。
+
+期限とキャンセル: RunContext.budget() は待機・タイムアウトの上限をジョブの残り時間で切り詰めます。
+CancelToken はキャンセル (UI の中断操作または期限切れ) を通知し、登録された後始末
+(ブラウザ・bw プロセスの強制終了) を呼び出します。
+
+また contextvars でジョブID・処理フェーズを保持し、JobService / usecase / BitwardenClient /
+TouchOnTimeAutomator のログに自動で付与します (src.core.logger.ContextFilter)。
+"""
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from typing import Callable, Iterator, List, Optional
+
+from src.config import settings as config
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelledError(RuntimeError):
+    """ジョブが中断されたことを表す例外"""
+
+
+class DeadlineExceededError(JobCancelledError):
+    """ジョブ全体の期限を過ぎたため中断されたことを表す例外"""
+
+
+class CancelToken:
+    """
+    1件のジョブのキャンセル通知
+
+    cancel() は別スレッド (UI・期限タイマー) から呼び出され、登録された後始末を順に実行します。
+    ジョブ側は raise_if_cancelled() / wait() で中断を検知します。
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self._error: Optional[JobCancelledError] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "ジョブがキャンセルされました", deadline: bool = False) -> bool:
+        """
+        キャンセルを通知します (2回目以降は何もしません)
+
+        Returns:
+            bool: この呼び出しでキャンセルした場合 True
+        """
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self._error = DeadlineExceededError(reason) if deadline else JobCancelledError(reason)
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        logger.warning(f"Job Cancelled: {reason}")
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"キャンセル時の後始末に失敗しました: {e}")
+        return True
+
+    def error(self) -> Optional[JobCancelledError]:
+        """キャンセル済みなら中断理由の例外を返します"""
+        with self._lock:
+            return self._error
+
+    def raise_if_cancelled(self) -> None:
+        error = self.error()
+        if error is not None:
+            raise error
+
+    def register(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """
+        キャンセル時の後始末を登録します (キャンセル済みなら即座に呼び出します)
+
+        Returns:
+            Callable[[], None]: 登録を解除する関数
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                registered = True
+            else:
+                registered = False
+        if not registered:
+            callback()
+
+        def unregister() -> None:
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+        return unregister
+
+    def wait(self, seconds: float) -> None:
+        """最大 seconds 秒待機します。待機中にキャンセルされた場合は例外を送出します"""
+        self._event.wait(seconds)
+        self.raise_if_cancelled()
+
+
+@dataclass(frozen=True)
+class RunContext:
+    """
+    1件のジョブの実行条件 (不変)
+
+    Attributes:
+        job_id (str): ジョブID
+        clock_type (str): 'in' または 'out'
+        is_dry_run (bool): True なら打刻ボタンを押さない
+        headless (bool): ブラウザを表示しない
+        account (str): Bitwarden のアイテム名 (認証キャッシュ・打刻記録のキー)
+        trigger (str): 起動元 ('manual' / 'scheduled' / 'daemon' など)
+        deadline (float, optional): ジョブ全体の期限 (time.monotonic() の値, None なら期限なし)
+        cancel_token (CancelToken, optional): キャンセル通知 (中身は可変だが参照は共有される)
+    """
+    job_id: str
+    clock_type: str
+    is_dry_run: bool = True
+    headless: bool = False
+    account: str = config.BITWARDEN_ITEM_NAME
+    trigger: str = "manual"
+    deadline: Optional[float] = None
+    cancel_token: Optional[CancelToken] = field(default=None, compare=False, repr=False)
+
+    def remaining(self) -> Optional[float]:
+        """期限までの残り秒数 (期限なしなら None, 期限切れなら 0.0)"""
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_token is not None and self.cancel_token.cancelled
+
+    def check(self) -> None:
+        """
+        中断すべきか確認します。
+
+        Raises:
+            JobCancelledError: キャンセル済みの場合
+            DeadlineExceededError: 期限を過ぎている場合
+        """
+        if self.cancel_token is not None:
+            self.cancel_token.raise_if_cancelled()
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise DeadlineExceededError(f"ジョブの期限を過ぎました (job={self.job_id})")
+
+    def budget(self, cap: float) -> float:
+        """
+        待機・タイムアウトに使える秒数 (cap と残り時間の小さい方) を返します。
+        中断すべき場合は check() と同じ例外を送出します。
+        """
+        self.check()
+        remaining = self.remaining()
+        return cap if remaining is None else min(cap, remaining)
+
+    def sleep(self, seconds: float) -> None:
+        """キャンセル・期限を考慮して待機します (期限を越えて待たない)"""
+        seconds = self.budget(seconds)
+        if self.cancel_token is not None:
+            self.cancel_token.wait(seconds)
+        else:
+            time.sleep(seconds)
+        self.check()
+
+    def evolve(self, **changes) -> "RunContext":
+        """一部の値を変えたコピーを返します"""
+        return replace(self, **changes)
+
+job_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("job_id", default=None)
+phase_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("phase", default=None)
+run_context_var: contextvars.ContextVar[Optional[RunContext]] = contextvars.ContextVar("run_context", default=None)
+
+
+@contextmanager
+def job_context(job_id: str, run_context: Optional[RunContext] = None) -> Iterator[None]:
+    """
+    ブロック内のログにジョブIDを付与します。
+    run_context を指定すると、BitwardenClient など引数で受け取らない層からも
+    current_run_context() で期限・キャンセルを参照できます。
+    """
+    job_token = job_id_var.set(job_id)
+    phase_token = phase_var.set(None)
+    run_token = run_context_var.set(run_context)
+    try:
+        yield
+    finally:
+        run_context_var.reset(run_token)
+        phase_var.reset(phase_token)
+        job_id_var.reset(job_token)
+
+
+def set_phase(phase: Optional[str]) -> None:
+    """現在の処理フェーズを設定します (job_context 内で使用)"""
+    phase_var.set(phase)
+
+
+def current_job_id() -> Optional[str]:
+    return job_id_var.get()
+
+
+def current_run_context() -> Optional[RunContext]:
+    return run_context_var.get()
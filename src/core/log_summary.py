@@ -0,0 +1,180 @@
+"""
+ログ概要の増分パーサー
+
+app.log を毎回先頭から読み直さず、前回読み終えたバイト位置とファイル識別子 (デバイス, inode) を
+記憶して追記分だけを解析します。集計結果はファイル識別子ごとにキャッシュされ、
+ローテーション (inode 変更) や切り詰め (サイズ縮小) を検知すると最初から作り直します。
+
+構造化ログ (*.jsonl, settings.LOG_STRUCTURED) はレコードのフィールド (ts / level / event) で集計し、
+テキストログは正規表現で抽出します。
+"""
+import json
+import os
+import re
+import threading
+from collections import Counter, defaultdict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# settings.LOG_FORMAT ('%(asctime)s - %(name)s - %(levelname)s - [%(job_id)s] %(message)s') の1行
+# (ジョブID導入前の形式も許容する)
+# チャンク全体に対して1回の finditer で抽出する (行ごとの strptime は行わない)
+_LINE_RE = re.compile(
+    rb"^(?P<date>\d{4}-\d{2}-\d{2}) (?P<time>\d{2}:\d{2}:\d{2}),\d+ - (?P<name>\S+) - "
+    rb"(?P<level>[A-Z]+) - (?:\[(?P<job_id>[^\]\s]*)\] )?(?P<message>[^\r\n]*)",
+    re.MULTILINE,
+)
+
+_JOB_EVENTS = (
+    (b"Job Started", "started"),
+    (b"Job Completed Successfully", "completed"),
+    (b"Job Failed", "failed"),
+)
+# 構造化ログの event フィールド -> ジョブイベント
+_JSON_JOB_EVENTS = {"job_started": "started", "job_completed": "completed", "job_failed": "failed"}
+
+# 1回の refresh で読み込む最大バイト数 (巨大ファイル初回読み込み時のメモリ上限)
+_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+class LogSummary:
+    """
+    1つのログファイルに対する増分集計
+
+    Attributes:
+        levels (Dict[str, Counter]): 日付 -> ログレベル別件数
+        jobs (Dict[str, Counter]): 日付 -> ジョブイベント ('started', 'completed', 'failed') 件数
+        recent_errors (Deque[Tuple[str, str]]): 直近の ERROR/CRITICAL ((日時, メッセージ))
+    """
+
+    def __init__(self, path: str, max_errors: int = 20):
+        self.path = path
+        self.structured = path.endswith(".jsonl")
+        self._max_errors = max_errors
+        self._lock = threading.Lock()
+        self._reset(None)
+
+    def _reset(self, identity: Optional[Tuple[int, int]]) -> None:
+        self.identity = identity
+        self.offset = 0
+        self.levels: Dict[str, Counter] = defaultdict(Counter)
+        self.jobs: Dict[str, Counter] = defaultdict(Counter)
+        self.recent_errors: Deque[Tuple[str, str]] = deque(maxlen=self._max_errors)
+
+    def refresh(self) -> bool:
+        """
+        追記分を解析して集計を更新します。
+
+        Returns:
+            bool: 集計が変化した場合 True
+        """
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                changed = self.offset > 0
+                self._reset(None)
+                return changed
+
+            identity = (st.st_dev, st.st_ino)
+            rotated = identity != self.identity or st.st_size < self.offset
+            if rotated:
+                self._reset(identity)
+            if st.st_size == self.offset:
+                return rotated
+
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                while True:
+                    chunk = f.read(_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    # 書き込み途中の最終行は次回に回す
+                    end = chunk.rfind(b"\n") + 1
+                    if end == 0:
+                        if len(chunk) < _CHUNK_SIZE:
+                            break
+                        end = len(chunk)
+                    self._consume(chunk[:end])
+                    self.offset += end
+                    f.seek(self.offset)
+            return True
+
+    def _consume(self, data: bytes) -> None:
+        if self.structured:
+            self._consume_json(data)
+            return
+        matches = list(_LINE_RE.finditer(data))
+        if not matches:
+            return
+
+        for (day, level), count in Counter((m["date"], m["level"]) for m in matches).items():
+            self.levels[day.decode()][level.decode()] += count
+
+        for m in matches:
+            message = m["message"]
+            for marker, event in _JOB_EVENTS:
+                if message.startswith(marker):
+                    self.jobs[m["date"].decode()][event] += 1
+                    break
+            if m["level"] in (b"ERROR", b"CRITICAL"):
+                self.recent_errors.append(
+                    (f"{m['date'].decode()} {m['time'].decode()}", message.decode("utf-8", errors="replace"))
+                )
+
+    def _consume_json(self, data: bytes) -> None:
+        for line in data.splitlines():
+            try:
+                record = json.loads(line)
+                day, clock = record["ts"][:10], record["ts"][11:19]
+                level = record["level"]
+            except (ValueError, KeyError, TypeError):
+                continue
+            self.levels[day][level] += 1
+            event = _JSON_JOB_EVENTS.get(record.get("event"))
+            if event:
+                self.jobs[day][event] += 1
+            if level in ("ERROR", "CRITICAL"):
+                self.recent_errors.append((f"{day} {clock}", record.get("message", "")))
+
+    def errors(self) -> List[Tuple[str, str]]:
+        """
+        直近のエラーを新しい順に返します (表示用)。
+        他のセッションの refresh() と競合しないよう、ロックを取ってコピーを返します。
+        """
+        with self._lock:
+            return list(reversed(self.recent_errors))
+
+    def daily_rows(self) -> List[Dict[str, object]]:
+        """日付ごとの集計行を新しい順に返します (表示用)"""
+        with self._lock:
+            rows = []
+            for day in sorted(set(self.levels) | set(self.jobs), reverse=True):
+                levels = self.levels.get(day, Counter())
+                jobs = self.jobs.get(day, Counter())
+                rows.append({
+                    "Date": day,
+                    "Jobs Started": jobs["started"],
+                    "Completed": jobs["completed"],
+                    "Failed": jobs["failed"],
+                    "INFO": levels["INFO"],
+                    "WARNING": levels["WARNING"],
+                    "ERROR": levels["ERROR"] + levels["CRITICAL"],
+                })
+            return rows
+
+
+_summaries: Dict[str, LogSummary] = {}
+_summaries_lock = threading.Lock()
+
+
+def get_log_summary(path: str) -> LogSummary:
+    """
+    パスごとに共有される LogSummary を取得し、追記分を反映して返します。
+    """
+    key = os.path.abspath(path)
+    with _summaries_lock:
+        summary = _summaries.get(key)
+        if summary is None:
+            summary = _summaries[key] = LogSummary(key)
+    summary.refresh()
+    return summary
@@ -0,0 +1,150 @@
+"""
+ログ末尾ビューア
+
+ログファイル全体を読み込まず、EOF から固定サイズのブロック単位で逆方向に読み進めて
+末尾 N 行を取得します。返却されたオフセットを次回の before に渡すことで、
+さらに古いページへ遡ることができます。
+
+構造化ログ (*.jsonl) はレコードの level / job_id / message フィールドで絞り込み、
+テキストログと同じ1行の形式に整えて返します。
+"""
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+# 1ブロックの読み込みサイズ
+BLOCK_SIZE = 64 * 1024
+# 1回の呼び出しで走査する最大バイト数 (フィルタ条件に合う行が少ない場合の上限)
+MAX_SCAN_BYTES = 8 * 1024 * 1024
+
+_LEVEL_RE = re.compile(r" - (DEBUG|INFO|WARNING|ERROR|CRITICAL) - ")
+
+
+@dataclass
+class TailPage:
+    """
+    Attributes:
+        lines (List[str]): 古い順の行
+        start_offset (int): このページ先頭行のバイト位置 (次のページ取得時に before として渡す)
+        at_start (bool): ファイル先頭まで到達したか
+    """
+    lines: List[str]
+    start_offset: int
+    at_start: bool
+
+
+def _matches(line: str, levels: Optional[List[str]], contains: Optional[str]) -> bool:
+    if levels:
+        m = _LEVEL_RE.search(line)
+        if not m or m.group(1) not in levels:
+            return False
+    if contains and contains not in line:
+        return False
+    return True
+
+
+def _format_record(record: Dict[str, Any]) -> str:
+    """構造化ログのレコードをテキストログと同じ形式 (settings.LOG_FORMAT) の行にします"""
+    line = (
+        f"{record.get('ts', '')} - {record.get('logger', '')} - {record.get('level', '')} - "
+        f"[{record.get('job_id') or '-'}] {record.get('message', '')}"
+    )
+    if record.get("exc"):
+        line += "\n" + record["exc"]
+    return line
+
+
+def _match_record(line: str, levels: Optional[List[str]], contains: Optional[str]) -> Optional[str]:
+    """構造化ログの1行が条件に合えば表示用の行を返します (contains は Job ID の一致またはメッセージ中の文字列)"""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(record, dict):
+        return None
+    if levels and record.get("level") not in levels:
+        return None
+    if contains and contains != record.get("job_id") and contains not in str(record.get("message", "")):
+        return None
+    return _format_record(record)
+
+
+def read_tail(
+    path: str,
+    max_lines: int = 200,
+    before: Optional[int] = None,
+    levels: Optional[List[str]] = None,
+    contains: Optional[str] = None,
+    block_size: int = BLOCK_SIZE,
+    max_scan_bytes: int = MAX_SCAN_BYTES,
+) -> TailPage:
+    """
+    ファイル末尾 (または before の位置) から遡って、条件に合う行を最大 max_lines 行返します。
+
+    Args:
+        path (str): ログファイルのパス
+        max_lines (int): 取得する最大行数
+        before (int, optional): このバイト位置より前だけを対象にする (ページング用)
+        levels (List[str], optional): 対象とするログレベル ('INFO', 'ERROR' など)
+        contains (str, optional): 行に含まれるべき文字列 (ジョブIDなど)
+
+    Returns:
+        TailPage: 取得結果
+    """
+    structured = path.endswith(".jsonl")
+    collected: List[str] = []
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell() if before is None else min(before, f.tell())
+
+        pos = end
+        scanned = 0
+        # pos 以降でまだ行として処理していないバイト列 (先頭は前ブロックに続く行の断片)
+        pending = b""
+        # 次ページの開始位置 (ここより前が未処理)
+        next_offset = end
+
+        while pos > 0 and len(collected) < max_lines and scanned < max_scan_bytes:
+            read_size = min(block_size, pos)
+            pos -= read_size
+            f.seek(pos)
+            pending = f.read(read_size) + pending
+            scanned += read_size
+
+            # 完全な行だけを処理する (ファイル先頭に達していれば全体が完全)
+            if pos > 0:
+                cut = pending.find(b"\n")
+                if cut < 0:
+                    continue  # ブロックより長い行
+                head, body, body_offset = pending[:cut + 1], pending[cut + 1:], pos + cut + 1
+            else:
+                head, body, body_offset = b"", pending, 0
+
+            raw_lines = body.split(b"\n")
+            starts = []
+            offset = body_offset
+            for raw in raw_lines:
+                starts.append(offset)
+                offset += len(raw) + 1
+
+            for raw, line_start in zip(reversed(raw_lines), reversed(starts)):
+                line = raw.decode("utf-8", errors="replace").rstrip("\r")
+                if line and structured:
+                    line = _match_record(line, levels, contains)
+                elif line and not _matches(line, levels, contains):
+                    line = None
+                if line:
+                    collected.append(line)
+                    if len(collected) >= max_lines:
+                        next_offset = line_start
+                        break
+            else:
+                next_offset = body_offset
+                pending = head
+                continue
+            break
+
+    collected.reverse()
+    return TailPage(lines=collected, start_offset=next_offset, at_start=next_offset == 0)
@@ -1,43 +1,218 @@
+"""
+ロギング設定モジュール
+
+ログレコードは QueueHandler 経由でキューに積まれ、専用スレッドの QueueListener が
+ファイル (ローテーション・圧縮付き) とコンソールへ書き出します。
+ジョブスレッドや UI スレッドはファイル I/O を待ちません。
+
+setup_logging は冪等であり、Streamlit の再実行ごとに呼び出されてもハンドラを作り直しません。
+
+各レコードには ContextFilter により job_id / phase (src.core.context) が付与され、
+構造化ログモード (settings.LOG_STRUCTURED) では JSON Lines ファイルにも出力されます。
+ログ概要・ログ詳細 (src.core.log_summary / log_tail) は、このファイルがあればフィールドで集計・絞り込みます。
+"""
+import atexit
+import copy
+import gzip
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import shutil
 import sys
+import threading
+from typing import Optional, Tuple
+
 from src.config import settings as config
+from src.core.context import job_id_var, phase_var
+
+_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.handlers.QueueHandler] = None
+_configured_key: Optional[Tuple] = None
+
+
+class ContextFilter(logging.Filter):
+    """
+    現在のジョブID・フェーズをレコードに付与します。
+    QueueHandler に付けることで、ログを出したスレッドのコンテキストで評価されます。
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "job_id"):
+            record.job_id = job_id_var.get() or "-"
+        if not hasattr(record, "phase"):
+            record.phase = phase_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """1レコードを1行の JSON オブジェクトとして出力します"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "job_id": None if getattr(record, "job_id", "-") == "-" else record.job_id,
+            "phase": getattr(record, "phase", None),
+        }
+        duration_ms = getattr(record, "duration_ms", None)
+        if duration_ms is not None:
+            data["duration_ms"] = duration_ms
+        event = getattr(record, "event", None)
+        if event is not None:
+            data["event"] = event
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class _ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    既定の QueueHandler.prepare は例外のトレースバックをメッセージに連結してしまうため、
+    メッセージと exc_text を分けたままキューに積みます (テキストのフォーマッタは exc_text を末尾に出力する)。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+def _gzip_namer(name: str) -> str:
+    return f"{name}.gz"
+
+
+def _gzip_rotator(source: str, dest: str) -> None:
+    """ローテーション済みファイルを gzip 圧縮して保存します (リスナースレッドで実行)"""
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
 
-def setup_logging(name: str = "app", log_file: str = "app.log") -> logging.Logger:
+
+def _build_file_handler(log_path: str) -> logging.Handler:
+    if config.LOG_ROTATE_WHEN:
+        handler: logging.handlers.BaseRotatingHandler = logging.handlers.TimedRotatingFileHandler(
+            log_path,
+            when=config.LOG_ROTATE_WHEN,
+            backupCount=config.LOG_ROTATE_BACKUP_COUNT,
+            encoding='utf-8',
+        )
+    else:
+        handler = logging.handlers.RotatingFileHandler(
+            log_path,
+            maxBytes=config.LOG_ROTATE_MAX_BYTES,
+            backupCount=config.LOG_ROTATE_BACKUP_COUNT,
+            encoding='utf-8',
+        )
+    if config.LOG_ROTATE_COMPRESS:
+        handler.namer = _gzip_namer
+        handler.rotator = _gzip_rotator
+    return handler
+
+
+def _stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def setup_logging(
+    name: str = "app",
+    log_file: str = "app.log",
+    log_dir: str = config.LOG_DIR,
+    level: int = config.LOG_LEVEL,
+) -> logging.Logger:
     """
     アプリケーション全体のロギング設定を行います。
-    
+    同じ設定で再度呼び出された場合は何もせずロガーを返します。
+
     Args:
         name (str): ロガーの名前
-        log_file (str): ログファイル名 (logs/ ディレクトリ配下)
-    
+        log_file (str): ログファイル名 (log_dir 配下)
+        log_dir (str): ログディレクトリ
+        level (int): ルートロガーのレベル
+
     Returns:
         logging.Logger: 設定済みのロガーインスタンス
     """
-    # ログディレクトリの確保
-    log_dir = "logs"
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
-        
-    log_path = os.path.join(log_dir, log_file)
-    
-    # ルートロガーの設定 (一度だけ)
-    # Streamlitや他のライブラリのログも拾うため、basicConfigを使用
-    logging.basicConfig(
-        level=config.LOG_LEVEL,
-        format=config.LOG_FORMAT,
-        handlers=[
-            logging.FileHandler(log_path, encoding='utf-8'),
-            logging.StreamHandler(sys.stdout)
-        ],
-        force=True # 既存の設定を上書き
-    )
-    
+    global _listener, _queue_handler, _configured_key
+
+    key = (os.path.abspath(os.path.join(log_dir, log_file)), level, config.LOG_STRUCTURED)
+    with _lock:
+        if _configured_key == key and _queue_handler in logging.getLogger().handlers:
+            return logging.getLogger(name)
+
+        # ログディレクトリの確保
+        os.makedirs(log_dir, exist_ok=True)
+        log_path = os.path.join(log_dir, log_file)
+
+        formatter = logging.Formatter(config.LOG_FORMAT)
+        file_handler = _build_file_handler(log_path)
+        file_handler.setFormatter(formatter)
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(formatter)
+
+        handlers = [file_handler, console_handler]
+        if config.LOG_STRUCTURED:
+            json_handler = _build_file_handler(f"{os.path.splitext(log_path)[0]}.jsonl")
+            json_handler.setFormatter(JsonFormatter())
+            handlers.append(json_handler)
+
+        # 設定変更時は既存のリスナーを停止してから差し替える
+        _stop_listener()
+        log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+
+        # ルートロガーの設定
+        # Streamlitや他のライブラリのログも拾うため、ルートにキューハンドラのみを付ける
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+            if handler is not _queue_handler:
+                handler.close()
+        _queue_handler = _ContextQueueHandler(log_queue)
+        _queue_handler.addFilter(ContextFilter())
+        root.addHandler(_queue_handler)
+        root.setLevel(level)
+
+        _configured_key = key
+
     return logging.getLogger(name)
 
+
+def readable_log_path(log_dir: str = config.LOG_DIR, log_file: str = "app.log") -> str:
+    """
+    ログ概要・ログ詳細で読むファイルを返します。
+    構造化ログモードで JSON Lines ファイルがあればそちら (フィールドで集計・絞り込みできる)、なければテキストログ。
+    """
+    text_path = os.path.join(log_dir, log_file)
+    json_path = f"{os.path.splitext(text_path)[0]}.jsonl"
+    if config.LOG_STRUCTURED and os.path.exists(json_path):
+        return json_path
+    return text_path
+
+
 def get_logger(name: str) -> logging.Logger:
     """
     指定された名前のロガーを取得します。
     (設定は setup_logging で完了している前提)
     """
     return logging.getLogger(name)
+
+
+# プロセス終了時にキューに残ったレコードを書き出す
+atexit.register(_stop_listener)
@@ -0,0 +1,280 @@
+"""
+メトリクス (Prometheus テキスト形式)
+
+ジョブの結果・フェーズの所要時間・bw の実行時間・WebDriver の起動時間・スケジューラの遅れ・
+起動中のブラウザの数とメモリを、カウンタとヒストグラムで集計します。
+
+    - API サーバー (GET /metrics) で公開する
+    - settings.METRICS_TEXTFILE を指定すると、常駐プロセス (Web UI / デーモン) が
+      settings.METRICS_TEXTFILE_INTERVAL_SEC ごとにファイルへ書き出す (node_exporter の textfile collector 用)。
+      プロセスごとに別のファイル (例: touchontime.web.prom / touchontime.daemon.prom) に
+      process ラベルを付けて書き出すため、互いの値を上書きしない
+
+記録はロック1回と辞書の更新だけで済むため、打刻の経路で常に有効にしておけます。
+ブラウザの数とメモリは記録せず、書き出すときに読み取ります。
+"""
+import bisect
+import logging
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from src.config import settings as config
+
+logger = logging.getLogger(__name__)
+
+# 秒単位のヒストグラムの既定の区切り (打刻は数秒〜数十秒, bw は数百ミリ秒〜数秒)
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+# 予約時刻からの遅れ (時刻同期により負になりうる)
+LAG_BUCKETS = (-1.0, -0.1, 0.0, 0.1, 0.25, 0.5, 1.0, 5.0, 30.0, 60.0, 300.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        try:
+            return tuple(str(labels[name]) for name in self.labelnames)
+        except KeyError as e:
+            raise ValueError(f"{self.name}: ラベル {e} が指定されていません") from None
+
+    def samples(self) -> Iterable[Tuple[str, str, float]]:
+        """(サンプル名, ラベル, 値) を返します"""
+        raise NotImplementedError
+
+    def render(self, const_labels: str = "") -> List[str]:
+        """const_labels: 全サンプルに付けるラベル ('process="web"' の形式)"""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+        for name, labels, value in self.samples():
+            if const_labels:
+                labels = "{" + const_labels + ("," + labels[1:] if labels else "}")
+            lines.append(f"{name}{labels} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """単調増加するカウンタ"""
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Histogram(_Metric):
+    """区切り (buckets) ごとの件数と合計を持つヒストグラム"""
+    type_name = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # ラベルごとに [区切りごとの件数 (累積ではない)..., +Inf の件数, 合計]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def count(self, **labels: str) -> int:
+        with self._lock:
+            counts = self._values.get(self._key(labels))
+        return int(sum(counts[:-1])) if counts else 0
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, list(counts)) for key, counts in self._values.items())
+        names = self.labelnames + ("le",)
+        for key, counts in values:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (math.inf,), counts[:-1]):
+                cumulative += count
+                yield f"{self.name}_bucket", _format_labels(names, key + (_format_value(bound),)), cumulative
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum", labels, counts[-1]
+            yield f"{self.name}_count", labels, cumulative
+
+
+class GaugeFunc(_Metric):
+    """書き出すときに関数を呼んで値を読み取るゲージ (関数の例外は値なしとして扱う)"""
+    type_name = "gauge"
+
+    def __init__(self, name: str, help_text: str, func: Callable[[], float]):
+        super().__init__(name, help_text)
+        self.func = func
+
+    def samples(self):
+        try:
+            value = self.func()
+        except Exception as e:
+            logger.debug(f"メトリクス {self.name} を読み取れませんでした: {e}")
+            return
+        yield self.name, "", value
+
+
+class MetricsRegistry:
+    """メトリクスを名前で管理し、Prometheus テキスト形式で書き出します"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        """同名のメトリクスが登録済みならそれを返します (モジュールの再読み込みで重複させない)"""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def gauge_func(self, name: str, help_text: str, func: Callable[[], float]) -> GaugeFunc:
+        return self.register(GaugeFunc(name, help_text, func))
+
+    def render(self, const_labels: Optional[Dict[str, str]] = None) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        names = sorted(const_labels or {})
+        const = _format_labels(names, [const_labels[name] for name in names])[1:-1]
+        lines: List[str] = []
+        for metric in metrics:
+            lines += metric.render(const)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# -----------------------------------------------------------------------------
+# 打刻で使うメトリクス
+# -----------------------------------------------------------------------------
+JOBS = REGISTRY.counter(
+    "touchontime_jobs_total", "Finished punch jobs by type, mode and outcome (success or error kind)",
+    ("clock_type", "mode", "outcome"),
+)
+JOB_SECONDS = REGISTRY.histogram(
+    "touchontime_job_duration_seconds", "Wall time of punch jobs including retries", ("clock_type", "mode"),
+)
+PHASE_SECONDS = REGISTRY.histogram(
+    "touchontime_job_phase_seconds", "Wall time spent in each job phase", ("phase",),
+)
+BW_SECONDS = REGISTRY.histogram(
+    "touchontime_bw_command_seconds", "Latency of bw subprocess calls by command and status", ("command", "status"),
+)
+WEBDRIVER_STARTUP_SECONDS = REGISTRY.histogram(
+    "touchontime_webdriver_startup_seconds", "Time to start chromedriver and Chrome",
+)
+SCHEDULER_LAG_SECONDS = REGISTRY.histogram(
+    "touchontime_scheduler_lag_seconds", "Delay between the scheduled/submitted time and the job start",
+    ("trigger",), buckets=LAG_BUCKETS,
+)
+
+
+def mode_label(is_dry_run: bool) -> str:
+    return "dry" if is_dry_run else "live"
+
+
+def render(const_labels: Optional[Dict[str, str]] = None) -> str:
+    """既定のレジストリを Prometheus テキスト形式で返します"""
+    return REGISTRY.render(const_labels)
+
+
+def textfile_path(process: str, path: Optional[str] = None) -> Optional[str]:
+    """プロセスごとの書き出し先 (touchontime.prom -> touchontime.<process>.prom)"""
+    path = path or config.METRICS_TEXTFILE
+    if not path:
+        return None
+    root, ext = os.path.splitext(path)
+    return f"{root}.{process}{ext or '.prom'}"
+
+
+def write_textfile(process: str, path: Optional[str] = None) -> None:
+    """
+    既定のレジストリを process ラベル付きでプロセスごとのファイルへ書き出します
+    (一時ファイルから置き換えるため、読み手が途中の内容を見ることはない)
+    """
+    path = textfile_path(process, path)
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render({"process": process}))
+    os.replace(tmp_path, path)
+
+
+_writer_started = False
+_writer_lock = threading.Lock()
+
+
+def ensure_textfile_writer(process: str, interval: float = config.METRICS_TEXTFILE_INTERVAL_SEC) -> None:
+    """
+    settings.METRICS_TEXTFILE が指定されていれば、interval 秒ごとに書き出すスレッドを起動します (プロセスで1度だけ)。
+
+    Args:
+        process (str): プロセスの種類 ('web' / 'daemon')。ファイル名と process ラベルに使う
+    """
+    global _writer_started
+    if not config.METRICS_TEXTFILE:
+        return
+    with _writer_lock:
+        if _writer_started:
+            return
+        _writer_started = True
+
+    def loop() -> None:
+        while True:
+            try:
+                write_textfile(process)
+            except OSError as e:
+                logger.warning(f"メトリクスを書き出せませんでした: {e}")
+            time.sleep(interval)
+
+    threading.Thread(target=loop, name="metrics-textfile", daemon=True).start()
@@ -0,0 +1,206 @@
+"""
+ジョブのプロファイリング
+
+ジョブを cProfile (決定論的プロファイラ) の下で実行し、以下を output/profiles/<job_id>/ に保存します。
+
+    - profile.prof   pstats 形式のプロファイル (snakeviz などでも閲覧可能)
+    - phases.json    フェーズ別の実時間と、主要な待ち時間の内訳 (bw サブプロセス, ChromeDriverManager,
+                     ページ読み込み, 固定スリープ)
+    - summary.txt    累積時間の上位関数
+
+diff_profiles で2つのプロファイルを関数単位で比較できます。
+"""
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.config import settings as config
+
+logger = logging.getLogger(__name__)
+
+# 内訳として集計する関数 (ファイル名の末尾, 関数名)
+CATEGORIES: Dict[str, Tuple[str, str]] = {
+    # bw の呼び出しはすべて BitwardenClient._run を経由する (同時実行数の制限による待ち時間を含む)。
+    # subprocess.run / communicate では webdriver_manager や chromedriver の起動も数えてしまう
+    "bw_subprocess": (os.path.join("core", "bitwarden.py"), "_run"),
+    "chromedriver_manager": (os.path.join("webdriver_manager", "chrome.py"), "install"),
+    "chrome_start": (os.path.join("selenium", "webdriver", "chrome", "webdriver.py"), "__init__"),
+    "page_load": (os.path.join("selenium", "webdriver", "remote", "webdriver.py"), "get"),
+    "webdriver_wait": (os.path.join("selenium", "webdriver", "support", "wait.py"), "until"),
+    "sleep": ("~", "<built-in method time.sleep>"),
+}
+
+_PROFILE_FILE = "profile.prof"
+
+FuncKey = Tuple[str, int, str]
+
+
+class JobProfile:
+    """
+    1件のジョブのプロファイル
+
+    on_phase をジョブのフェーズ通知に渡すと、フェーズ別の実時間を記録します。
+    """
+
+    def __init__(self, job_id: str, out_dir: Optional[str] = None):
+        self.job_id = job_id
+        self.out_dir = out_dir or os.path.join(config.PROFILE_DIR, job_id)
+        self._profiler = cProfile.Profile()
+        self._active = False
+        self._marks: List[Tuple[str, float]] = []
+        self._started = 0.0
+        self._finished = 0.0
+
+    def start(self) -> None:
+        self._started = time.monotonic()
+        try:
+            # cProfile は呼び出したスレッド (ジョブを実行するスレッド) だけを計測する
+            self._profiler.enable()
+            self._active = True
+        except ValueError as e:
+            # 別のプロファイラが有効な場合 (Python 3.12 以降はプロセスで1つ)。フェーズ計測のみ行う
+            logger.warning(f"プロファイラを開始できませんでした (フェーズ計測のみ行います): {e}")
+
+    def stop(self) -> None:
+        if self._active:
+            self._profiler.disable()
+            self._active = False
+        self._finished = time.monotonic()
+
+    def on_phase(self, name: str) -> None:
+        self._marks.append((name, time.monotonic()))
+
+    def chain(self, callback: Optional[Callable[[str], None]]) -> Callable[[str], None]:
+        """フェーズを記録してから既存のコールバックを呼ぶ関数を返します"""
+        def on_phase(name: str) -> None:
+            self.on_phase(name)
+            if callback:
+                callback(name)
+        return on_phase
+
+    def phase_durations(self) -> Dict[str, float]:
+        """フェーズ別の実時間 (秒, 同名フェーズは合算)。最初のフェーズより前は 'setup' とする"""
+        durations: Dict[str, float] = {}
+        marks = [("setup", self._started)] + self._marks
+        for i, (name, started) in enumerate(marks):
+            finished = marks[i + 1][1] if i + 1 < len(marks) else self._finished
+            durations[name] = round(durations.get(name, 0.0) + (finished - started), 3)
+        if durations.get("setup") == 0.0:
+            del durations["setup"]
+        return durations
+
+    def save(self) -> str:
+        """
+        プロファイルと内訳を保存します。
+
+        Returns:
+            str: 保存先ディレクトリ
+        """
+        os.makedirs(self.out_dir, exist_ok=True)
+        stats = None
+        if self._profiler.getstats():
+            self._profiler.dump_stats(os.path.join(self.out_dir, _PROFILE_FILE))
+            stats = pstats.Stats(self._profiler)
+
+        breakdown = {
+            "job_id": self.job_id,
+            "saved_at": datetime.now().isoformat(timespec="seconds"),
+            "wall_sec": round(self._finished - self._started, 3),
+            "phases": self.phase_durations(),
+            "categories": category_times(stats) if stats else {},
+        }
+        with open(os.path.join(self.out_dir, "phases.json"), "w", encoding="utf-8") as f:
+            json.dump(breakdown, f, ensure_ascii=False, indent=2)
+
+        if stats:
+            buf = io.StringIO()
+            stats.stream = buf
+            stats.sort_stats("cumulative").print_stats(30)
+            with open(os.path.join(self.out_dir, "summary.txt"), "w", encoding="utf-8") as f:
+                f.write(buf.getvalue())
+
+        logger.info(f"Profile saved: {self.out_dir}", extra={"duration_ms": round(breakdown["wall_sec"] * 1000, 1)})
+        return self.out_dir
+
+
+@contextmanager
+def profile_job(job_id: str, enabled: bool = True, out_dir: Optional[str] = None) -> Iterator[Optional[JobProfile]]:
+    """
+    ブロック内をプロファイルし、終了時 (例外時も) に保存します。enabled=False の場合は None を渡します。
+    """
+    if not enabled:
+        yield None
+        return
+    profile = JobProfile(job_id, out_dir)
+    profile.start()
+    try:
+        yield profile
+    finally:
+        profile.stop()
+        try:
+            profile.save()
+        except Exception as e:
+            # 保存の失敗でジョブの結果を変えない
+            logger.error(f"プロファイルの保存に失敗しました: {e}")
+
+
+def _raw_stats(stats: pstats.Stats) -> Dict[FuncKey, tuple]:
+    return stats.stats  # type: ignore[attr-defined]
+
+
+def category_times(stats: pstats.Stats) -> Dict[str, float]:
+    """CATEGORIES に該当する関数の累積時間 (秒) を返します"""
+    result: Dict[str, float] = {}
+    for (filename, _, funcname), (_, _, _, cumulative, _) in _raw_stats(stats).items():
+        for category, (suffix, name) in CATEGORIES.items():
+            if funcname == name and filename.endswith(suffix):
+                result[category] = round(result.get(category, 0.0) + cumulative, 3)
+    return result
+
+
+def _load(path: str) -> pstats.Stats:
+    if os.path.isdir(path):
+        path = os.path.join(path, _PROFILE_FILE)
+    return pstats.Stats(path)
+
+
+def _label(key: FuncKey) -> str:
+    filename, lineno, funcname = key
+    if filename == "~":
+        return funcname
+    return f"{os.path.basename(filename)}:{lineno}({funcname})"
+
+
+def diff_profiles(before: str, after: str, top: int = 25) -> str:
+    """
+    2つのプロファイル (profile.prof またはそのディレクトリ) を関数単位で比較し、
+    累積時間の差が大きい順に表形式で返します。
+    """
+    a, b = _raw_stats(_load(before)), _raw_stats(_load(after))
+    rows = []
+    for key in set(a) | set(b):
+        ct_a = a[key][3] if key in a else 0.0
+        ct_b = b[key][3] if key in b else 0.0
+        calls_a = a[key][1] if key in a else 0
+        calls_b = b[key][1] if key in b else 0
+        rows.append((ct_b - ct_a, ct_a, ct_b, calls_a, calls_b, key))
+    rows.sort(key=lambda r: abs(r[0]), reverse=True)
+
+    total_a = sum(v[2] for v in a.values())
+    total_b = sum(v[2] for v in b.values())
+    lines = [
+        f"before: {before} ({total_a:.3f}s)",
+        f"after:  {after} ({total_b:.3f}s)",
+        "",
+        f"{'delta [s]':>10} {'before':>9} {'after':>9} {'calls':>13}  function",
+    ]
+    for delta, ct_a, ct_b, calls_a, calls_b, key in rows[:top]:
+        lines.append(f"{delta:>+10.3f} {ct_a:>9.3f} {ct_b:>9.3f} {f'{calls_a}->{calls_b}':>13}  {_label(key)}")
+    return "\n".join(lines)
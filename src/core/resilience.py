@@ -0,0 +1,339 @@
+"""
+ジョブ実行の障害対策モジュール
+
+- RetryPolicy: エラー種別に応じたリトライ判定と指数バックオフ (ジッター付き)
+- CircuitBreaker: 障害中のサイト/保管庫への連続アクセスを停止
+- IdempotencyStore: (アカウント, 打刻タイプ, 日付) 単位の打刻記録による二重打刻防止
+- アラートフック: リトライ発生・ブレーカー作動などの早期警告
+"""
+import json
+import logging
+import os
+import random
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Callable, Dict, FrozenSet, Iterator, List, Optional
+
+from src.config import settings as config
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# -----------------------------------------------------------------------------
+# エラー分類
+# -----------------------------------------------------------------------------
+ERROR_TIMEOUT = "timeout"
+ERROR_CLICK_INTERCEPTED = "click_intercepted"
+ERROR_BITWARDEN = "bitwarden"
+ERROR_DUPLICATE = "duplicate"
+ERROR_CIRCUIT_OPEN = "circuit_open"
+ERROR_CONFIG = "config"
+ERROR_CANCELLED = "cancelled"
+ERROR_DEADLINE = "deadline"
+ERROR_UNKNOWN = "unknown"
+
+
+class DuplicatePunchError(RuntimeError):
+    """同じ (アカウント, タイプ, 日付) の打刻がすでに実行済み (または実行中) であることを表す例外"""
+
+
+class CircuitOpenError(RuntimeError):
+    """サーキットブレーカーが開いているため呼び出しを拒否したことを表す例外"""
+
+
+def classify_error(exc: BaseException) -> str:
+    """
+    例外をリトライ判定用のエラー種別に分類します。
+    selenium を import せずに判定できるよう、クラス名で比較します。
+    """
+    from src.core.bitwarden import BitwardenError
+    from src.core.context import DeadlineExceededError, JobCancelledError
+
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    if isinstance(exc, DeadlineExceededError):
+        return ERROR_DEADLINE
+    if isinstance(exc, JobCancelledError):
+        return ERROR_CANCELLED
+    if isinstance(exc, DuplicatePunchError):
+        return ERROR_DUPLICATE
+    if isinstance(exc, CircuitOpenError):
+        return ERROR_CIRCUIT_OPEN
+    if isinstance(exc, BitwardenError):
+        return ERROR_BITWARDEN
+    if "ElementClickInterceptedException" in names:
+        return ERROR_CLICK_INTERCEPTED
+    if "TimeoutException" in names or isinstance(exc, (TimeoutError, subprocess.TimeoutExpired)):
+        return ERROR_TIMEOUT
+    if isinstance(exc, ValueError):
+        return ERROR_CONFIG
+    return ERROR_UNKNOWN
+
+
+# -----------------------------------------------------------------------------
+# リトライポリシー
+# -----------------------------------------------------------------------------
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    エラー種別ごとのリトライ方針
+
+    Attributes:
+        max_attempts (int): 最大試行回数 (初回を含む)
+        base_delay (float): 指数バックオフの基準秒数
+        max_delay (float): 待機秒数の上限
+        retry_on (FrozenSet[str]): リトライ対象のエラー種別
+    """
+    max_attempts: int = config.RETRY_MAX_ATTEMPTS
+    base_delay: float = config.RETRY_BASE_DELAY_SEC
+    max_delay: float = config.RETRY_MAX_DELAY_SEC
+    # ERROR_CLICK_INTERCEPTED は含めない: クリックの阻害は automator が JavaScript クリックで処理し、
+    # 仮に送出されても打刻記録 (IdempotencyStore.begin) の後のため、リトライは DuplicatePunchError になる
+    retry_on: FrozenSet[str] = field(
+        default_factory=lambda: frozenset({ERROR_TIMEOUT, ERROR_BITWARDEN})
+    )
+
+    def should_retry(self, kind: str, attempt: int) -> bool:
+        """attempt 回目 (1始まり) の失敗後にリトライすべきか判定します"""
+        return kind in self.retry_on and attempt < self.max_attempts
+
+    def delay(self, attempt: int, rng: Optional[random.Random] = None) -> float:
+        """attempt 回目の失敗後の待機秒数 (Full Jitter)"""
+        cap = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return (rng or random).uniform(0, cap)
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+
+# -----------------------------------------------------------------------------
+# アラートフック
+# -----------------------------------------------------------------------------
+_alert_hooks: List[Callable[[str, str, Dict], None]] = []
+
+
+def register_alert_hook(hook: Callable[[str, str, Dict], None]) -> None:
+    """
+    早期警告フックを登録します。
+    フックは (event, message, details) で呼び出されます。
+    """
+    if hook not in _alert_hooks:
+        _alert_hooks.append(hook)
+
+
+def emit_alert(event: str, message: str, **details) -> None:
+    """登録済みのフックへ警告を通知します (フックの例外は握りつぶします)"""
+    logger.warning(f"[ALERT:{event}] {message}")
+    for hook in list(_alert_hooks):
+        try:
+            hook(event, message, details)
+        except Exception as e:
+            logger.error(f"アラートフックの実行に失敗しました: {e}")
+
+
+# -----------------------------------------------------------------------------
+# サーキットブレーカー
+# -----------------------------------------------------------------------------
+class CircuitBreaker:
+    """
+    連続失敗回数が閾値に達すると一定時間呼び出しを拒否します (open)。
+    reset_timeout 経過後は1回だけ試行を許可し (half-open)、成功すれば復帰します。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def check(self) -> None:
+        """
+        呼び出し可否を確認します。
+
+        Raises:
+            CircuitOpenError: ブレーカーが開いている場合
+        """
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            remaining = self.reset_timeout - (time.monotonic() - self._opened_at)
+        raise CircuitOpenError(f"'{self.name}' は障害検知のため一時停止中です (残り約{max(remaining, 0):.0f}秒)")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def release(self) -> None:
+        """成否を判定できなかった試行の後に呼び出し、half-open の試行枠を返却します"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        opened = False
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._failures >= self.failure_threshold:
+                opened = self._state() != self.OPEN
+                self._opened_at = time.monotonic()
+            failures = self._failures
+        if opened:
+            emit_alert(
+                "circuit_open",
+                f"'{self.name}' で連続{failures}回失敗したため、{self.reset_timeout:.0f}秒間呼び出しを停止します。",
+                breaker=self.name,
+            )
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """名前付きのプロセス共有サーキットブレーカーを取得します ('site' または 'vault')"""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, config.CIRCUIT_FAILURE_THRESHOLD, config.CIRCUIT_RESET_SEC)
+        return _breakers[name]
+
+
+# -----------------------------------------------------------------------------
+# 冪等性 (二重打刻防止)
+# -----------------------------------------------------------------------------
+class IdempotencyStore:
+    """
+    打刻記録を JSON ファイルに永続化し、同じ打刻の二重実行を防ぎます。
+
+    Web UI と常駐デーモンが同じファイルを使うため、読み込みから書き込みまでを
+    プロセス内のロックに加えてファイルロック (<path>.lock への flock) で保護します。
+
+    状態:
+        'clicking': クリック直前に記録 (結果不明のためリトライ不可)
+        'done': 打刻完了
+    """
+
+    STATUS_CLICKING = "clicking"
+    STATUS_DONE = "done"
+
+    _lock = threading.Lock()
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(config.STATE_DIR, "punch_records.json")
+
+    @staticmethod
+    def make_key(account: str, clock_type: str, day: Optional[date] = None) -> str:
+        return f"{account}:{clock_type}:{(day or date.today()).isoformat()}"
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """プロセス内・プロセス間の排他 (_save は置き換えのため、ロックは別ファイルに取る)"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(f"{self.path}.lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"打刻記録の読み込みに失敗しました: {e}")
+            return {}
+
+    def _save(self, data: Dict[str, Dict]) -> None:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._locked():
+            return self._load().get(key)
+
+    def stuck(self) -> Dict[str, Dict]:
+        """
+        打刻中 ('clicking') のまま残っている記録を返します。
+        クリック直後に異常終了した場合などに残り、その日の同じ打刻を止め続けます。
+        """
+        with self._locked():
+            data = self._load()
+        return {key: record for key, record in data.items() if record.get("status") == self.STATUS_CLICKING}
+
+    def begin(self, key: str, job_id: Optional[str] = None) -> None:
+        """
+        クリック直前に呼び出し、打刻中として記録します。
+
+        Raises:
+            DuplicatePunchError: すでに記録が存在する場合
+        """
+        with self._locked():
+            data = self._load()
+            if key in data:
+                record = data[key]
+                raise DuplicatePunchError(
+                    f"打刻 {key} はすでに記録されています (status={record.get('status')}, at={record.get('updated_at')})"
+                )
+            data[key] = {
+                "status": self.STATUS_CLICKING,
+                "job_id": job_id,
+                "updated_at": datetime.now().isoformat(timespec="seconds"),
+            }
+            self._save(data)
+
+    def complete(self, key: str) -> None:
+        """打刻完了として記録します"""
+        with self._locked():
+            data = self._load()
+            record = data.setdefault(key, {})
+            record["status"] = self.STATUS_DONE
+            record["updated_at"] = datetime.now().isoformat(timespec="seconds")
+            self._save(data)
+
+    def clear(self, key: str) -> None:
+        """記録を削除します (手動で再打刻を許可する場合)"""
+        with self._locked():
+            data = self._load()
+            if data.pop(key, None) is not None:
+                self._save(data)
@@ -0,0 +1,185 @@
+"""
+予約の一括インポート
+
+CSV / ICS ファイルから予約候補を読み込み、validator の推奨時間帯・過去日時・重複を
+pandas の列演算でまとめて検証します (行ごとのループで検証しない)。
+
+CSV 形式 (ヘッダー必須, mode は省略可):
+    date,time,type,mode
+    2026-01-05,08:55,in,dry
+    2026-01-05,18:05,out,live
+
+ICS 形式: VEVENT の DTSTART を実行日時、SUMMARY に含まれる
+'IN' / '出勤' / 'OUT' / '退勤' を打刻タイプ、'live' / '本番' / 'dry' / 'テスト' をモードとして扱います。
+"""
+import io
+import re
+from datetime import date, datetime
+from typing import Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from src.core import validator
+
+COLUMNS = ["run_at", "clock_type", "is_dry_run", "error"]
+
+_TYPE_ALIASES = {"in": "in", "出勤": "in", "out": "out", "退勤": "out"}
+_MODE_ALIASES = {"dry": True, "test": True, "テスト": True, "live": False, "本番": False}
+
+_ICS_DTSTART_RE = re.compile(r"^DTSTART(?P<params>;[^:]*)?:(?P<value>\d{8}T\d{4}(?:\d{2})?Z?)$")
+
+
+def _normalize(series: pd.Series) -> pd.Series:
+    return series.fillna("").astype(str).str.strip().str.lower()
+
+
+def parse_csv(data: bytes, default_dry_run: bool = True) -> pd.DataFrame:
+    """
+    CSV を予約候補の DataFrame (COLUMNS) に変換します。
+    解釈できない値は error 列に理由を設定します (例外にはしません)。
+
+    Raises:
+        ValueError: 必須列 (date, time, type) がない場合
+    """
+    raw = pd.read_csv(io.BytesIO(data), dtype=str, encoding="utf-8-sig", skipinitialspace=True)
+    raw.columns = [str(c).strip().lower() for c in raw.columns]
+    missing = {"date", "time", "type"} - set(raw.columns)
+    if missing:
+        raise ValueError(f"CSV に必須列がありません: {', '.join(sorted(missing))}")
+
+    df = pd.DataFrame(index=raw.index)
+    df["run_at"] = pd.to_datetime(
+        raw["date"].str.strip() + " " + raw["time"].str.strip(), errors="coerce", format="mixed"
+    )
+    df["clock_type"] = _normalize(raw["type"]).map(_TYPE_ALIASES)
+    if "mode" in raw.columns:
+        mode = _normalize(raw["mode"])
+        df["is_dry_run"] = mode.map(_MODE_ALIASES).where(mode != "", default_dry_run)
+    else:
+        df["is_dry_run"] = default_dry_run
+    df["error"] = None
+    return df[COLUMNS]
+
+
+def _unfold_ics(text: str) -> List[str]:
+    """RFC 5545 の行折り返し (次行先頭の空白) を戻します"""
+    lines: List[str] = []
+    for line in text.splitlines():
+        if line[:1] in (" ", "\t") and lines:
+            lines[-1] += line[1:]
+        else:
+            lines.append(line.strip())
+    return lines
+
+
+def _match_alias(text: str, aliases: dict) -> Optional[object]:
+    """SUMMARY から別名に一致する値を探します (複数の値に一致する曖昧な場合は None)"""
+    lowered = text.lower()
+    found = {
+        value for word, value in aliases.items()
+        if re.search(rf"(?<![a-z]){re.escape(word)}(?![a-z])", lowered)
+    }
+    return found.pop() if len(found) == 1 else None
+
+
+def parse_ics(data: bytes, default_dry_run: bool = True) -> pd.DataFrame:
+    """
+    ICS (iCalendar) の VEVENT を予約候補の DataFrame (COLUMNS) に変換します。
+    UTC 指定 (末尾 Z) の日時はローカル時刻に変換し、TZID 付きの日時はローカル時刻とみなします。
+    """
+    events: List[Tuple[Optional[str], str]] = []
+    dtstart, summary, in_event = None, "", False
+    for line in _unfold_ics(data.decode("utf-8-sig", errors="replace")):
+        if line == "BEGIN:VEVENT":
+            dtstart, summary, in_event = None, "", True
+        elif line == "END:VEVENT" and in_event:
+            events.append((dtstart, summary))
+            in_event = False
+        elif in_event and line.startswith("DTSTART"):
+            m = _ICS_DTSTART_RE.match(line)
+            dtstart = m["value"] if m else None
+        elif in_event and line.startswith("SUMMARY"):
+            summary = line.split(":", 1)[-1]
+
+    df = pd.DataFrame(events, columns=["dtstart", "summary"])
+    values = df["dtstart"].fillna("")
+    is_utc = values.str.endswith("Z")
+    stamps = values.str.rstrip("Z").str.replace(r"^(\d{8}T\d{4})$", r"\g<1>00", regex=True)
+    run_at = pd.to_datetime(stamps, format="%Y%m%dT%H%M%S", errors="coerce")
+    if is_utc.any():
+        local = (
+            run_at[is_utc].dt.tz_localize("UTC").dt.tz_convert(datetime.now().astimezone().tzinfo).dt.tz_localize(None)
+        )
+        run_at = run_at.where(~is_utc, local)
+    df["run_at"] = run_at
+
+    df["clock_type"] = df["summary"].map(lambda s: _match_alias(s, _TYPE_ALIASES))
+    mode = df["summary"].map(lambda s: _match_alias(s, _MODE_ALIASES))
+    df["is_dry_run"] = mode.where(mode.notna(), default_dry_run).astype(bool)
+    df["error"] = None
+    return df[COLUMNS]
+
+
+def load_schedule_file(filename: str, data: bytes, default_dry_run: bool = True) -> pd.DataFrame:
+    """拡張子に応じて CSV / ICS を読み込みます"""
+    if filename.lower().endswith(".ics"):
+        return parse_ics(data, default_dry_run)
+    return parse_csv(data, default_dry_run)
+
+
+def validate_schedule(
+    df: pd.DataFrame,
+    existing: Iterable[Tuple[date, str]] = (),
+    now: Optional[datetime] = None,
+) -> pd.DataFrame:
+    """
+    予約候補をまとめて検証し、error 列に最初に該当した理由を設定した DataFrame を返します。
+
+    検証内容:
+        - 日時・打刻タイプ・モードを解釈できること
+        - 未来の日時であること
+        - validator の推奨時間帯 (両端を含む) に収まること
+        - ファイル内で同じ日付・打刻タイプが重複しないこと (先頭の行を有効とする)
+        - 予約済みの同じ日付・打刻タイプと重複しないこと
+
+    Args:
+        existing (Iterable[Tuple[date, str]]): 予約済みの (日付, 打刻タイプ)
+        now (datetime, optional): 判定に使う現在時刻
+    """
+    df = df.copy()
+    now = now or datetime.now()
+
+    run_at = df["run_at"]
+    seconds = run_at.dt.hour * 3600 + run_at.dt.minute * 60 + run_at.dt.second
+    bounds = {
+        t: (start.hour * 3600 + start.minute * 60 + start.second, end.hour * 3600 + end.minute * 60 + end.second)
+        for t, (start, end) in validator.TIME_WINDOWS.items()
+    }
+    window_start = df["clock_type"].map({t: b[0] for t, b in bounds.items()})
+    window_end = df["clock_type"].map({t: b[1] for t, b in bounds.items()})
+
+    day = run_at.dt.date
+    keys = pd.Series(list(zip(day, df["clock_type"])), index=df.index)
+    existing_keys = set(existing)
+
+    checks = [
+        (run_at.isna(), "日時を解釈できません"),
+        (df["clock_type"].isna(), "打刻タイプ (in / out) を解釈できません"),
+        (df["is_dry_run"].isna(), "モード (dry / live) を解釈できません"),
+        (run_at <= pd.Timestamp(now), "過去の日時です"),
+        ((seconds < window_start) | (seconds > window_end), "推奨時間帯の範囲外です"),
+        (keys.isin(existing_keys), "同じ日付・タイプの予約がすでにあります"),
+    ]
+
+    errors = df["error"].astype(object)
+    for mask, message in checks:
+        errors = errors.mask(errors.isna() & mask.fillna(False).astype(bool), message)
+
+    # ファイル内の重複は、ここまでの検証を通った行の中で判定する
+    valid = errors.isna()
+    duplicated = valid & keys.where(valid).duplicated(keep="first")
+    errors = errors.mask(duplicated, "ファイル内で同じ日付・タイプが重複しています")
+
+    df["error"] = errors
+    df["is_dry_run"] = df["is_dry_run"].fillna(True).astype(bool)
+    return df
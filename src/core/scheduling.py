@@ -0,0 +1,67 @@
+"""
+予約時刻の分散 (ジッター) ロジック
+
+同じ分に予約が集中すると、全ジョブが同時にログイン・Bitwarden 呼び出しを行うため、
+ユーザーが指定した許容ウィンドウ (例: 08:50 - 08:58) の中でランダムに実行時刻をずらします。
+ずらした結果が validator の推奨時間帯を外れることはありません。
+"""
+import random
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from src.core import validator
+
+
+def clamp_window(clock_type: str, window_start: datetime, window_end: datetime) -> Tuple[datetime, datetime]:
+    """
+    許容ウィンドウを推奨時間帯との共通部分に絞り込みます。
+
+    Raises:
+        ValueError: ウィンドウが不正、または推奨時間帯と重ならない場合
+    """
+    if window_end < window_start:
+        raise ValueError("許容ウィンドウの終了時刻は開始時刻以降を指定してください。")
+    if window_start.date() != window_end.date():
+        raise ValueError("許容ウィンドウは同じ日付内で指定してください。")
+
+    allowed_start, allowed_end = validator.get_window(clock_type)
+    day = window_start.date()
+    start = max(window_start, datetime.combine(day, allowed_start))
+    end = min(window_end, datetime.combine(day, allowed_end))
+    if end < start:
+        raise ValueError(
+            f"許容ウィンドウ ({window_start.strftime('%H:%M')} - {window_end.strftime('%H:%M')}) が "
+            f"推奨時間帯 ({allowed_start.strftime('%H:%M')} - {allowed_end.strftime('%H:%M')}) と重なりません。"
+        )
+    return start, end
+
+
+def pick_jittered_time(
+    clock_type: str,
+    window_start: datetime,
+    window_end: datetime,
+    rng: Optional[random.Random] = None,
+    not_before: Optional[datetime] = None,
+) -> datetime:
+    """
+    許容ウィンドウ内 (推奨時間帯との共通部分) から一様ランダムに実行時刻を選びます。
+
+    Args:
+        clock_type (str): 'in' or 'out'
+        window_start (datetime): 許容ウィンドウ開始
+        window_end (datetime): 許容ウィンドウ終了
+        rng (random.Random, optional): 乱数生成器 (再現性が必要な場合に指定)
+        not_before (datetime, optional): これより前の時刻は選ばない (通常は現在時刻)
+
+    Returns:
+        datetime: 秒単位に丸めた実行時刻
+    """
+    start, end = clamp_window(clock_type, window_start, window_end)
+    if not_before and start < not_before:
+        start = not_before.replace(microsecond=0) + timedelta(seconds=1)
+        if end < start:
+            raise ValueError("許容ウィンドウがすでに過ぎています。")
+
+    span = int((end - start).total_seconds())
+    offset = (rng or random).randint(0, span) if span > 0 else 0
+    return start + timedelta(seconds=offset)
@@ -0,0 +1,328 @@
+"""
+打刻前の事前チェック (カナリア)
+
+予約した打刻の settings.CANARY_LEAD_SEC 前に、打刻と同じ経路を Dry Run で確認します。
+認証情報キャッシュの陳腐化・保管庫のロック・画面の変更・サイトの障害を、
+打刻時刻になってからではなく、対応できる時間があるうちに検知するためのものです。
+
+    - vault:       保管庫の状態 (ロック中でも認証情報がキャッシュ済みなら打刻には影響しない)
+    - credentials: 認証情報を取得できるか (キャッシュがなければロック解除して取得し、キャッシュしておく)
+    - site:        打刻画面に HTTP で到達できるか
+    - selectors:   ブラウザでログインし、打刻ボタンが存在するか (クリックはしない, settings.CANARY_BROWSER)
+
+結果は settings.STATE_DIR/canary.json に保存し、成功から settings.CANARY_CACHE_TTL_SEC 以内は
+同じ時刻に並んだ他の予約から呼ばれても確認し直しません。
+失敗した場合は警告 (canary_failed) を出し、打刻まで時間があるうちは settings.CANARY_RETRY_SEC ごとに再確認します。
+"""
+import json
+import logging
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from src.config import settings as config
+from src.core import resilience
+from src.core.bitwarden import BitwardenClient
+from src.core.context import CancelToken, RunContext, job_context
+from src.core.credentials import CredentialManager
+from src.core.timesync import server_now
+
+logger = logging.getLogger(__name__)
+
+
+class CanaryError(RuntimeError):
+    """事前チェックの失敗 (原因と対処をメッセージに含める)"""
+
+
+@dataclass
+class CanaryCheck:
+    """1項目の確認結果"""
+    name: str
+    ok: bool
+    detail: str = ""
+    duration_ms: float = 0.0
+
+
+@dataclass
+class CanaryResult:
+    """
+    事前チェックの結果
+
+    Attributes:
+        checked_at (datetime): 確認した時刻
+        checks (List[CanaryCheck]): 実施した項目 (前の項目の失敗で実施できなかったものは含まない)
+        for_run_at (Optional[datetime]): 対象の打刻の予約日時 (手動実行では None)
+    """
+    checked_at: datetime
+    checks: List[CanaryCheck] = field(default_factory=list)
+    for_run_at: Optional[datetime] = None
+
+    @property
+    def ok(self) -> bool:
+        return all(check.ok for check in self.checks)
+
+    @property
+    def failed(self) -> List[CanaryCheck]:
+        return [check for check in self.checks if not check.ok]
+
+    def summary(self) -> str:
+        if self.ok:
+            return "OK"
+        return ", ".join(f"{check.name}: {check.detail}" for check in self.failed)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "checked_at": self.checked_at.isoformat(timespec="seconds"),
+            "for_run_at": self.for_run_at.isoformat(timespec="seconds") if self.for_run_at else None,
+            "ok": self.ok,
+            "checks": [asdict(check) for check in self.checks],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "CanaryResult":
+        return cls(
+            checked_at=datetime.fromisoformat(data["checked_at"]),
+            checks=[CanaryCheck(**check) for check in data.get("checks", [])],
+            for_run_at=datetime.fromisoformat(data["for_run_at"]) if data.get("for_run_at") else None,
+        )
+
+
+class Canary:
+    """
+    事前チェックを実行し、最新の結果を保持します。
+
+    Args:
+        account (Optional[str]): Bitwarden のアイテム名 (省略時は settings.BITWARDEN_ITEM_NAME)
+        path (Optional[str]): 結果の保存先 (省略時は settings.STATE_DIR/canary.json)
+        use_browser (bool): ブラウザでログインして打刻ボタンまで確認するか
+        automator_factory (Optional[Callable]): (headless, before_click, context) を受け取り
+            TouchOnTimeAutomator を返すコンテキストマネージャの生成関数 (省略時は新しいブラウザを起動)
+    """
+
+    def __init__(
+        self,
+        account: Optional[str] = None,
+        path: Optional[str] = None,
+        use_browser: bool = config.CANARY_BROWSER,
+        automator_factory: Optional[Callable[..., object]] = None,
+    ):
+        self.account = account or config.BITWARDEN_ITEM_NAME
+        self.path = path or os.path.join(config.STATE_DIR, "canary.json")
+        self.use_browser = use_browser
+        self.automator_factory = automator_factory
+        self._lock = threading.Lock()
+        self._latest = self._load()
+
+    def _load(self) -> Optional[CanaryResult]:
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return CanaryResult.from_dict(json.load(f))
+        except Exception as e:
+            logger.warning(f"事前チェックの結果を読み込めませんでした: {e}")
+            return None
+
+    def _save(self, result: CanaryResult) -> None:
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(result.to_dict(), f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"事前チェックの結果を保存できませんでした: {e}")
+
+    def latest(self) -> Optional[CanaryResult]:
+        """最新の結果 (未実施なら None)"""
+        return self._latest
+
+    def run(
+        self,
+        for_run_at: Optional[datetime] = None,
+        master_password: Optional[str] = None,
+        force: bool = False,
+    ) -> CanaryResult:
+        """
+        事前チェックを実行します。成功した結果が settings.CANARY_CACHE_TTL_SEC 以内にあれば、それを返します。
+
+        Args:
+            for_run_at (Optional[datetime]): 対象の打刻の予約日時 (サーバー時刻)
+            master_password (Optional[str]): 認証情報がキャッシュされていない場合にロック解除に使う
+            force (bool): キャッシュされた結果を使わずに確認する
+        """
+        with self._lock:
+            previous = self._latest
+            if not force and previous and previous.ok:
+                age = (datetime.now() - previous.checked_at).total_seconds()
+                if 0 <= age < config.CANARY_CACHE_TTL_SEC:
+                    logger.info(f"Canary skipped: checked {age:.0f}s ago")
+                    return previous
+
+            result = self._check(for_run_at, master_password)
+            self._latest = result
+            self._save(result)
+
+        if result.ok:
+            logger.info(f"Canary Passed: {', '.join(c.name for c in result.checks)}")
+            if previous and not previous.ok:
+                resilience.emit_alert("canary_recovered", "事前チェックが成功しました (前回は失敗)")
+        else:
+            logger.error(f"Canary Failed: {result.summary()}")
+            when = f" ({for_run_at.strftime('%m/%d %H:%M')} の打刻)" if for_run_at else ""
+            resilience.emit_alert(
+                "canary_failed",
+                f"事前チェックに失敗しました{when}: {result.summary()}",
+                failed=[check.name for check in result.failed],
+                for_run_at=for_run_at.isoformat(timespec="seconds") if for_run_at else None,
+            )
+        return result
+
+    def _check(self, for_run_at: Optional[datetime], master_password: Optional[str]) -> CanaryResult:
+        job_id = f"canary_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        cancel_token = CancelToken()
+        ctx = RunContext(
+            job_id=job_id,
+            clock_type="in",
+            is_dry_run=True,
+            headless=True,
+            account=self.account,
+            trigger="canary",
+            deadline=time.monotonic() + config.CANARY_DEADLINE_SEC,
+            cancel_token=cancel_token,
+        )
+        # 応答しないブラウザや bw も期限で打ち切る (JobService.run_job と同じ)
+        timer = threading.Timer(
+            config.CANARY_DEADLINE_SEC, cancel_token.cancel,
+            kwargs={"reason": "事前チェックの期限を過ぎました", "deadline": True},
+        )
+        timer.daemon = True
+        timer.start()
+
+        result = CanaryResult(checked_at=datetime.now(), for_run_at=for_run_at)
+        cm = CredentialManager()
+        cached = cm.is_cached(self.account)
+        credentials: Dict[str, str] = {}
+
+        def check_vault() -> str:
+            status = BitwardenClient().get_status()
+            if status == "unlocked" or cached:
+                return status
+            if status == "locked" and master_password:
+                return f"{status} (Master Password でロック解除します)"
+            raise CanaryError(f"認証情報がキャッシュされておらず、保管庫が {status} です。bw login / unlock を確認してください")
+
+        def check_credentials() -> str:
+            if not cached and not master_password:
+                raise CanaryError("認証情報がキャッシュされておらず、Master Password も指定されていません")
+
+            def bw_client() -> BitwardenClient:
+                # キャッシュがない場合は打刻時と同じくロック解除してから取得し、キャッシュしておく
+                bw = BitwardenClient()
+                bw.unlock(master_password)
+                return bw
+
+            credentials.update(cm.get_credentials(self.account, bw_client_factory=bw_client))
+            if not credentials.get("username") or not credentials.get("password"):
+                raise CanaryError("ユーザー名またはパスワードが空です")
+            return "cache" if cached else "vault (キャッシュしました)"
+
+        def check_site() -> str:
+            request = urllib.request.Request(config.TOUCH_ON_TIME_URL, method="HEAD")
+            try:
+                with urllib.request.urlopen(request, timeout=ctx.budget(config.PAGE_LOAD_TIMEOUT_SEC)) as response:
+                    return f"HTTP {response.status}"
+            except urllib.error.HTTPError as e:
+                # HEAD を受け付けないだけの場合もあるため、サーバーエラーのみ失敗とする
+                if e.code >= 500:
+                    raise CanaryError(f"打刻画面がエラーを返しました (HTTP {e.code})")
+                return f"HTTP {e.code}"
+
+        def check_selectors() -> str:
+            factory = self.automator_factory
+            if factory is None:
+                # selenium はブラウザを使う場合だけ読み込む
+                from src.core.automator import TouchOnTimeAutomator
+                factory = TouchOnTimeAutomator
+            with factory(headless=True, before_click=None, context=ctx) as bot:
+                try:
+                    bot.login(credentials["username"], credentials["password"])
+                except Exception as e:
+                    hint = " キャッシュの認証情報が古い可能性があります" if cached else ""
+                    raise CanaryError(f"ログインに失敗しました ({type(e).__name__}).{hint}") from e
+                missing = bot.missing_record_buttons()
+            if missing:
+                raise CanaryError(f"打刻ボタンが見つかりません: {', '.join(missing)}")
+            return "login ok"
+
+        try:
+            with job_context(job_id, ctx):
+                vault_ok = self._run_check(result, "vault", check_vault)
+                credentials_ok = vault_ok and self._run_check(result, "credentials", check_credentials)
+                site_ok = self._run_check(result, "site", check_site)
+                if self.use_browser and credentials_ok and site_ok:
+                    self._run_check(result, "selectors", check_selectors)
+        finally:
+            timer.cancel()
+        return result
+
+    @staticmethod
+    def _run_check(result: CanaryResult, name: str, check: Callable[[], str]) -> bool:
+        started = time.perf_counter()
+        try:
+            detail, ok = check(), True
+        except CanaryError as e:
+            detail, ok = str(e), False
+        except Exception as e:
+            detail, ok = f"{type(e).__name__}: {e}", False
+        result.checks.append(CanaryCheck(name, ok, detail, round((time.perf_counter() - started) * 1000, 1)))
+        return ok
+
+
+_canary: Optional[Canary] = None
+_canary_lock = threading.Lock()
+
+
+def get_canary() -> Canary:
+    """プロセス共有の Canary を取得します"""
+    global _canary
+    with _canary_lock:
+        if _canary is None:
+            _canary = Canary()
+        return _canary
+
+
+def run_canary(
+    for_run_at: Optional[datetime] = None,
+    master_password: Optional[str] = None,
+    job_id: Optional[str] = None,
+) -> None:
+    """
+    スケジューラから呼ばれる事前チェック。
+    失敗した場合、打刻まで settings.CANARY_MIN_LEAD_SEC 以上残るうちは再確認 '_canary_retry_{job_id}' を予約します
+    (予約の削除・変更時に ScheduleService がまとめて取り除く)。
+    """
+    result = get_canary().run(for_run_at, master_password)
+    if result.ok or for_run_at is None:
+        return
+
+    retry_at = server_now() + timedelta(seconds=config.CANARY_RETRY_SEC)
+    if retry_at > for_run_at - timedelta(seconds=config.CANARY_MIN_LEAD_SEC):
+        logger.warning("打刻までの時間が短いため、事前チェックの再確認は行いません")
+        return
+    from src.core.services.schedule_service import get_scheduler
+    get_scheduler().add_job(
+        run_canary,
+        trigger='date',
+        run_date=datetime.now() + timedelta(seconds=config.CANARY_RETRY_SEC),
+        args=[for_run_at, master_password, job_id],
+        id=f"_canary_retry_{job_id or for_run_at.strftime('%Y%m%d%H%M%S')}",
+        name="事前チェック (再確認)",
+        replace_existing=True,
+    )
+    logger.info(f"Canary retry scheduled in {config.CANARY_RETRY_SEC:.0f}s")
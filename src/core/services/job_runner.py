@@ -0,0 +1,191 @@
+"""
+バックグラウンドジョブ実行モジュール
+
+「今すぐ実行」のジョブをワーカースレッドで実行し、フェーズごとの進捗を保持します。
+UI は submit() で即座に job_id を受け取り、get() で進捗をポーリングします。
+cancel() で待機中・実行中のジョブを中断できます (ブラウザと bw プロセスを終了し、ワーカーを解放します)。
+"""
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from src.config import settings as config
+from src.core import metrics
+from src.core.context import CancelToken, DeadlineExceededError, JobCancelledError
+
+logger = logging.getLogger(__name__)
+
+# 表示用のフェーズ名
+PHASE_LABELS = {
+    "queued": "待機中",
+    "credentials": "認証情報の確認",
+    "unlock": "Bitwarden ロック解除",
+    "sync": "保管庫の同期",
+    "browser_start": "ブラウザ起動",
+    "login": "ログイン",
+    "click": "打刻",
+    "retry_wait": "リトライ待機",
+}
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_SUCCESS = "success"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+
+
+@dataclass
+class JobProgress:
+    """1件のジョブの進捗情報"""
+    job_id: str
+    clock_type: str
+    is_dry_run: bool
+    submitted_at: datetime = field(default_factory=datetime.now)
+    status: str = STATUS_QUEUED
+    phases: List[Tuple[str, datetime]] = field(default_factory=list)
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    profile: bool = False
+
+    @property
+    def current_phase(self) -> str:
+        return self.phases[-1][0] if self.phases else "queued"
+
+    @property
+    def is_done(self) -> bool:
+        return self.status in (STATUS_SUCCESS, STATUS_FAILED, STATUS_CANCELLED)
+
+
+class JobRunner:
+    """
+    ジョブをスレッドプールで非同期実行します。
+    複数のジョブを同時に実行でき、完了済みの進捗は一定件数まで保持されます。
+    """
+
+    def __init__(self, max_workers: int = config.RUNNER_MAX_WORKERS, history_size: int = config.RUNNER_HISTORY_SIZE):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job-runner")
+        self._jobs: "OrderedDict[str, JobProgress]" = OrderedDict()
+        self._tokens: Dict[str, CancelToken] = {}
+        self._history_size = history_size
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        clock_type: str,
+        is_dry_run: bool,
+        master_password: Optional[str] = None,
+        headless: bool = False,
+        profile: bool = False,
+    ) -> str:
+        """
+        ジョブを登録して即座に job_id を返します。
+        profile=True の場合はプロファイルを取得します (JobService.run_job を参照)。
+        """
+        # JobService は selenium を読み込むため、実際に使うまで import しない
+        from src.core.services.job_service import JobService
+
+        job_id = JobService.new_job_id(clock_type)
+        progress = JobProgress(job_id=job_id, clock_type=clock_type, is_dry_run=is_dry_run, profile=profile)
+        with self._lock:
+            self._jobs[job_id] = progress
+            self._tokens[job_id] = CancelToken()
+            self._trim()
+
+        self._executor.submit(self._execute, progress, master_password, headless, profile)
+        logger.info(f"Job Submitted: {job_id}")
+        return job_id
+
+    def _execute(self, progress: JobProgress, master_password: Optional[str], headless: bool, profile: bool) -> None:
+        from src.core.services.job_service import JobService
+
+        def on_phase(name: str) -> None:
+            with self._lock:
+                progress.phases.append((name, datetime.now()))
+
+        with self._lock:
+            token = self._tokens[progress.job_id]
+            if token.cancelled:
+                # 待機中にキャンセルされたジョブは実行しない
+                progress.status = STATUS_CANCELLED
+                progress.error = str(token.error())
+                progress.finished_at = datetime.now()
+                del self._tokens[progress.job_id]
+                return
+            progress.status = STATUS_RUNNING
+        metrics.SCHEDULER_LAG_SECONDS.observe((datetime.now() - progress.submitted_at).total_seconds(), trigger="manual")
+        try:
+            JobService().run_job(
+                progress.clock_type, progress.is_dry_run, master_password,
+                headless=headless, on_phase=on_phase, job_id=progress.job_id, trigger="manual", profile=profile,
+                cancel_token=token,
+            )
+            status, error = STATUS_SUCCESS, None
+        except DeadlineExceededError as e:
+            status, error = STATUS_FAILED, str(e)
+        except JobCancelledError as e:
+            status, error = STATUS_CANCELLED, str(e)
+        except Exception as e:
+            status, error = STATUS_FAILED, str(e)
+
+        with self._lock:
+            progress.status = status
+            progress.error = error
+            progress.finished_at = datetime.now()
+            del self._tokens[progress.job_id]
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        待機中・実行中のジョブを中断します。
+        実行中の場合はブラウザと bw プロセスが終了され、ワーカーはすぐに解放されます。
+
+        Returns:
+            bool: 中断を受け付けた場合 True (完了済み・不明なジョブは False)
+        """
+        with self._lock:
+            token = self._tokens.get(job_id)
+            progress = self._jobs.get(job_id)
+        if token is None:
+            return False
+        accepted = token.cancel("画面から中断されました")
+        with self._lock:
+            if accepted and progress is not None and progress.status == STATUS_QUEUED:
+                progress.status = STATUS_CANCELLED
+                progress.error = str(token.error())
+                progress.finished_at = datetime.now()
+        return accepted
+
+    def _trim(self) -> None:
+        """完了済みのジョブを古い順に削除して履歴件数を抑えます (ロック取得済みで呼ぶこと)"""
+        overflow = len(self._jobs) - self._history_size
+        for job_id in [j for j, p in self._jobs.items() if p.is_done][:max(overflow, 0)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[JobProgress]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[JobProgress]:
+        """新しい順にジョブの進捗を返します"""
+        with self._lock:
+            return list(reversed(self._jobs.values()))
+
+    def active_count(self) -> int:
+        with self._lock:
+            return sum(1 for p in self._jobs.values() if not p.is_done)
+
+
+_runner: Optional[JobRunner] = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> JobRunner:
+    """プロセス共有の JobRunner を取得します"""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner()
+        return _runner
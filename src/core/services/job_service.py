@@ -1,11 +1,19 @@
 import logging
+import threading
+import time
+import uuid
 from datetime import datetime
-from typing import Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from src.config import settings as config
 from src.core.usecase import run_process
 from src.core.bitwarden import BitwardenClient
 from src.core.credentials import CredentialManager
+from src.core import metrics, profiling, resilience
+from src.core.context import CancelToken, JobCancelledError, RunContext, job_context, set_phase
+from src.core.resilience import IdempotencyStore, RetryPolicy
+from src.core.timesync import server_now
+from src.core.services.job_store import JobStore, STATUS_FAILED, STATUS_SUCCESS
 
 logger = logging.getLogger(__name__)
 
@@ -13,58 +21,301 @@ class JobService:
     """
     ジョブ実行管理サービス
     打刻プロセスの実行、認証情報の解決、ログ記録を担当します。
+    失敗時はエラー種別に応じてバックオフ付きでリトライします。
     """
 
-    def run_job(self, clock_type: str, is_dry_run: bool, master_password: Optional[str] = None, headless: bool = False) -> None:
+    def __init__(
+        self,
+        retry_policy: Optional[RetryPolicy] = None,
+        idempotency: Optional[IdempotencyStore] = None,
+        store: Optional[JobStore] = None,
+        credentials_provider: Optional[Callable[[], Optional[Dict[str, str]]]] = None,
+        automator_factory: Optional[Callable[..., Any]] = None,
+    ):
+        """
+        Args:
+            credentials_provider: 解決済みの認証情報を返す関数 (常駐デーモン用)。
+                値を返した場合、キャッシュ確認と Bitwarden のロック解除を省略します。
+            automator_factory: run_process に渡すブラウザの生成関数 (起動済みブラウザの再利用用)
+        """
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.idempotency = idempotency or IdempotencyStore()
+        self.store = store or JobStore()
+        self.credentials_provider = credentials_provider
+        self.automator_factory = automator_factory
+
+    @staticmethod
+    def new_job_id(clock_type: str) -> str:
+        return f"{clock_type}_{datetime.now().strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+    @staticmethod
+    def _phase_durations(marks: List[Tuple[str, float]], end: float) -> Dict[str, float]:
+        """フェーズ開始時刻の列から、フェーズ別の所要秒数 (同名フェーズは合算) を求めます"""
+        durations: Dict[str, float] = {}
+        for i, (name, started) in enumerate(marks):
+            finished = marks[i + 1][1] if i + 1 < len(marks) else end
+            durations[name] = round(durations.get(name, 0.0) + (finished - started), 3)
+        return durations
+
+    def run_job(
+        self,
+        clock_type: str,
+        is_dry_run: bool,
+        master_password: Optional[str] = None,
+        headless: bool = False,
+        on_phase: Optional[Callable[[str], None]] = None,
+        job_id: Optional[str] = None,
+        trigger: str = "manual",
+        profile: bool = False,
+        account: Optional[str] = None,
+        cancel_token: Optional[CancelToken] = None,
+        deadline_sec: Optional[float] = None,
+        scheduled_for: Optional[datetime] = None,
+    ) -> None:
         """
         打刻ジョブを実行します。
-        
+        実行結果は JobStore に構造化レコードとして保存されます。
+
         Args:
             clock_type (str): 'in' または 'out'
             is_dry_run (bool): テスト実行フラグ
             master_password (Optional[str]): Bitwarden Master Password (キャッシュがない場合に使用)
             headless (bool): ブラウザを非表示にするか
+            on_phase (Optional[Callable[[str], None]]): 処理フェーズの開始通知
+                ('credentials', 'unlock', 'sync', 'browser_start', 'login', 'click', 'retry_wait')
+            job_id (Optional[str]): ジョブID (省略時は自動採番)
+            trigger (str): 起動元 ('manual' / 'scheduled' など)
+            profile (bool): cProfile の下で実行し、プロファイルとフェーズ別の内訳を
+                settings.PROFILE_DIR/<job_id>/ に保存する
+            account (Optional[str]): Bitwarden のアイテム名 (省略時は settings.BITWARDEN_ITEM_NAME)
+            cancel_token (Optional[CancelToken]): 外部 (UI など) からの中断通知 (省略時は期限切れのみ)
+            deadline_sec (Optional[float]): ジョブ全体の期限 (秒, 省略時は settings.JOB_DEADLINE_SEC)。
+                期限を過ぎると実行中のブラウザと bw プロセスを終了して DeadlineExceededError になります。
+            scheduled_for (Optional[datetime]): 予約日時 (サーバー時刻, 予約実行のみ)。起動の遅れをログに記録します
         """
-        log_prefix = f"[{datetime.now().strftime('%H:%M:%S')}]"
-        # ログメッセージの統一
-        msg_start = f"Job Started: {clock_type} (Dry={is_dry_run})"
-        
-        # 標準出力とロガー両方に出す (Streamlitのログ表示対策)
-        print(f"{log_prefix} {msg_start}")
-        logger.info(msg_start)
+        job_id = job_id or self.new_job_id(clock_type)
+        if scheduled_for is not None:
+            lag = (server_now() - scheduled_for).total_seconds()
+            logger.info(f"Scheduled job triggered: {job_id} (lag={lag:+.3f}s)", extra={"duration_ms": round(lag * 1000, 1)})
+            metrics.SCHEDULER_LAG_SECONDS.observe(lag, trigger=trigger)
+        cancel_token = cancel_token or CancelToken()
+        deadline_sec = deadline_sec or config.JOB_DEADLINE_SEC
+        # ジョブの実行条件は不変のコンテキストとして下位層へ明示的に渡す (共有設定は書き換えない)
+        ctx = RunContext(
+            job_id=job_id,
+            clock_type=clock_type,
+            is_dry_run=is_dry_run,
+            headless=headless,
+            account=account or config.BITWARDEN_ITEM_NAME,
+            trigger=trigger,
+            deadline=time.monotonic() + deadline_sec,
+            cancel_token=cancel_token,
+        )
+        # 待機の切り詰めだけでは止まらない処理 (応答しない Chrome など) も期限で確実に打ち切る
+        timer = threading.Timer(
+            deadline_sec, cancel_token.cancel,
+            kwargs={"reason": f"ジョブの期限 ({deadline_sec:.0f}秒) を過ぎました", "deadline": True},
+        )
+        timer.daemon = True
+        timer.start()
+        try:
+            with job_context(job_id, ctx), profiling.profile_job(job_id, enabled=profile) as job_profile:
+                if job_profile:
+                    on_phase = job_profile.chain(on_phase)
+                self._run_with_retry(ctx, master_password, on_phase)
+        finally:
+            timer.cancel()
+
+    def _run_with_retry(
+        self,
+        ctx: RunContext,
+        master_password: Optional[str],
+        on_phase: Optional[Callable[[str], None]],
+    ) -> None:
+        clock_type, job_id = ctx.clock_type, ctx.job_id
+        # ログメッセージの統一 (ログ概要の集計で使用。構造化ログでは event フィールドで判定する)
+        logger.info(f"Job Started: {clock_type} (Dry={ctx.is_dry_run})", extra={"event": "job_started"})
+
+        marks: List[Tuple[str, float]] = []
+
+        def record_phase(name: str) -> None:
+            now = time.monotonic()
+            if marks:
+                prev_name, prev_started = marks[-1]
+                logger.info(
+                    f"Phase finished: {prev_name}",
+                    extra={"duration_ms": round((now - prev_started) * 1000, 1)},
+                )
+            marks.append((name, now))
+            set_phase(name)
+            if on_phase:
+                on_phase(name)
 
         try:
-            # 1. 認証チェック (Local Cache -> Bitwarden)
-            cm = CredentialManager()
-            
-            if cm.is_cached(config.BITWARDEN_ITEM_NAME):
-                # ケースA: キャッシュヒット
-                logger.info("Cache hit: Starting job without Bitwarden unlock.")
-                run_process(clock_type, is_dry_run, session_key=None, headless=headless)
-            
-            else:
-                # ケースB: キャッシュミス (ロック解除が必要)
-                if not master_password:
-                    raise ValueError("認証キャッシュがなく、Master Passwordも指定されていません。")
+            self.store.start(job_id, ctx.account, clock_type, ctx.is_dry_run, trigger=ctx.trigger)
+        except Exception as e:
+            # 記録の失敗で打刻を止めない
+            logger.error(f"ジョブ記録の保存に失敗しました: {e}")
+
+        # 二重打刻防止キー (本番のみ)
+        punch_key = None
+        if not ctx.is_dry_run:
+            punch_key = IdempotencyStore.make_key(ctx.account, clock_type)
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                ctx.check()
+                self._run_once(ctx, master_password, punch_key, record_phase)
+
+                logger.info(
+                    "Job Completed Successfully.",
+                    extra={
+                        "event": "job_completed",
+                        "duration_ms": round((time.monotonic() - marks[0][1]) * 1000, 1) if marks else None,
+                    },
+                )
+                self._save_result(ctx, STATUS_SUCCESS, marks, attempt)
+                return
 
+            except Exception as e:
+                # 中断でブラウザや bw が終了したことによる二次的な例外は、中断として扱う
+                cancelled = ctx.cancel_token.error() if ctx.cancel_token else None
+                if cancelled is not None and not isinstance(e, JobCancelledError):
+                    e = cancelled
+                kind = resilience.classify_error(e)
+                delay = self.retry_policy.delay(attempt)
+                remaining = ctx.remaining()
+                if self.retry_policy.should_retry(kind, attempt) and (remaining is None or delay < remaining):
+                    resilience.emit_alert(
+                        "job_retry",
+                        f"{clock_type} の実行に失敗しました ({kind}: {e})。{delay:.1f}秒後にリトライします "
+                        f"({attempt}/{self.retry_policy.max_attempts})",
+                        clock_type=clock_type, kind=kind, attempt=attempt,
+                    )
+                    record_phase("retry_wait")
+                    try:
+                        ctx.sleep(delay)
+                        continue
+                    except JobCancelledError as cancelled_error:
+                        e, kind = cancelled_error, resilience.classify_error(cancelled_error)
+
+                if attempt > 1:
+                    resilience.emit_alert(
+                        "job_gave_up",
+                        f"{clock_type} は{attempt}回試行しましたが失敗しました ({kind})",
+                        clock_type=clock_type, kind=kind, attempt=attempt,
+                    )
+                logger.error(f"Job Failed: {e}", extra={"event": "job_failed"})
+                self._save_result(ctx, STATUS_FAILED, marks, attempt, error=e, error_class=kind)
+                raise e
+
+    def _save_result(
+        self,
+        ctx: RunContext,
+        status: str,
+        marks: List[Tuple[str, float]],
+        attempts: int,
+        error: Optional[BaseException] = None,
+        error_class: Optional[str] = None,
+    ) -> None:
+        phases = self._phase_durations(marks, time.monotonic())
+        mode = metrics.mode_label(ctx.is_dry_run)
+        metrics.JOBS.inc(clock_type=ctx.clock_type, mode=mode, outcome=error_class or status)
+        if phases:
+            metrics.JOB_SECONDS.observe(sum(phases.values()), clock_type=ctx.clock_type, mode=mode)
+        for name, seconds in phases.items():
+            metrics.PHASE_SECONDS.observe(seconds, phase=name)
+        try:
+            self.store.finish(
+                ctx.job_id, status,
+                phases=phases,
+                attempts=attempts, error=error, error_class=error_class,
+            )
+        except Exception as e:
+            logger.error(f"ジョブ記録の保存に失敗しました: {e}")
+
+    def _run_once(
+        self,
+        ctx: RunContext,
+        master_password: Optional[str],
+        punch_key: Optional[str],
+        on_phase: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        """1回分の試行 (認証 -> 打刻)。サーキットブレーカーと打刻記録を適用します。"""
+        def phase(name: str) -> None:
+            if on_phase:
+                on_phase(name)
+
+        if punch_key:
+            record = self.idempotency.get(punch_key)
+            if record:
+                raise resilience.DuplicatePunchError(
+                    f"打刻 {punch_key} はすでに記録されているため実行しません (status={record.get('status')})"
+                )
+
+        site = resilience.get_breaker("site")
+        vault = resilience.get_breaker("vault")
+
+        # 1. 認証チェック (Resident -> Local Cache -> Bitwarden)
+        phase("credentials")
+        cm = CredentialManager()
+        session_key = None
+        credentials = self.credentials_provider() if self.credentials_provider else None
+
+        if credentials:
+            # ケース0: 常駐プロセスが保持している認証情報を使用
+            logger.info("Resident credentials: Starting job without cache lookup.")
+        elif cm.is_cached(ctx.account):
+            # ケースA: キャッシュヒット
+            logger.info("Cache hit: Starting job without Bitwarden unlock.")
+        else:
+            # ケースB: キャッシュミス (ロック解除が必要)
+            if not master_password:
+                raise ValueError("認証キャッシュがなく、Master Passwordも指定されていません。")
+
+            vault.check()
+            try:
                 # ロック解除
+                phase("unlock")
                 bw = BitwardenClient()
                 session_key = bw.unlock(master_password)
                 if not session_key:
                     raise RuntimeError("Unlock failed (Session key is empty)")
-                
+
                 # Sync (最新化)
+                phase("sync")
                 bw.sync()
-                
-                # セッションキーを使用して実行
-                run_process(clock_type, is_dry_run, session_key, headless=headless)
-            
-            msg_end = "Job Completed Successfully."
-            print(f"{log_prefix} {msg_end}")
-            logger.info(msg_end)
-            
+            except Exception:
+                vault.record_failure()
+                raise
+            vault.record_success()
+
+        # 2. 打刻実行
+        before_click = (lambda: self.idempotency.begin(punch_key, job_id=ctx.job_id)) if punch_key else None
+        site.check()
+        try:
+            run_process(
+                ctx.clock_type, ctx.is_dry_run, session_key, headless=ctx.headless,
+                before_click=before_click, on_phase=on_phase,
+                credentials=credentials, automator_factory=self.automator_factory,
+                context=ctx,
+            )
         except Exception as e:
-            msg_err = f"Job Failed: {e}"
-            print(f"{log_prefix} {msg_err}")
-            logger.error(msg_err)
-            raise e
+            kind = resilience.classify_error(e)
+            if ctx.cancelled:
+                # 中断による例外は中断の種別で判定する (利用者による中断はサイトの障害として数えない)
+                kind = resilience.classify_error(ctx.cancel_token.error())
+            if kind == resilience.ERROR_BITWARDEN:
+                vault.record_failure()
+                site.release()
+            elif kind in (resilience.ERROR_DUPLICATE, resilience.ERROR_CONFIG, resilience.ERROR_CANCELLED):
+                site.release()
+            else:
+                site.record_failure()
+            raise
+        site.record_success()
+
+        if punch_key:
+            self.idempotency.complete(punch_key)
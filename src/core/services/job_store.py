@@ -0,0 +1,180 @@
+"""
+ジョブ実行結果ストア
+
+JobService の実行ごとに構造化レコード (ジョブID, アカウント, タイプ, モード, 開始/終了時刻,
+フェーズ別所要時間, エラー種別) を SQLite に保存します。
+UI はログ文字列を解析せず、インデックス付きのクエリで履歴を取得します。
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.config import settings as config
+
+logger = logging.getLogger(__name__)
+
+STATUS_RUNNING = "running"
+STATUS_SUCCESS = "success"
+STATUS_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS job_runs (
+    job_id        TEXT PRIMARY KEY,
+    account       TEXT NOT NULL,
+    clock_type    TEXT NOT NULL,
+    mode          TEXT NOT NULL,
+    trigger       TEXT NOT NULL,
+    started_at    TEXT NOT NULL,
+    ended_at      TEXT,
+    status        TEXT NOT NULL,
+    attempts      INTEGER NOT NULL DEFAULT 1,
+    phases        TEXT,
+    error_class   TEXT,
+    error_message TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_job_runs_started ON job_runs (started_at);
+CREATE INDEX IF NOT EXISTS idx_job_runs_account_started ON job_runs (account, started_at);
+"""
+
+
+class JobStore:
+    """
+    ジョブ実行結果の永続化 (SQLite)
+
+    スレッドごとに接続を作り直すため、スケジューラのワーカースレッドからも安全に呼び出せます。
+    """
+
+    _init_lock = threading.Lock()
+    _initialized: set = set()
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.path.join(config.STATE_DIR, "jobs.db")
+        self._ensure_schema()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """トランザクション付きの接続を開き、終了時に閉じます"""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _to_record(row: sqlite3.Row) -> Dict[str, Any]:
+        record = dict(row)
+        record["phases"] = json.loads(record["phases"]) if record["phases"] else {}
+        return record
+
+    def _ensure_schema(self) -> None:
+        with self._init_lock:
+            if self.db_path in self._initialized:
+                return
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.executescript(_SCHEMA)
+            self._initialized.add(self.db_path)
+
+    def start(
+        self,
+        job_id: str,
+        account: str,
+        clock_type: str,
+        is_dry_run: bool,
+        trigger: str = "manual",
+        started_at: Optional[datetime] = None,
+    ) -> None:
+        """ジョブ開始を記録します"""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO job_runs "
+                "(job_id, account, clock_type, mode, trigger, started_at, status) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id, account, clock_type, "dry" if is_dry_run else "live", trigger,
+                    (started_at or datetime.now()).isoformat(timespec="milliseconds"), STATUS_RUNNING,
+                ),
+            )
+
+    def finish(
+        self,
+        job_id: str,
+        status: str,
+        phases: Optional[Dict[str, float]] = None,
+        attempts: int = 1,
+        error: Optional[BaseException] = None,
+        error_class: Optional[str] = None,
+        ended_at: Optional[datetime] = None,
+    ) -> None:
+        """
+        ジョブ終了を記録します。
+
+        Args:
+            phases (Dict[str, float]): フェーズ名 -> 所要秒数
+            error_class (str): エラー種別 (resilience.classify_error の結果)
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE job_runs SET status = ?, ended_at = ?, attempts = ?, phases = ?, "
+                "error_class = ?, error_message = ? WHERE job_id = ?",
+                (
+                    status,
+                    (ended_at or datetime.now()).isoformat(timespec="milliseconds"),
+                    attempts,
+                    json.dumps(phases or {}),
+                    error_class,
+                    str(error) if error else None,
+                    job_id,
+                ),
+            )
+
+    @staticmethod
+    def _where(since: Optional[date], until: Optional[date], account: Optional[str]):
+        clauses, params = [], []
+        if since:
+            clauses.append("started_at >= ?")
+            params.append(since.isoformat())
+        if until:
+            clauses.append("started_at < ?")
+            params.append((until + timedelta(days=1)).isoformat())
+        if account:
+            clauses.append("account = ?")
+            params.append(account)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def query(
+        self,
+        since: Optional[date] = None,
+        until: Optional[date] = None,
+        account: Optional[str] = None,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> List[Dict[str, Any]]:
+        """
+        実行履歴を新しい順に取得します (日付範囲は両端を含む)
+        """
+        where, params = self._where(since, until, account)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM job_runs {where} ORDER BY started_at DESC LIMIT ? OFFSET ?",
+                (*params, limit, offset),
+            ).fetchall()
+        return [self._to_record(row) for row in rows]
+
+    def count(self, since: Optional[date] = None, until: Optional[date] = None, account: Optional[str] = None) -> int:
+        where, params = self._where(since, until, account)
+        with self._connect() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM job_runs {where}", params).fetchone()[0]
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM job_runs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._to_record(row) if row else None
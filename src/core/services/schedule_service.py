@@ -0,0 +1,307 @@
+"""
+予約管理サービス
+
+APScheduler への予約登録・一覧・削除・再スケジュールをまとめます。
+Web UI の単発予約・一括インポート・一括操作は、すべてこのサービスを経由します。
+
+予約日時はサーバー (Touch On Time) の時刻で扱います。APScheduler はローカル時計で動くため、
+登録時に推定したずれ (src.core.timesync) を差し引いたローカル時刻で登録し、
+予約日時そのものはジョブの引数 (scheduled_for) に保持します。
+"""
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional, Set, Tuple
+
+from src.config import settings as config
+from src.core import validator
+from src.core.timesync import get_time_sync, server_now
+
+logger = logging.getLogger(__name__)
+
+_TYPE_LABELS = {"in": "出勤 (IN)", "out": "退勤 (OUT)"}
+
+
+@dataclass
+class ScheduledPunch:
+    """予約済みジョブの表示用情報"""
+    job_id: str
+    name: str
+    clock_type: str
+    is_dry_run: bool
+    run_at: Optional[datetime]
+
+
+class ScheduleService:
+    """
+    打刻ジョブの予約を管理します。
+
+    ジョブは JobService.run_job(clock_type, is_dry_run, master_password, headless) として登録され、
+    ジョブIDは '{type}_{YYYYmmddHHMMSS}' 形式です。
+    ID が '_' で始まるジョブ (時刻同期・事前チェックなど) は内部用で、予約の一覧には含めません。
+    予約ごとに事前チェック '_canary_{ジョブID}' を settings.CANARY_LEAD_SEC 前に登録します
+    (失敗時の再確認は '_canary_retry_{ジョブID}')。予約の削除・変更時はあわせて取り除きます。
+    """
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+
+    @staticmethod
+    def make_job_id(clock_type: str, run_at: datetime) -> str:
+        return f"{clock_type}_{run_at.strftime('%Y%m%d%H%M%S')}"
+
+    @staticmethod
+    def make_name(clock_type: str, is_dry_run: bool) -> str:
+        mode = "テスト (Dry Run)" if is_dry_run else "本番 (Live)"
+        return f"{_TYPE_LABELS.get(clock_type, clock_type)} ({mode})"
+
+    def add(
+        self,
+        clock_type: str,
+        run_at: datetime,
+        is_dry_run: bool,
+        master_password: Optional[str] = None,
+        headless: bool = True,
+        name: Optional[str] = None,
+    ) -> str:
+        """
+        打刻ジョブを予約します。
+
+        Returns:
+            str: ジョブID
+
+        Raises:
+            apscheduler.jobstores.base.ConflictingIdError: 同じ日時・タイプの予約がすでにある場合
+        """
+        # JobService は selenium を読み込むため、実際に使うまで import しない
+        from src.core.services.job_service import JobService
+
+        job_id = self.make_job_id(clock_type, run_at)
+        self.scheduler.add_job(
+            JobService().run_job,
+            trigger='date',
+            run_date=self._local(run_at),
+            args=[clock_type, is_dry_run, master_password, headless],
+            kwargs={"trigger": "scheduled", "scheduled_for": run_at},
+            id=job_id,
+            name=name or self.make_name(clock_type, is_dry_run),
+            misfire_grace_time=3600,  # 1時間の遅延まで許容(これがないと少し過ぎただけで実行されない)
+        )
+        logger.info(f"Job Scheduled: {run_at} id={job_id}")
+        self._add_canary(job_id, run_at, master_password)
+        return job_id
+
+    def _add_canary(self, job_id: str, run_at: datetime, master_password: Optional[str]) -> None:
+        """打刻の settings.CANARY_LEAD_SEC 前に事前チェックを予約します (間に合わない場合は今すぐ)"""
+        if not config.CANARY_ENABLED:
+            return
+        # 事前チェックは selenium を読み込むため、実際に使うまで import しない
+        from src.core.services.canary import run_canary
+
+        now = server_now()
+        if (run_at - now).total_seconds() < config.CANARY_MIN_LEAD_SEC:
+            return
+        canary_at = max(run_at - timedelta(seconds=config.CANARY_LEAD_SEC), now)
+        self.scheduler.add_job(
+            run_canary,
+            trigger='date',
+            run_date=self._local(canary_at),
+            args=[run_at, master_password, job_id],
+            id=f"_canary_{job_id}",
+            name=f"事前チェック ({job_id})",
+            misfire_grace_time=max(int(config.CANARY_LEAD_SEC - config.CANARY_MIN_LEAD_SEC), 1),
+            replace_existing=True,
+        )
+
+    def _remove_canary(self, job_id: str) -> None:
+        """予約に紐づく事前チェックと再確認を削除します"""
+        for canary_id in (f"_canary_{job_id}", f"_canary_retry_{job_id}"):
+            if self.scheduler.get_job(canary_id) is not None:
+                self.scheduler.remove_job(canary_id)
+
+    @staticmethod
+    def _local(run_at: datetime) -> datetime:
+        """予約日時 (サーバー時刻) をスケジューラに登録するローカル時刻に変換します"""
+        if not config.TIMESYNC_ENABLED:
+            return run_at
+        return get_time_sync().to_local(run_at, refresh=False)
+
+    @staticmethod
+    def _scheduled_for(job) -> Optional[datetime]:
+        scheduled_for = job.kwargs.get("scheduled_for")
+        if scheduled_for is not None:
+            return scheduled_for
+        # 時刻同期の導入前に登録されたジョブは、ローカルの実行予定時刻をそのまま使う
+        return job.next_run_time.replace(tzinfo=None) if job.next_run_time else None
+
+    def list_punches(self) -> List[ScheduledPunch]:
+        """予約済みジョブを実行予定順に返します (run_at はサーバー時刻)"""
+        punches = []
+        for job in self.scheduler.get_jobs():
+            if job.id.startswith("_"):
+                continue
+            args = list(job.args) + [None, None]
+            punches.append(ScheduledPunch(
+                job_id=job.id,
+                name=job.name,
+                clock_type=args[0],
+                is_dry_run=bool(args[1]),
+                run_at=self._scheduled_for(job) if job.next_run_time else None,
+            ))
+        return punches
+
+    def existing_keys(self) -> Set[Tuple[date, str]]:
+        """予約済みの (日付, 打刻タイプ) の組 (重複チェック用)"""
+        return {(p.run_at.date(), p.clock_type) for p in self.list_punches() if p.run_at}
+
+    def drop(self, job_ids: Iterable[str]) -> int:
+        """
+        予約を削除します (すでに実行・削除済みのものは無視します)
+
+        Returns:
+            int: 削除した件数
+        """
+        dropped = 0
+        for job_id in job_ids:
+            if self.scheduler.get_job(job_id) is None:
+                continue
+            self.scheduler.remove_job(job_id)
+            self._remove_canary(job_id)
+            dropped += 1
+        if dropped:
+            logger.info(f"Jobs Dropped: {dropped}")
+        return dropped
+
+    def shift(self, job_ids: Iterable[str], delta: timedelta, now: Optional[datetime] = None) -> Tuple[int, List[str]]:
+        """
+        予約の実行時刻をずらします。
+        ずらした結果が過去、または推奨時間帯の範囲外になるジョブは変更しません。
+
+        Returns:
+            Tuple[int, List[str]]: (変更した件数, 変更できなかった理由のリスト)
+        """
+        now = now or server_now()
+        by_id = {p.job_id: p for p in self.list_punches()}
+        moved, errors = 0, []
+        for job_id in job_ids:
+            punch = by_id.get(job_id)
+            if punch is None or punch.run_at is None:
+                continue
+            new_at = punch.run_at + delta
+            if new_at <= now:
+                errors.append(f"{job_id}: 変更後の日時 ({new_at}) が過去です")
+                continue
+            if new_at.date() != punch.run_at.date() or not validator.is_within_window(punch.clock_type, new_at.time()):
+                start, end = validator.get_window(punch.clock_type)
+                errors.append(
+                    f"{job_id}: 変更後の時刻 ({new_at.strftime('%m/%d %H:%M')}) が "
+                    f"推奨時間帯 ({start.strftime('%H:%M')} - {end.strftime('%H:%M')}) の範囲外です"
+                )
+                continue
+            new_id = self.make_job_id(punch.clock_type, new_at)
+            if new_id != job_id and self.scheduler.get_job(new_id) is not None:
+                errors.append(f"{job_id}: 変更後の日時 ({new_at}) にすでに同じタイプの予約があります")
+                continue
+            self._move(job_id, new_at)
+            moved += 1
+        if moved:
+            logger.info(f"Jobs Rescheduled: {moved} (shift={delta})")
+        return moved, errors
+
+    def _move(self, job_id: str, run_at: datetime) -> str:
+        """
+        予約を run_at に移します。ジョブIDは日時を含むため、新しいIDで登録し直して古い予約を削除します。
+
+        Returns:
+            str: 新しいジョブID
+        """
+        job = self.scheduler.get_job(job_id)
+        clock_type = (list(job.args) + [None])[0]
+        new_id = self.make_job_id(clock_type, run_at)
+        if new_id != job_id:
+            self.scheduler.add_job(
+                job.func,
+                trigger='date',
+                run_date=self._local(run_at),
+                args=list(job.args),
+                kwargs={**job.kwargs, "scheduled_for": run_at},
+                id=new_id,
+                name=job.name,
+                misfire_grace_time=job.misfire_grace_time,
+            )
+            self.scheduler.remove_job(job_id)
+        else:
+            self.scheduler.modify_job(job_id, kwargs={**job.kwargs, "scheduled_for": run_at})
+            self.scheduler.reschedule_job(job_id, trigger='date', run_date=self._local(run_at))
+        self._remove_canary(job_id)
+        self._add_canary(new_id, run_at, (list(job.args) + [None, None, None])[2])
+        logger.info(f"Job Moved: {job_id} -> {new_id} ({run_at})")
+        return new_id
+
+    def realign(self) -> int:
+        """
+        時計のずれの推定値が変わった場合に、予約済みジョブのローカル実行時刻を合わせ直します。
+
+        Returns:
+            int: 実行時刻を変更した件数
+        """
+        realigned = 0
+        for job in self.scheduler.get_jobs():
+            scheduled_for = job.kwargs.get("scheduled_for")
+            if job.id.startswith("_") or scheduled_for is None or job.next_run_time is None:
+                continue
+            local = self._local(scheduled_for)
+            current = job.next_run_time.replace(tzinfo=None)
+            if abs((local - current).total_seconds()) < config.TIMESYNC_REALIGN_SEC:
+                continue
+            self.scheduler.reschedule_job(job.id, trigger='date', run_date=local)
+            # 事前チェックは実行時刻を持たないため、打刻と同じだけずらす
+            canary = self.scheduler.get_job(f"_canary_{job.id}")
+            if canary is not None and canary.next_run_time is not None:
+                self.scheduler.reschedule_job(
+                    canary.id, trigger='date', run_date=canary.next_run_time.replace(tzinfo=None) + (local - current)
+                )
+            realigned += 1
+        if realigned:
+            logger.info(f"Jobs Realigned: {realigned} (offset={get_time_sync().offset(refresh=False):+.3f}s)")
+        return realigned
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """
+    プロセス共有の BackgroundScheduler を取得します (初回呼び出し時に起動)。
+    Web UI と事前起動 (warm_start) の両方から同じインスタンスを使います。
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            from apscheduler.schedulers.background import BackgroundScheduler
+            _scheduler = BackgroundScheduler()
+            _scheduler.start()
+            if config.TIMESYNC_ENABLED:
+                # 起動直後と推定値の期限ごとにずれを測り直し、予約の実行時刻を合わせる
+                _scheduler.add_job(
+                    _sync_clock,
+                    trigger='interval',
+                    seconds=config.TIMESYNC_TTL_SEC,
+                    next_run_time=datetime.now(),
+                    id="_timesync",
+                    name="時刻同期",
+                    replace_existing=True,
+                )
+        return _scheduler
+
+
+def _sync_clock() -> None:
+    # 期限内の推定値を捨てて必ず測り直す (失敗時は前回の推定値のまま)
+    try:
+        get_time_sync().measure()
+    except (OSError, ValueError, TypeError) as e:
+        logger.warning(f"サーバー時刻の取得に失敗しました (前回の推定値を使います): {e}")
+        return
+    ScheduleService(_scheduler).realign()
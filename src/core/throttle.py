@@ -0,0 +1,114 @@
+"""
+プロセス全体で共有するレートリミッタ
+
+同じ分に予約が集中した場合でも、Touch On Time へのログインや
+Bitwarden CLI の起動が一斉に走らないように制御します。
+"""
+import threading
+import time
+import logging
+from typing import Dict, Optional
+
+from src.config import settings as config
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    トークンバケット (スレッドセーフ)
+
+    rate_per_sec の速度でトークンが補充され、最大 capacity 個まで貯まります。
+    """
+
+    def __init__(self, rate_per_sec: float, capacity: int):
+        if rate_per_sec <= 0 or capacity <= 0:
+            raise ValueError("rate_per_sec と capacity は正の値を指定してください。")
+        self.rate = rate_per_sec
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        トークンを1つ取得します。取得できるまでブロックします。
+
+        Returns:
+            bool: 取得できればTrue (timeout 超過時は False)
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+class Throttle:
+    """
+    同時実行数の上限 (セマフォ) と開始レート (トークンバケット) を組み合わせた制御
+
+    Usage:
+        with get_throttle("login"):
+            ...
+    """
+
+    def __init__(self, name: str, max_concurrency: int, rate_per_sec: float, burst: int):
+        self.name = name
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._bucket = TokenBucket(rate_per_sec, burst)
+
+    def __enter__(self):
+        started = time.monotonic()
+        self._slots.acquire()
+        try:
+            self._bucket.acquire()
+        except BaseException:
+            self._slots.release()
+            raise
+        waited = time.monotonic() - started
+        if waited > 0.5:
+            logger.info(f"[{self.name}] 混雑のため {waited:.1f}秒 待機しました")
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._slots.release()
+
+
+_throttles: Dict[str, Throttle] = {}
+_registry_lock = threading.Lock()
+
+
+def _build(name: str) -> Throttle:
+    if name == "login":
+        return Throttle(name, config.LOGIN_MAX_CONCURRENCY, config.LOGIN_RATE_PER_SEC, config.LOGIN_BURST)
+    if name == "bitwarden":
+        return Throttle(name, config.BW_MAX_CONCURRENCY, config.BW_RATE_PER_SEC, config.BW_BURST)
+    if name == "site":
+        return Throttle(name, config.SITE_MAX_CONCURRENCY, config.SITE_RATE_PER_SEC, config.SITE_BURST)
+    raise KeyError(f"未定義のスロットル名です: {name}")
+
+
+def get_throttle(name: str) -> Throttle:
+    """
+    名前付きのプロセス共有スロットルを取得します ('login', 'bitwarden' または 'site')
+    """
+    with _registry_lock:
+        if name not in _throttles:
+            _throttles[name] = _build(name)
+        return _throttles[name]
@@ -0,0 +1,231 @@
+"""
+サーバー時刻との同期
+
+Touch On Time の HTTP 応答の Date ヘッダーからローカル時計とのずれ (offset) を推定します。
+WSL2 などスリープ復帰後にローカル時計がずれる環境でも、予約の実行・時間帯チェックを
+サーバー時刻に合わせるために使います。
+
+Date ヘッダーは秒単位のため、1回の応答からは「サーバー時刻は [D, D+1) 秒のどこか」までしか分かりません。
+送信・受信時刻 (往復時間) を考慮すると各応答から offset の範囲が求まるため、
+秒の境目をまたぐよう間隔をずらして複数回サンプリングし、範囲の共通部分から推定します。
+
+    offset = サーバー時刻 - ローカル時刻 (秒, 正ならローカル時計が遅れている)
+
+推定値は settings.TIMESYNC_TTL_SEC の間キャッシュします。
+"""
+import http.client
+import logging
+import statistics
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from src.config import settings as config
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ClockOffset:
+    """
+    ローカル時計のずれの推定値
+
+    Attributes:
+        offset_sec (float): サーバー時刻 - ローカル時刻 (秒)
+        uncertainty_sec (float): 推定の誤差範囲 (±秒)
+        samples (int): 推定に使った応答数
+        measured_at (float): 推定した時刻 (time.monotonic())
+    """
+    offset_sec: float
+    uncertainty_sec: float
+    samples: int
+    measured_at: float
+
+    def age(self) -> float:
+        return time.monotonic() - self.measured_at
+
+
+# (送信時刻, 受信時刻, Date ヘッダーの時刻) いずれも UNIX 時刻
+Sample = Tuple[float, float, float]
+
+
+def estimate_offset(samples: List[Sample]) -> Tuple[float, float]:
+    """
+    サンプルから (offset, 誤差範囲) を推定します。
+
+    各サンプルについて、サーバーが Date を付けた瞬間は送信から受信の間にあり、
+    その瞬間のサーバー時刻は [D, D+1) にあるため、offset は [D - 受信, D + 1 - 送信] に含まれます。
+    全サンプルの範囲の共通部分の中央を推定値とします。
+    共通部分が空の場合 (サーバー側の時計の揺れなど) は、各サンプルの中央値を使います。
+
+    Raises:
+        ValueError: サンプルがない場合
+    """
+    if not samples:
+        raise ValueError("サンプルがありません")
+    lower = max(date - received for sent, received, date in samples)
+    upper = min(date + 1.0 - sent for sent, received, date in samples)
+    if lower <= upper:
+        return (lower + upper) / 2, (upper - lower) / 2
+
+    midpoints = [date + 0.5 - (sent + received) / 2 for sent, received, date in samples]
+    spread = max(midpoints) - min(midpoints)
+    return statistics.median(midpoints), max(spread / 2, 0.5)
+
+
+class TimeSync:
+    """
+    サーバー時刻とのずれを推定・キャッシュします。
+
+    Args:
+        url (str): Date ヘッダーを取得する URL (既定は Touch On Time の打刻画面)
+        samples (int): 1回の推定で送るリクエスト数
+        ttl (float): 推定値を再利用する秒数
+        timeout (float): 1リクエストのタイムアウト秒数
+    """
+
+    def __init__(
+        self,
+        url: str = config.TOUCH_ON_TIME_URL,
+        samples: int = config.TIMESYNC_SAMPLES,
+        ttl: float = config.TIMESYNC_TTL_SEC,
+        timeout: float = config.TIMESYNC_TIMEOUT_SEC,
+    ):
+        self.url = url
+        self.samples = max(samples, 1)
+        self.ttl = ttl
+        self.timeout = timeout
+        self._estimate: Optional[ClockOffset] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> http.client.HTTPConnection:
+        parts = urlsplit(self.url)
+        cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        return cls(parts.netloc, timeout=self.timeout)
+
+    def _sample(self, conn: http.client.HTTPConnection, path: str) -> Optional[Sample]:
+        sent = time.time()
+        conn.request("HEAD", path, headers={"Cache-Control": "no-cache"})
+        response = conn.getresponse()
+        received = time.time()
+        response.read()
+        header = response.getheader("Date")
+        if not header:
+            return None
+        try:
+            return sent, received, parsedate_to_datetime(header).timestamp()
+        except (ValueError, TypeError):
+            # 形式が不正な Date ヘッダーはサンプルとして使わない
+            logger.debug(f"Date ヘッダーを解釈できませんでした: {header!r}")
+            return None
+
+    def _collect(self) -> List[Sample]:
+        """1本の接続で self.samples 回問い合わせ、Date ヘッダーを得られたサンプルを返します"""
+        parts = urlsplit(self.url)
+        path = parts.path or "/"
+        conn = self._connect()
+        samples: List[Sample] = []
+        try:
+            # 最初の1回は接続確立 (TLS ハンドシェイク) を含み往復時間が長いため推定に使わない
+            self._sample(conn, path)
+            for i in range(self.samples):
+                if i:
+                    # 送信時刻の小数部をずらし、Date の秒の境目をまたぐサンプルを得る
+                    time.sleep(1.0 / self.samples)
+                sample = self._sample(conn, path)
+                if sample:
+                    samples.append(sample)
+        except (http.client.HTTPException, OSError) as e:
+            if not samples:
+                raise OSError(f"サーバー時刻を取得できませんでした: {e}") from e
+        finally:
+            conn.close()
+        return samples
+
+    def measure(self) -> ClockOffset:
+        """
+        サーバーへ問い合わせて推定値を更新します。
+        打刻と同じサイトのため、サイト用のスロットルを通して送り、ブレーカー ('site') が開いている間は問い合わせません。
+
+        Raises:
+            OSError: サーバーに接続できない、Date ヘッダーを取得できない、またはブレーカーが開いている場合
+        """
+        from src.core import resilience
+        from src.core.throttle import get_throttle
+
+        if resilience.get_breaker("site").state == resilience.CircuitBreaker.OPEN:
+            raise OSError("サイトのサーキットブレーカーが開いているため問い合わせません")
+        with get_throttle("site"):
+            samples = self._collect()
+        if not samples:
+            raise OSError("サーバーの応答に Date ヘッダーがありません")
+
+        offset, uncertainty = estimate_offset(samples)
+        estimate = ClockOffset(offset, uncertainty, len(samples), time.monotonic())
+        with self._lock:
+            self._estimate = estimate
+        logger.info(f"Clock offset: {offset:+.3f}s (±{uncertainty:.3f}s, samples={len(samples)})")
+        if abs(offset) > config.TIMESYNC_ALERT_SEC:
+            resilience.emit_alert(
+                "clock_drift",
+                f"ローカル時計がサーバー時刻から {offset:+.1f} 秒ずれています。予約はサーバー時刻に合わせて実行します。",
+                offset_sec=round(offset, 3),
+            )
+        return estimate
+
+    def estimate(self, refresh: bool = True) -> Optional[ClockOffset]:
+        """
+        推定値を返します。期限切れで refresh=True の場合は問い合わせ直します。
+        問い合わせに失敗した場合は前回の推定値 (なければ None) を返します。
+        """
+        with self._lock:
+            current = self._estimate
+        if current is not None and current.age() < self.ttl:
+            return current
+        if not refresh:
+            return current
+        try:
+            return self.measure()
+        except OSError as e:
+            logger.warning(f"サーバー時刻の取得に失敗しました (前回の推定値を使います): {e}")
+            return current
+
+    def offset(self, refresh: bool = True) -> float:
+        """ずれ (秒)。推定値がない場合は 0.0"""
+        estimate = self.estimate(refresh)
+        return estimate.offset_sec if estimate else 0.0
+
+    def now(self, refresh: bool = True) -> datetime:
+        """サーバー時刻に合わせた現在時刻 (ローカルのタイムゾーン, naive)"""
+        return datetime.now() + timedelta(seconds=self.offset(refresh))
+
+    def to_local(self, server_time: datetime, refresh: bool = True) -> datetime:
+        """サーバー時刻をローカル時計の時刻に変換します (スケジューラへの登録用)"""
+        return server_time - timedelta(seconds=self.offset(refresh))
+
+
+_time_sync: Optional[TimeSync] = None
+_time_sync_lock = threading.Lock()
+
+
+def get_time_sync() -> TimeSync:
+    """プロセス共有の TimeSync を取得します"""
+    global _time_sync
+    with _time_sync_lock:
+        if _time_sync is None:
+            _time_sync = TimeSync()
+        return _time_sync
+
+
+def server_now(refresh: bool = False) -> datetime:
+    """
+    サーバー時刻に合わせた現在時刻を返します (settings.TIMESYNC_ENABLED が False ならローカル時刻)。
+    既定では問い合わせを行わず、キャッシュ済みの推定値を使います。
+    """
+    if not config.TIMESYNC_ENABLED:
+        return datetime.now()
+    return get_time_sync().now(refresh)
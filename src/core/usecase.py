@@ -3,15 +3,27 @@ Core business logic for Touch On Time Automator
 """
 import sys
 import logging
+from typing import Callable, ContextManager, Dict, Optional
 from src.config import settings as config
 from src.core import validator
 from src.core.bitwarden import BitwardenClient
 from src.core.credentials import CredentialManager
 from src.core.automator import TouchOnTimeAutomator
+from src.core.context import RunContext, current_job_id
 
 logger = logging.getLogger("core")
 
-def run_process(clock_type: str, is_dry_run: bool, session_key: str = None, headless: bool = False) -> bool:
+def run_process(
+    clock_type: str,
+    is_dry_run: bool,
+    session_key: str = None,
+    headless: bool = False,
+    before_click: Optional[Callable[[], None]] = None,
+    on_phase: Optional[Callable[[str], None]] = None,
+    credentials: Optional[Dict[str, str]] = None,
+    automator_factory: Optional[Callable[..., ContextManager[TouchOnTimeAutomator]]] = None,
+    context: Optional[RunContext] = None,
+) -> bool:
     """
     打刻プロセスを実行します。
     Args:
@@ -19,11 +31,28 @@ def run_process(clock_type: str, is_dry_run: bool, session_key: str = None, head
         is_dry_run (bool): TrueならDryRun
         session_key (str): Bitwardenセッションキー (Optional)
         headless (bool): Trueならブラウザを表示しない (Default: False)
+        before_click (callable): 本番クリック直前に呼び出すフック (Optional)
+        on_phase (callable): 処理フェーズ ('browser_start', 'login', 'click') の開始通知 (Optional)
+        credentials (dict): 解決済みの認証情報 {'username', 'password'} (Optional, 常駐デーモン用)
+        automator_factory (callable): (headless, before_click, context) を受け取り TouchOnTimeAutomator を返す
+            コンテキストマネージャの生成関数 (Optional, 起動済みブラウザの再利用用)
+        context (RunContext): ジョブの実行条件 (Optional)。省略時は引数から作成します。
+            指定した場合は clock_type / is_dry_run / headless よりこちらを優先します。
     Returns:
         bool: 成功ならTrue
     """
-    # config更新
-    config.DRY_RUN = is_dry_run
+    # 共有の設定 (config.DRY_RUN) は書き換えず、ジョブごとのコンテキストで渡す
+    ctx = context or RunContext(
+        job_id=current_job_id() or f"{clock_type}_adhoc",
+        clock_type=clock_type,
+        is_dry_run=is_dry_run,
+        headless=headless,
+    )
+    clock_type, is_dry_run, headless = ctx.clock_type, ctx.is_dry_run, ctx.headless
+
+    def phase(name: str) -> None:
+        if on_phase:
+            on_phase(name)
     
     logger.info(f"NODE: {'[DRY RUN]' if is_dry_run else '[LIVE EXECUTION]'} / TYPE: {clock_type.upper()}")
 
@@ -37,19 +66,25 @@ def run_process(clock_type: str, is_dry_run: bool, session_key: str = None, head
 
         # 1. 認証情報の取得 (Local Cache or Bitwarden)
         # SessionKeyがある場合(またはNoneでも)、必要に応じてBitwardenClientを作成するファクトリを渡す
-        cm = CredentialManager()
-        creds = cm.get_credentials(
-            config.BITWARDEN_ITEM_NAME,
-            bw_client_factory=lambda: BitwardenClient(session_key=session_key)
-        )
+        creds = credentials
+        if creds is None:
+            cm = CredentialManager()
+            creds = cm.get_credentials(
+                ctx.account,
+                bw_client_factory=lambda: BitwardenClient(session_key=session_key)
+            )
         
         username = creds["username"]
         password = creds["password"]
         
         # 2. Automation実行
-        with TouchOnTimeAutomator(headless=headless) as bot:
+        phase("browser_start")
+        factory = automator_factory or TouchOnTimeAutomator
+        with factory(headless=headless, before_click=before_click, context=ctx) as bot:
+            phase("login")
             bot.login(username, password)
-            
+
+            phase("click")
             if clock_type == "in":
                 bot.clock_in()
             elif clock_type == "out":
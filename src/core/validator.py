@@ -4,45 +4,63 @@ Validation Module
 """
 import logging
 from datetime import datetime, time
+from typing import Dict, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
-def validate_time(clock_type: str) -> None:
+# 打刻タイプごとの推奨時間帯
+# 出勤: 08:45 - 09:00 / 退勤: 18:00 - 20:00
+TIME_WINDOWS: Dict[str, Tuple[time, time]] = {
+    'in': (time(8, 45), time(9, 0)),
+    'out': (time(18, 0), time(20, 0)),
+}
+
+_LABELS = {'in': "出勤", 'out': "退勤"}
+
+
+def get_window(clock_type: str) -> Tuple[time, time]:
+    """
+    打刻タイプの推奨時間帯 (開始, 終了) を返します。
+
+    Raises:
+        ValueError: 不明な打刻タイプの場合
+    """
+    if clock_type not in TIME_WINDOWS:
+        raise ValueError(f"不明な打刻タイプです: {clock_type}")
+    return TIME_WINDOWS[clock_type]
+
+
+def is_within_window(clock_type: str, t: time) -> bool:
+    """指定時刻が推奨時間帯に含まれるか判定します (両端を含む)"""
+    start, end = get_window(clock_type)
+    return start <= t <= end
+
+
+def validate_time(clock_type: str, now: Optional[datetime] = None) -> None:
     """
     現在の時刻が指定された打刻タイプの許容範囲内かチェックし、
     範囲外の場合は警告ログを出力します。
 
     Args:
         clock_type (str): 'in' (出勤) or 'out' (退勤)
+        now (datetime, optional): 判定に使う時刻 (省略時はサーバー時刻に合わせた現在時刻)
     """
-    now = datetime.now().time()
-    
-    # 時間設定
-    # 出勤: 08:45 - 09:00
-    in_start = time(8, 45)
-    in_end = time(9, 0)
-    
-    # 退勤: 18:00 - 20:00
-    out_start = time(18, 0)
-    out_end = time(20, 0)
-
-    if clock_type == 'in':
-        if not (in_start <= now <= in_end):
-            logger.warning(
-                f"現在時刻 ({now.strftime('%H:%M')}) は "
-                f"推奨出勤時間 ({in_start.strftime('%H:%M')} - {in_end.strftime('%H:%M')}) の範囲外です。"
-            )
-        else:
-            logger.info("現在時刻は推奨出勤時間の範囲内です。")
-
-    elif clock_type == 'out':
-        if not (out_start <= now <= out_end):
-            logger.warning(
-                f"現在時刻 ({now.strftime('%H:%M')}) は "
-                f"推奨退勤時間 ({out_start.strftime('%H:%M')} - {out_end.strftime('%H:%M')}) の範囲外です。"
-            )
-        else:
-            logger.info("現在時刻は推奨退勤時間の範囲内です。")
+    if clock_type not in TIME_WINDOWS:
+        logger.warning(f"不明な打刻タイプです: {clock_type}")
+        return
+
+    if now is None:
+        # 打刻処理の途中で問い合わせないよう、スケジューラが更新しているキャッシュ済みの推定値を使う
+        from src.core.timesync import server_now
+        now = server_now()
+    current = now.time()
+    start, end = TIME_WINDOWS[clock_type]
+    label = _LABELS[clock_type]
 
+    if not is_within_window(clock_type, current):
+        logger.warning(
+            f"現在時刻 ({current.strftime('%H:%M')}) は "
+            f"推奨{label}時間 ({start.strftime('%H:%M')} - {end.strftime('%H:%M')}) の範囲外です。"
+        )
     else:
-        logger.warning(f"不明な打刻タイプです: {clock_type}")
+        logger.info(f"現在時刻は推奨{label}時間の範囲内です。")
@@ -0,0 +1,389 @@
+"""
+ローカル HTTP/JSON 制御 API
+
+Streamlit UI と同じプロセス (スケジューラ・JobRunner を所有するプロセス) の中で、
+asyncio のサーバーをバックグラウンドスレッドで動かします。
+スクリプトや自動化ツールは UI を描画せずに、打刻の実行・予約・状態確認を行えます。
+
+Endpoints:
+    GET    /health               稼働状態 (スケジューラ, 実行中ジョブ数, サーキットブレーカー, ブラウザのメモリ)
+    GET    /metrics              メトリクス (Prometheus テキスト形式)
+    POST   /jobs                 今すぐ実行 {"type": "in", "live": false, "headless": true} -> 202
+    GET    /jobs                 直近の実行ジョブ一覧
+    GET    /jobs/{job_id}        ジョブの進捗 (実行中) または実行結果 (JobStore)
+    DELETE /jobs/{job_id}        待機中・実行中のジョブの中断
+    GET    /schedules            予約一覧
+    POST   /schedules            予約 {"type": "in", "run_at": "2026-01-05T08:55:00", "window_end": 任意} -> 201
+    DELETE /schedules/{job_id}   予約の削除
+
+settings.API_TOKEN が設定されている場合、/health 以外は 'Authorization: Bearer <token>' が必要です。
+
+ブラウザ上の任意のページから 127.0.0.1 へ打刻を送られないよう (CSRF / DNS リバインディング)、
+Origin ヘッダー付きのリクエストとループバック以外の Host は拒否し、POST には
+'Content-Type: application/json' を要求します (ブラウザはこの指定でプリフライトなしに送信できない)。
+"""
+import asyncio
+import hmac
+import json
+import logging
+import threading
+from datetime import datetime
+from http import HTTPStatus
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from src.config import settings as config
+from src.core import metrics, resilience
+from src.core.browser_registry import get_browser_registry
+from src.core.scheduling import pick_jittered_time
+from src.core.services.job_runner import JobProgress, JobRunner, get_job_runner
+from src.core.services.job_store import JobStore
+from src.core.services.canary import get_canary
+from src.core.services.schedule_service import ScheduleService
+from src.core.timesync import get_time_sync, server_now
+
+logger = logging.getLogger(__name__)
+
+# リクエストボディの上限
+MAX_BODY_BYTES = 64 * 1024
+# ヘッダー受信のタイムアウト秒数
+READ_TIMEOUT_SEC = 10.0
+# 受け付ける Host ヘッダーのホスト名 (ポートを除く)
+ALLOWED_HOSTS = ("127.0.0.1", "localhost", "[::1]")
+
+
+class TextBody(str):
+    """JSON ではなくテキストとして返す応答 (Prometheus テキスト形式)"""
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class ApiError(Exception):
+    """HTTP ステータス付きのエラー (JSON で {"error": message} を返す)"""
+
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _progress_to_dict(progress: JobProgress) -> Dict[str, Any]:
+    return {
+        "job_id": progress.job_id,
+        "type": progress.clock_type,
+        "mode": "dry" if progress.is_dry_run else "live",
+        "status": progress.status,
+        "phase": progress.current_phase,
+        "phases": [{"name": name, "at": ts.isoformat(timespec="seconds")} for name, ts in progress.phases],
+        "submitted_at": progress.submitted_at.isoformat(timespec="seconds"),
+        "finished_at": progress.finished_at.isoformat(timespec="seconds") if progress.finished_at else None,
+        "error": progress.error,
+    }
+
+
+def _require_type(body: Dict[str, Any]) -> str:
+    clock_type = body.get("type")
+    if clock_type not in ("in", "out"):
+        raise ApiError(HTTPStatus.BAD_REQUEST, "type は 'in' または 'out' を指定してください")
+    return clock_type
+
+
+def _require_bool(body: Dict[str, Any], field: str, default: bool) -> bool:
+    # "false" などの文字列を真と解釈して実際に打刻しないよう、JSON の true / false のみ受け付ける
+    value = body.get(field, default)
+    if not isinstance(value, bool):
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"{field} は true または false で指定してください")
+    return value
+
+
+def _parse_datetime(value: Any, field: str) -> datetime:
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"{field} は ISO 8601 形式で指定してください")
+    # タイムゾーン付きの指定はローカル時刻に変換する (スケジューラはローカル時刻で動作)
+    return parsed.astimezone().replace(tzinfo=None) if parsed.tzinfo else parsed
+
+
+class ApiServer:
+    """
+    ローカル制御 API サーバー
+
+    Args:
+        schedule_service (ScheduleService): 予約の登録・削除先
+        job_runner (JobRunner, optional): 今すぐ実行の投入先 (省略時はプロセス共有の JobRunner)
+        password_provider (Callable[[], Optional[str]], optional):
+            Master Password の取得元 (認証キャッシュがない場合に使用。UI でログイン済みの値など)
+    """
+
+    def __init__(
+        self,
+        schedule_service: ScheduleService,
+        job_runner: Optional[JobRunner] = None,
+        password_provider: Optional[Callable[[], Optional[str]]] = None,
+        host: str = config.API_HOST,
+        port: int = config.API_PORT,
+        token: Optional[str] = config.API_TOKEN,
+    ):
+        self.schedule_service = schedule_service
+        self.job_runner = job_runner or get_job_runner()
+        self.password_provider = password_provider or (lambda: None)
+        self.host = host
+        self.port = port
+        self.token = token
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    # -------------------------------------------------------------------------
+    # 起動・停止
+    # -------------------------------------------------------------------------
+    def start(self) -> None:
+        """
+        バックグラウンドスレッドでサーバーを起動し、待ち受け開始まで待ちます。
+
+        Raises:
+            OSError: ポートが使用中などで待ち受けできない場合
+        """
+        ready = threading.Event()
+        errors = []
+
+        def run() -> None:
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            try:
+                self._server = self._loop.run_until_complete(
+                    asyncio.start_server(self._handle, self.host, self.port)
+                )
+            except OSError as e:
+                errors.append(e)
+                ready.set()
+                self._loop.close()
+                return
+            ready.set()
+            try:
+                self._loop.run_forever()
+            finally:
+                self._server.close()
+                self._loop.run_until_complete(self._server.wait_closed())
+                self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="api-server", daemon=True)
+        self._thread.start()
+        ready.wait()
+        if errors:
+            raise errors[0]
+        logger.info(f"API server listening on http://{self.host}:{self.port}")
+
+    def stop(self) -> None:
+        if self._loop and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    # -------------------------------------------------------------------------
+    # HTTP 処理
+    # -------------------------------------------------------------------------
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "internal error"}
+        method = path = "-"
+        try:
+            method, path, headers, body = await asyncio.wait_for(self._read_request(reader), READ_TIMEOUT_SEC)
+            self._check_origin(method, headers)
+            self._authorize(path, headers)
+            status, payload = await self._dispatch(method, path, body)
+        except ApiError as e:
+            status, payload = e.status, {"error": str(e)}
+        except asyncio.TimeoutError:
+            status, payload = HTTPStatus.REQUEST_TIMEOUT, {"error": "request timeout"}
+        except Exception as e:
+            logger.error(f"API request failed: {method} {path}: {e}")
+
+        if isinstance(payload, TextBody):
+            data, content_type = payload.encode("utf-8"), payload.content_type
+        else:
+            data, content_type = json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8"
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: close\r\n\r\n".encode("latin-1") + data
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+        logger.debug(f"API {method} {path} -> {status.value}")
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[str, str, Dict[str, str], Dict[str, Any]]:
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        parts = request_line.split()
+        if len(parts) != 3:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "malformed request line")
+        method, path = parts[0].upper(), parts[1].split("?", 1)[0].rstrip("/") or "/"
+
+        headers: Dict[str, str] = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1")
+            if line in ("\r\n", "\n", ""):
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "request body too large")
+        body: Dict[str, Any] = {}
+        if length:
+            try:
+                body = json.loads(await reader.readexactly(length))
+            except ValueError:
+                raise ApiError(HTTPStatus.BAD_REQUEST, "body must be JSON")
+            if not isinstance(body, dict):
+                raise ApiError(HTTPStatus.BAD_REQUEST, "body must be a JSON object")
+        return method, path, headers, body
+
+    def _check_origin(self, method: str, headers: Dict[str, str]) -> None:
+        # スクリプト (curl など) は Origin を送らない。ブラウザは他サイトからの fetch / form 送信に必ず付ける
+        if "origin" in headers:
+            raise ApiError(HTTPStatus.FORBIDDEN, "cross-origin requests are not allowed")
+        host = headers.get("host", "")
+        hostname = host.rsplit(":", 1)[0] if not host.endswith("]") else host
+        if host and hostname.lower() not in ALLOWED_HOSTS and hostname != self.host:
+            raise ApiError(HTTPStatus.FORBIDDEN, f"host not allowed: {host}")
+        if method == "POST" and headers.get("content-type", "").split(";")[0].strip().lower() != "application/json":
+            raise ApiError(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, "Content-Type: application/json が必要です")
+
+    def _authorize(self, path: str, headers: Dict[str, str]) -> None:
+        if not self.token or path == "/health":
+            return
+        supplied = headers.get("authorization", "")
+        if not hmac.compare_digest(supplied, f"Bearer {self.token}"):
+            raise ApiError(HTTPStatus.UNAUTHORIZED, "unauthorized")
+
+    async def _dispatch(self, method: str, path: str, body: Dict[str, Any]) -> Tuple[HTTPStatus, Any]:
+        segments = path.strip("/").split("/")
+        resource, item = segments[0], "/".join(segments[1:]) or None
+
+        if resource == "health" and method == "GET":
+            # スケジューラ・/proc の走査・Selenium の読み込みを伴う処理はイベントループを塞がないよう別スレッドで実行する
+            return HTTPStatus.OK, await asyncio.to_thread(self._health)
+        if resource == "metrics" and method == "GET":
+            # ブラウザのメモリは /proc を走査するため、イベントループを塞がないよう別スレッドで書き出す
+            return HTTPStatus.OK, TextBody(await asyncio.to_thread(metrics.render))
+        if resource == "jobs":
+            if method == "POST" and item is None:
+                return HTTPStatus.ACCEPTED, await asyncio.to_thread(self._run_now, body)
+            if method == "GET" and item is None:
+                return HTTPStatus.OK, [_progress_to_dict(p) for p in self.job_runner.list_jobs()]
+            if method == "GET":
+                # JobStore は SQLite のためイベントループを塞がないよう別スレッドで読む
+                return HTTPStatus.OK, await asyncio.to_thread(self._job_status, item)
+            if method == "DELETE" and item:
+                if not await asyncio.to_thread(self.job_runner.cancel, item):
+                    raise ApiError(HTTPStatus.NOT_FOUND, f"running job not found: {item}")
+                return HTTPStatus.ACCEPTED, {"job_id": item, "cancelled": True}
+        if resource == "schedules":
+            if method == "GET" and item is None:
+                return HTTPStatus.OK, await asyncio.to_thread(self._list_schedules)
+            if method == "POST" and item is None:
+                return HTTPStatus.CREATED, await asyncio.to_thread(self._add_schedule, body)
+            if method == "DELETE" and item:
+                if not await asyncio.to_thread(self.schedule_service.drop, [item]):
+                    raise ApiError(HTTPStatus.NOT_FOUND, f"schedule not found: {item}")
+                return HTTPStatus.OK, {"job_id": item, "dropped": True}
+        raise ApiError(HTTPStatus.NOT_FOUND, f"no route for {method} {path}")
+
+    # -------------------------------------------------------------------------
+    # 各エンドポイント
+    # -------------------------------------------------------------------------
+    def _health(self) -> Dict[str, Any]:
+        canary = get_canary().latest()
+        return {
+            "status": "ok",
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "scheduler_running": bool(getattr(self.schedule_service.scheduler, "running", False)),
+            "scheduled_jobs": len(self.schedule_service.list_punches()),
+            "active_jobs": self.job_runner.active_count(),
+            "circuits": {name: resilience.get_breaker(name).state for name in ("site", "vault")},
+            "browsers": get_browser_registry().memory().to_dict(),
+            "clock_offset_sec": round(get_time_sync().offset(refresh=False), 3),
+            "canary": canary.to_dict() if canary else None,
+        }
+
+    def _run_now(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        clock_type = _require_type(body)
+        is_dry_run = not _require_bool(body, "live", False)
+        headless = _require_bool(body, "headless", True)
+        job_id = self.job_runner.submit(clock_type, is_dry_run, self.password_provider(), headless=headless)
+        return {"job_id": job_id, "status_url": f"/jobs/{job_id}"}
+
+    def _job_status(self, job_id: str) -> Dict[str, Any]:
+        progress = self.job_runner.get(job_id)
+        if progress is not None:
+            return _progress_to_dict(progress)
+        record = JobStore().get(job_id)
+        if record is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"job not found: {job_id}")
+        return record
+
+    def _list_schedules(self):
+        return [
+            {
+                "job_id": p.job_id,
+                "name": p.name,
+                "type": p.clock_type,
+                "mode": "dry" if p.is_dry_run else "live",
+                "run_at": p.run_at.isoformat(timespec="seconds") if p.run_at else None,
+            }
+            for p in self.schedule_service.list_punches()
+        ]
+
+    def _add_schedule(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        clock_type = _require_type(body)
+        is_dry_run = not _require_bool(body, "live", False)
+        headless = _require_bool(body, "headless", True)
+        run_at = _parse_datetime(body.get("run_at"), "run_at")
+        try:
+            if body.get("window_end"):
+                run_at = pick_jittered_time(
+                    clock_type, run_at, _parse_datetime(body["window_end"], "window_end"), not_before=server_now()
+                )
+        except ValueError as e:
+            raise ApiError(HTTPStatus.BAD_REQUEST, str(e))
+        if run_at <= server_now():
+            raise ApiError(HTTPStatus.BAD_REQUEST, "未来の日時を指定してください")
+
+        try:
+            job_id = self.schedule_service.add(
+                clock_type, run_at, is_dry_run, self.password_provider(), headless=headless,
+            )
+        except Exception as e:
+            # 同じ日時・タイプの予約 (ConflictingIdError) など
+            raise ApiError(HTTPStatus.CONFLICT, str(e))
+        return {"job_id": job_id, "run_at": run_at.isoformat(timespec="seconds")}
+
+
+_api_server: Optional[ApiServer] = None
+_api_server_started = False
+_api_server_lock = threading.Lock()
+
+
+def ensure_api_server(schedule_service: ScheduleService) -> Optional[ApiServer]:
+    """
+    プロセス共有の API サーバーを起動して返します (settings.API_ENABLED が False、または起動失敗時は None)。
+    起動に失敗した場合 (ポート使用中など) は再試行しません。
+    """
+    global _api_server, _api_server_started
+    with _api_server_lock:
+        if not _api_server_started and config.API_ENABLED:
+            _api_server_started = True
+            server = ApiServer(schedule_service)
+            try:
+                server.start()
+                _api_server = server
+            except OSError as e:
+                logger.error(f"API server could not start on {server.host}:{server.port}: {e}")
+        return _api_server
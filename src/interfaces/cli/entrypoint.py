@@ -1,24 +1,22 @@
 """
 CLI Entry Point for Touch On Time Automator
+
+起動を速くするため、selenium / Bitwarden クライアントを含む usecase は
+打刻を実行する経路でのみ import します (--help や引数エラーでは読み込みません)。
 """
 import sys
-import logging
 import argparse
-from src.config import settings as config
-from src.core.usecase import run_process
-from src.utils.logger import setup_logger
 
-# -----------------------------------------------------------------------------
-# Logging Setup
-# -----------------------------------------------------------------------------
-logger = setup_logger("", log_file="logs/cli.log")
+DEFAULT_PROFILE_MODULE = "src.core.usecase"
+
 
-def parse_args():
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description="Touch On Time Auto Clock-In Tool")
     
-    # 必須引数: 打刻タイプ
+    # 打刻タイプ (--import-profile 以外では必須)
     parser.add_argument(
         "type",
+        nargs="?",
         choices=["in", "out"],
         help="打刻タイプ (in: 出勤, out: 退勤)"
     )
@@ -29,21 +27,148 @@ def parse_args():
         action="store_true",
         help="本番実行モード (指定しない場合はDryRun)"
     )
-    
-    return parser.parse_args()
 
-def main():
-    args = parse_args()
+    # 常駐デーモン経由で実行 (src/interfaces/daemon/server.py)
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="起動済みの常駐デーモンに打刻を依頼する (ブラウザ起動・認証を省略)"
+    )
+
+    # 診断: ジョブのプロファイル
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="cProfile の下で実行し、プロファイルとフェーズ別の内訳を output/profiles/ に保存する"
+    )
+    parser.add_argument(
+        "--profile-diff",
+        nargs=2,
+        metavar=("BEFORE", "AFTER"),
+        help="2つのプロファイル (profile.prof またはそのディレクトリ) を比較して終了"
+    )
+
+    # 診断: 打刻前の事前チェック (src/core/services/canary.py)
+    parser.add_argument(
+        "--canary",
+        action="store_true",
+        help="認証情報・保管庫・サイト・画面の要素を Dry Run で確認して終了 (打刻はしない)"
+    )
+
+    # 診断: import 時間のプロファイル
+    parser.add_argument(
+        "--import-profile",
+        nargs="?",
+        const=DEFAULT_PROFILE_MODULE,
+        metavar="MODULE",
+        help=f"モジュールごとの import 時間を表示して終了 (既定: {DEFAULT_PROFILE_MODULE})"
+    )
     
+    args = parser.parse_args(argv)
+    if args.type is None and args.import_profile is None and args.profile_diff is None and not args.canary:
+        parser.error("打刻タイプ (in / out) を指定してください")
+    if args.daemon and args.profile:
+        # デーモン経由ではこのプロセスで打刻しないため、プロファイルを取得できない
+        parser.error("--profile は --daemon と同時に指定できません")
+    return args
+
+
+def import_profile(module: str) -> int:
+    from src.utils.import_profile import format_report, profile_imports
+
+    try:
+        costs = profile_imports(module)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"Import profile: {module}")
+    print(format_report(costs))
+    return 0
+
+
+def run_via_daemon(clock_type: str, is_dry_run: bool) -> int:
+    from src.interfaces.daemon.client import DaemonUnavailableError, send_command
+
+    def on_event(message):
+        print(f"[{message.get('elapsed_ms', 0):8.1f} ms] {message.get('phase')}", flush=True)
+
+    try:
+        result = send_command({"cmd": "punch", "type": clock_type, "live": not is_dry_run}, on_event)
+    except DaemonUnavailableError as e:
+        print(f"{e}\n`make daemon` でデーモンを起動してください。", file=sys.stderr)
+        return 1
+
+    if result.get("ok"):
+        print(f"完了: {result.get('job_id')} ({result.get('elapsed_ms', 0):.0f} ms)")
+        return 0
+    print(f"失敗: {result.get('error')}", file=sys.stderr)
+    return 1
+
+
+def run_canary() -> int:
+    from src.core.services.canary import get_canary
+    from src.utils.logger import setup_logger
+
+    setup_logger("", log_file="logs/cli.log")
+    result = get_canary().run(force=True)
+    for check in result.checks:
+        print(f"{'OK ' if check.ok else 'NG '} {check.name:<12} {check.duration_ms:8.1f} ms  {check.detail}")
+    return 0 if result.ok else 1
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.import_profile:
+        sys.exit(import_profile(args.import_profile))
+
+    if args.profile_diff:
+        from src.core.profiling import diff_profiles
+        print(diff_profiles(*args.profile_diff))
+        return
+
+    if args.canary:
+        sys.exit(run_canary())
+
+    if args.daemon:
+        sys.exit(run_via_daemon(args.type, not args.live))
+
+    # ここから先は打刻を実行する経路 (重いモジュールを読み込む)
+    from src.core.context import RunContext
+    from src.core.usecase import run_process
+    from src.utils.logger import setup_logger
+
+    logger = setup_logger("", log_file="logs/cli.log")
+
     # モード判定
     is_dry_run = not args.live
     
     logger.info("=== Touch On Time 自動打刻処理開始 ===")
 
+    # 前回異常終了したジョブのブラウザが残っていれば回収する
+    from src.core.browser_registry import get_browser_registry
+    get_browser_registry().reap()
+
+    from datetime import datetime
+    from src.core.profiling import profile_job
+
+    job_id = f"cli_{args.type}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    # profile_job() の開始時に失敗した場合も finally で参照できるよう先に初期化する
+    job_profile = None
     try:
-        run_process(args.type, is_dry_run)
+        with profile_job(job_id, enabled=args.profile) as job_profile:
+            context = RunContext(job_id=job_id, clock_type=args.type, is_dry_run=is_dry_run, trigger="cli")
+            run_process(
+                args.type, is_dry_run,
+                on_phase=job_profile.on_phase if job_profile else None,
+                context=context,
+            )
     except Exception as e:
+        logger.error(f"打刻処理に失敗しました: {type(e).__name__}: {e}")
         sys.exit(1)
+    finally:
+        if job_profile is not None:
+            print(f"Profile: {job_profile.out_dir}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,47 @@
+"""
+常駐打刻デーモンのクライアント
+
+標準ライブラリ (socket, json) のみを使用するため、CLI の起動コストを増やしません。
+"""
+import json
+import socket
+from typing import Any, Callable, Dict, Optional
+
+from src.config import settings as config
+
+
+class DaemonUnavailableError(ConnectionError):
+    """デーモンが起動していない (ソケットに接続できない) ことを表す例外"""
+
+
+def send_command(
+    request: Dict[str, Any],
+    on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+    socket_path: str = config.DAEMON_SOCKET,
+    timeout: float = 300.0,
+) -> Dict[str, Any]:
+    """
+    デーモンに要求を送り、途中経過 (event='phase') を on_event に渡しながら最終結果を返します。
+
+    Raises:
+        DaemonUnavailableError: デーモンに接続できない場合
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        try:
+            sock.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError) as e:
+            raise DaemonUnavailableError(f"デーモンに接続できません ({socket_path}): {e}") from e
+
+        sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        with sock.makefile("r", encoding="utf-8") as stream:
+            for line in stream:
+                message = json.loads(line)
+                if message.get("event") == "result":
+                    return message
+                if on_event:
+                    on_event(message)
+    finally:
+        sock.close()
+    return {"event": "result", "ok": False, "error": "デーモンとの接続が切断されました"}
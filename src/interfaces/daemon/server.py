@@ -0,0 +1,350 @@
+"""
+常駐打刻デーモン
+
+Bitwarden のセッション・解決済みの認証情報・ログイン画面を読み込み済みのブラウザを保持し、
+Unix ドメインソケット経由で CLI (entrypoint.py --daemon) からの打刻要求を処理します。
+インタプリタ起動・selenium の import・Bitwarden のロック解除・Chrome の起動を打刻のたびに行いません。
+
+プロトコル (1行1 JSON):
+    要求: {"cmd": "punch", "type": "in", "live": false} / {"cmd": "status"} / {"cmd": "stop"}
+    応答: {"event": "phase", "phase": "login", "elapsed_ms": 12.3} ... を逐次送信し、
+          最後に {"event": "result", "ok": true, "job_id": "...", "elapsed_ms": 980.0} を送信
+
+Usage:
+    PYTHONPATH=. python src/interfaces/daemon/server.py [--show-browser]
+"""
+import argparse
+import getpass
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from src.config import settings as config
+from src.core import metrics
+from src.core.automator import TouchOnTimeAutomator
+from src.core.bitwarden import BitwardenClient
+from src.core.browser_registry import ensure_reaper, get_browser_registry
+from src.core.credentials import CredentialManager
+from src.core.context import RunContext
+from src.core.logger import setup_logging
+from src.core.services.job_service import JobService
+
+logger = logging.getLogger(__name__)
+
+
+class WarmBrowser:
+    """
+    ログイン画面を読み込み済みのブラウザを1つ待機させます。
+
+    貸し出したブラウザは打刻後に必ず終了し (セッションを持ち越さない)、
+    バックグラウンドで次のブラウザを準備します。一定時間使われなかったブラウザは作り直します。
+    """
+
+    def __init__(self, headless: bool = True, max_age_sec: float = config.DAEMON_BROWSER_MAX_AGE_SEC):
+        self.headless = headless
+        self.max_age_sec = max_age_sec
+        self._lock = threading.Lock()
+        self._ready: Optional[TouchOnTimeAutomator] = None
+        self._ready_at = 0.0
+        self._closed = False
+
+    @property
+    def is_ready(self) -> bool:
+        with self._lock:
+            return self._ready is not None
+
+    def warm_async(self) -> None:
+        threading.Thread(target=self._warm, name="warm-browser", daemon=True).start()
+
+    def _warm(self) -> None:
+        bot = TouchOnTimeAutomator(headless=self.headless)
+        try:
+            bot.setup_driver()
+            bot.preload()
+        except Exception as e:
+            logger.warning(f"待機ブラウザの準備に失敗しました (打刻時に起動します): {e}")
+            bot.teardown_driver()
+            return
+        with self._lock:
+            stale, self._ready, self._ready_at = self._ready, bot, time.monotonic()
+            if self._closed:
+                stale, self._ready = bot, None
+        if stale:
+            stale.teardown_driver()
+        logger.info("待機ブラウザの準備が完了しました")
+
+    def _take(self) -> Optional[TouchOnTimeAutomator]:
+        with self._lock:
+            bot, self._ready = self._ready, None
+            age = time.monotonic() - self._ready_at
+        if bot and age > self.max_age_sec:
+            logger.info(f"待機ブラウザが古いため作り直します ({age:.0f}秒)")
+            bot.teardown_driver()
+            return None
+        return bot
+
+    def refresh_if_stale(self) -> None:
+        """古くなった待機ブラウザを作り直します (定期的に呼び出す)"""
+        with self._lock:
+            stale = self._ready is not None and time.monotonic() - self._ready_at > self.max_age_sec
+        if stale:
+            bot = self._take()
+            if bot:
+                bot.teardown_driver()
+            self.warm_async()
+
+    @contextmanager
+    def lease(
+        self,
+        headless: bool = True,
+        before_click: Optional[Callable[[], None]] = None,
+        context: Optional[RunContext] = None,
+    ) -> Iterator[TouchOnTimeAutomator]:
+        """
+        run_process の automator_factory として使います。
+        待機ブラウザがなければその場で起動します (headless はデーモンの設定に従います)。
+        """
+        bot = self._take()
+        if bot is None:
+            bot = TouchOnTimeAutomator(headless=self.headless)
+            bot.setup_driver()
+        else:
+            logger.info("待機ブラウザを使用します")
+        bot.before_click = before_click
+        bot.attach(context)
+        try:
+            yield bot
+        finally:
+            bot.teardown_driver()
+            if not self._closed:
+                self.warm_async()
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            bot, self._ready = self._ready, None
+        if bot:
+            bot.teardown_driver()
+
+
+class PunchDaemon:
+    """
+    常駐プロセスの状態 (認証情報・Bitwarden セッション・待機ブラウザ) を保持し、打刻を直列に実行します。
+    """
+
+    def __init__(self, headless: bool = True):
+        self.browser = WarmBrowser(headless=headless)
+        self.credentials: Optional[Dict[str, str]] = None
+        self.session_key: Optional[str] = None
+        self.started_at = time.time()
+        self.punches = 0
+        # 待機ブラウザは1つなので、打刻は1件ずつ処理する
+        self._punch_lock = threading.Lock()
+
+    def prepare(self, master_password: Optional[str] = None) -> None:
+        """
+        認証情報を解決してメモリに保持し、待機ブラウザを準備します。
+        ローカルキャッシュ -> BW_SESSION -> Master Password (ロック解除) の順に試します。
+        """
+        cm = CredentialManager()
+        if not cm.is_cached(config.BITWARDEN_ITEM_NAME) and "BW_SESSION" not in os.environ:
+            if not master_password:
+                raise RuntimeError("認証キャッシュと BW_SESSION がないため、Master Password が必要です。")
+            bw = BitwardenClient()
+            self.session_key = bw.unlock(master_password)
+            if not self.session_key:
+                raise RuntimeError("Unlock failed (Session key is empty)")
+            bw.sync()
+
+        self.credentials = cm.get_credentials(
+            config.BITWARDEN_ITEM_NAME,
+            bw_client_factory=lambda: BitwardenClient(session_key=self.session_key),
+        )
+        logger.info("認証情報をメモリに保持しました")
+        self.browser.warm_async()
+
+    def punch(self, clock_type: str, is_dry_run: bool, emit: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+        started = time.monotonic()
+
+        def on_phase(name: str) -> None:
+            emit({"event": "phase", "phase": name, "elapsed_ms": round((time.monotonic() - started) * 1000, 1)})
+
+        job_id = JobService.new_job_id(clock_type)
+        with self._punch_lock:
+            on_phase("queued")
+            service = JobService(
+                credentials_provider=lambda: self.credentials,
+                automator_factory=self.browser.lease,
+            )
+            try:
+                service.run_job(clock_type, is_dry_run, on_phase=on_phase, job_id=job_id, trigger="daemon")
+                result = {"ok": True}
+            except Exception as e:
+                result = {"ok": False, "error": str(e)}
+            self.punches += 1
+        result.update(event="result", job_id=job_id, elapsed_ms=round((time.monotonic() - started) * 1000, 1))
+        return result
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "event": "result",
+            "ok": True,
+            "pid": os.getpid(),
+            "uptime_sec": round(time.time() - self.started_at),
+            "punches": self.punches,
+            "browser_ready": self.browser.is_ready,
+            "browser_rss_mb": get_browser_registry().memory().rss_mb,
+            "busy": self._punch_lock.locked(),
+        }
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        daemon: PunchDaemon = self.server.punch_daemon
+
+        def emit(message: Dict[str, Any]) -> None:
+            self.wfile.write((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            request = json.loads(self.rfile.readline() or b"{}")
+        except ValueError:
+            emit({"event": "result", "ok": False, "error": "invalid request"})
+            return
+
+        cmd = request.get("cmd")
+        if cmd == "punch":
+            clock_type = request.get("type")
+            if clock_type not in ("in", "out"):
+                emit({"event": "result", "ok": False, "error": "type は 'in' または 'out' を指定してください"})
+                return
+            emit(daemon.punch(clock_type, not request.get("live", False), emit))
+        elif cmd == "status":
+            emit(daemon.status())
+        elif cmd == "stop":
+            emit({"event": "result", "ok": True})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        else:
+            emit({"event": "result", "ok": False, "error": f"unknown command: {cmd}"})
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, daemon: PunchDaemon):
+        self.punch_daemon = daemon
+        super().__init__(path, _Handler)
+
+    def server_bind(self) -> None:
+        super().server_bind()
+        # 所有者のみ接続可能にする。listen() 前に変更するため、権限が緩い間に接続されることはない。
+        # (os.umask はプロセス全体に効き、起動済みのブラウザのファイルにも影響するため使わない)
+        os.chmod(self.server_address, 0o600)
+
+
+class DaemonAlreadyRunningError(RuntimeError):
+    """同じソケットで別のデーモンが待ち受けていることを表す例外"""
+
+
+def _remove_stale_socket(socket_path: str) -> None:
+    """
+    前回の異常終了で残ったソケットを削除します。
+
+    Raises:
+        DaemonAlreadyRunningError: 接続できた (別のデーモンが稼働中の) 場合
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except FileNotFoundError:
+        return
+    except ConnectionRefusedError:
+        # 待ち受けているプロセスがない
+        os.unlink(socket_path)
+        return
+    finally:
+        sock.close()
+    raise DaemonAlreadyRunningError(f"デーモンはすでに起動しています ({socket_path})")
+
+
+def serve(socket_path: str, daemon: PunchDaemon) -> None:
+    """
+    ソケットを作成して要求を処理します (stop 要求または Ctrl+C で終了)
+
+    Raises:
+        DaemonAlreadyRunningError: 同じソケットで別のデーモンが稼働中の場合
+    """
+    os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+    _remove_stale_socket(socket_path)
+
+    server = _Server(socket_path, daemon)
+    # 終了時に削除するのは自分が作成したソケットだけにする
+    socket_inode = os.stat(socket_path).st_ino
+
+    logger.info(f"Daemon listening on {socket_path}")
+    ensure_reaper()
+    metrics.ensure_textfile_writer("daemon")
+    threading.Thread(target=_refresh_loop, args=(daemon,), name="browser-refresh", daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.browser.close()
+        try:
+            if os.stat(socket_path).st_ino == socket_inode:
+                os.unlink(socket_path)
+        except FileNotFoundError:
+            pass
+        logger.info("Daemon stopped")
+
+
+def _refresh_loop(daemon: PunchDaemon) -> None:
+    while True:
+        time.sleep(60)
+        daemon.browser.refresh_if_stale()
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Touch On Time 常駐打刻デーモン")
+    parser.add_argument("--socket", default=config.DAEMON_SOCKET, help="Unix ドメインソケットのパス")
+    parser.add_argument("--show-browser", action="store_true", help="ブラウザを表示する (既定はヘッドレス)")
+    args = parser.parse_args(argv)
+
+    setup_logging("daemon", log_file="daemon.log")
+
+    # 保管庫のロック解除やブラウザの起動より前に、二重起動を検知する
+    try:
+        _remove_stale_socket(args.socket)
+    except DaemonAlreadyRunningError as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+    daemon = PunchDaemon(headless=not args.show_browser)
+    master_password = None
+    if not CredentialManager().is_cached(config.BITWARDEN_ITEM_NAME) and "BW_SESSION" not in os.environ:
+        master_password = getpass.getpass("Bitwarden Master Password: ")
+    try:
+        daemon.prepare(master_password)
+    except Exception as e:
+        logger.error(f"デーモンの準備に失敗しました: {e}")
+        sys.exit(1)
+
+    try:
+        serve(args.socket, daemon)
+    except DaemonAlreadyRunningError as e:
+        logger.error(str(e))
+        daemon.browser.close()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Web UI のヘルスチェック
+
+Streamlit のヘルスエンドポイント (/_stcore/health) をポーリングし、
+起動完了の検知 (バックオフ付き) と、起動後の無応答検知 (ウォッチドッグ) を行います。
+再起動で打刻を中断しないよう、実行中のジョブ数はローカル制御 API の /health で確認します。
+Tk に依存せず、結果はスレッドセーフな属性として GUI 側がポーリングします。
+"""
+import json
+import logging
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+HEALTH_PATH = "/_stcore/health"
+
+
+def probe(base_url: str, timeout: float = 2.0) -> bool:
+    """ヘルスエンドポイントが 200 を返せば True"""
+    try:
+        with urllib.request.urlopen(base_url.rstrip("/") + HEALTH_PATH, timeout=timeout) as resp:
+            return resp.status == 200
+    except (urllib.error.URLError, OSError, ValueError):
+        return False
+
+
+def active_jobs(api_url: str, timeout: float = 2.0) -> Optional[int]:
+    """ローカル制御 API の /health から実行中のジョブ数を返します (応答がなければ None)"""
+    try:
+        with urllib.request.urlopen(api_url.rstrip("/") + "/health", timeout=timeout) as resp:
+            return int(json.load(resp).get("active_jobs", 0))
+    except (urllib.error.URLError, OSError, ValueError, TypeError, AttributeError):
+        return None
+
+
+class ReadinessProbe:
+    """
+    起動完了までヘルスエンドポイントをポーリングします (0.1秒から倍々で最大2秒間隔)。
+
+    Attributes:
+        ready_after (float): 起動完了までの秒数 (未完了なら None)
+        failed (bool): timeout 秒以内に応答しなかった場合 True
+    """
+
+    def __init__(self, base_url: str, timeout: float, initial_delay: float = 0.1, max_delay: float = 2.0):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.ready_after: Optional[float] = None
+        self.failed = False
+        self._cancel = threading.Event()
+
+    def start(self) -> None:
+        threading.Thread(target=self._run, name="readiness-probe", daemon=True).start()
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def _run(self) -> None:
+        started = time.monotonic()
+        delay = self.initial_delay
+        while not self._cancel.is_set():
+            if probe(self.base_url, timeout=min(2.0, self.max_delay)):
+                self.ready_after = time.monotonic() - started
+                return
+            if time.monotonic() - started > self.timeout:
+                self.failed = True
+                return
+            self._cancel.wait(delay)
+            delay = min(delay * 2, self.max_delay)
+
+
+class Watchdog:
+    """
+    起動後に一定間隔でヘルスチェックし、連続 max_failures 回失敗したら unhealthy をセットします。
+
+    busy が True を返す間 (実行中のジョブがある間) は、max_defer 秒まで unhealthy のセットを見送ります。
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        interval: float,
+        max_failures: int,
+        busy: Optional[Callable[[], bool]] = None,
+        max_defer: float = 0.0,
+    ):
+        self.base_url = base_url
+        self.interval = interval
+        self.max_failures = max_failures
+        self.busy = busy
+        self.max_defer = max_defer
+        self.failures = 0
+        self.deferred = False
+        self.unhealthy = threading.Event()
+        self._cancel = threading.Event()
+
+    def start(self) -> None:
+        threading.Thread(target=self._run, name="watchdog", daemon=True).start()
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    def _run(self) -> None:
+        deferred_since = None
+        while not self._cancel.wait(self.interval):
+            if probe(self.base_url, timeout=self.interval):
+                self.failures = 0
+                self.deferred, deferred_since = False, None
+                continue
+            self.failures += 1
+            if self.failures < self.max_failures:
+                continue
+            now = time.monotonic()
+            if deferred_since is None or now - deferred_since < self.max_defer:
+                if self.busy and self.busy():
+                    if deferred_since is None:
+                        logger.warning("Server unresponsive but a job is running; deferring restart")
+                        deferred_since = now
+                    self.deferred = True
+                    continue
+            self.unhealthy.set()
+            return
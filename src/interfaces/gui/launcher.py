@@ -24,6 +24,24 @@ from PIL import Image, ImageTk
 import ctypes
 from ctypes import c_long, c_ulong, c_int, c_char_p, POINTER, byref
 
+from src.config import settings as config
+from src.core.logger import setup_logging
+from src.interfaces.gui.health import ReadinessProbe, Watchdog, active_jobs
+from src.interfaces.gui.output_pump import OutputPump
+
+# プロジェクトルート (src/interfaces/gui/launcher.py から3階層上)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+logger = setup_logging("launcher", log_file="launcher.log")
+
+# サーバー出力のリングバッファに保持する行数
+OUTPUT_BUFFER_LINES = 2000
+# ログコンソールに表示する最大行数 (超えた分は先頭から削除)
+CONSOLE_MAX_LINES = 1000
+# ログコンソールの更新間隔 (ミリ秒) と1回の更新で追加する最大行数
+CONSOLE_REFRESH_MS = 250
+CONSOLE_LINES_PER_TICK = 200
+
 # 外観設定
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("blue")
@@ -31,6 +49,9 @@ ctk.set_default_color_theme("blue")
 class LauncherApp(ctk.CTk):
     def __init__(self):
         super().__init__()
+        # 起動時間の計測 (ランチャー起動 -> UI 利用可能)
+        self.opened_at = time.monotonic()
+        self.started_at = None
         
         # ウィンドウ設定
         self.title("Touch On Time Launcher")
@@ -48,10 +69,19 @@ class LauncherApp(ctk.CTk):
         self.grid_rowconfigure(0, weight=1) # ステータス
         self.grid_rowconfigure(1, weight=2) # ボタン
         self.grid_rowconfigure(2, weight=1) # ログ
+        self.grid_rowconfigure(3, weight=4) # ログコンソール
 
         # プロセスハンドル
         self.process = None
-        self.server_url = "http://localhost:8501"
+        self.pump = None
+        self.pump_seq = 0
+        self.readiness = None
+        self.watchdog = None
+        self.server_url = f"http://localhost:{config.WEB_PORT}"
+        self.api_url = f"http://127.0.0.1:{config.API_PORT}"
+        # ウォッチドッグによる再起動の時刻 (monotonic)。回数の上限と待機秒数の算出に使う
+        self.restart_times = []
+        self.restart_after_id = None
         
         # アイコン設定
         self.setup_icon()
@@ -118,7 +148,13 @@ class LauncherApp(ctk.CTk):
             font=("Consolas", 11),
             text_color="gray"
         )
-        self.log_text.grid(row=2, column=0, pady=(0, 20))
+        self.log_text.grid(row=2, column=0, pady=(0, 5))
+
+        # === 4. ログコンソール (サーバー出力) ===
+        self.console = ctk.CTkTextbox(self, font=("Consolas", 10), height=160, wrap="none")
+        self.console.grid(row=3, column=0, padx=20, pady=(0, 20), sticky="nsew")
+        self.console.tag_config("stderr", foreground="#e0a060")
+        self.console.configure(state="disabled")
         
         # 終了処理
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
@@ -129,6 +165,10 @@ class LauncherApp(ctk.CTk):
         self.bind("<F3>", self.stop_server)
         self.bind("<Escape>", self.on_closing)
 
+        # 自動起動 (ウィンドウ表示後にサーバーとスケジューラ・保管庫の事前準備を開始)
+        if config.LAUNCHER_AUTO_START:
+            self.after(100, self.start_server)
+
     def setup_icon(self):
         try:
             # Current: src/interfaces/gui/launcher.py
@@ -149,8 +189,8 @@ class LauncherApp(ctk.CTk):
         # self.update_idletasks() <- Removed to prevent redundant draw
         
         # ウィンドウサイズ
-        width = 400
-        height = 350
+        width = 520
+        height = 560
         
         # 画面左上に配置 (安全策)
         # 以前の複雑なマルチモニタ判定ロジックは、環境変化(2画面→1画面)で
@@ -166,15 +206,23 @@ class LauncherApp(ctk.CTk):
     def start_server(self, event=None):
         if self.process:
             return
+        self.cancel_pending_restart()
             
         self.update_status("Starting...", "orange")
         self.log_text.configure(text="Initializing Streamlit...")
         self.start_btn.configure(state="disabled")
         self.stop_btn.configure(state="normal")
+        self.clear_console()
         
         env = os.environ.copy()
-        env["PYTHONPATH"] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        cmd = [sys.executable, "-m", "streamlit", "run", "src/interfaces/web/app.py", "--server.headless", "true"]
+        env["PYTHONPATH"] = ROOT_DIR
+        # warm_start: streamlit を起動しつつスケジューラ・API・保管庫を事前に準備する
+        cmd = [
+            sys.executable, os.path.join(ROOT_DIR, "src", "interfaces", "web", "warm_start.py"),
+            "--server.headless", "true", "--server.port", str(config.WEB_PORT),
+        ]
+        self.started_at = time.monotonic()
+        logger.info(f"Starting server: {' '.join(cmd)}")
         
         try:
             self.process = subprocess.Popen(
@@ -182,38 +230,130 @@ class LauncherApp(ctk.CTk):
                 env=env,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                text=True,
+                cwd=ROOT_DIR,
                 preexec_fn=os.setsid
             )
-            threading.Thread(target=self.monitor_process, daemon=True).start()
+            # stdout / stderr の両方を別スレッドで読み続ける (パイプ詰まりによるサーバー停止を防ぐ)
+            self.pump = OutputPump({"stdout": self.process.stdout, "stderr": self.process.stderr}, OUTPUT_BUFFER_LINES)
+            self.pump_seq = 0
+            self.pump.start()
+            # 起動完了はヘルスエンドポイントで判定する (出力の文字列には依存しない)
+            self.readiness = ReadinessProbe(self.server_url, timeout=config.LAUNCHER_READY_TIMEOUT_SEC)
+            self.readiness.start()
+            self.after(CONSOLE_REFRESH_MS, self.monitor_process)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to start server: {e}")
             self.stop_server()
 
     def monitor_process(self):
-        if not self.process:
+        """
+        Tk メインループ上で定期的に呼ばれ、ポンプに溜まった出力をコンソールへ反映します。
+        1回に追加する行数を制限するため、出力の多いサーバーでも UI が固まりません。
+        """
+        if not self.process or not self.pump:
+            return
+
+        lines, self.pump_seq, skipped = self.pump.snapshot(self.pump_seq, limit=CONSOLE_LINES_PER_TICK)
+        self.append_console(lines, skipped)
+
+        if self.process.poll() is not None and self.pump.finished.is_set():
+            self.append_console([("stderr", f"[process exited with code {self.process.returncode}]")], 0)
+            logger.error(f"Server exited with code {self.process.returncode}")
+            self.stop_server()
+            return
+
+        if self.readiness:
+            if self.readiness.ready_after is not None:
+                self.readiness = None
+                self.on_server_ready(self.server_url)
+            elif self.readiness.failed:
+                self.readiness = None
+                logger.error(f"Server did not become healthy within {config.LAUNCHER_READY_TIMEOUT_SEC:.0f}s")
+                self.stop_server()
+                self.update_status("Failed to start", "#c62828")
+                self.log_text.configure(text="Server did not respond. See the console output.")
+                return
+
+        if self.watchdog and self.watchdog.deferred and not self.watchdog.unhealthy.is_set():
+            self.update_status("Unresponsive (waiting for running job)", "orange")
+        if self.watchdog and self.watchdog.unhealthy.is_set():
+            logger.error(f"Server unresponsive ({self.watchdog.failures} failed health checks); restarting")
+            self.restart_server()
             return
-        while True:
-            if self.process is None or self.process.poll() is not None:
-                if self.process:
-                    self.after(0, lambda: self.stop_server())
-                break
-            line = self.process.stdout.readline()
-            if not line:
-                break
-            if "Local URL:" in line:
-                parts = line.split("URL:")
-                if len(parts) > 1:
-                    new_url = parts[1].strip()
-                    self.after(0, lambda url=new_url: self.on_server_ready(url))
-            print(line.strip())
+        self.after(CONSOLE_REFRESH_MS, self.monitor_process)
+
+    def append_console(self, lines, skipped):
+        if not lines and not skipped:
+            return
+        # 末尾を表示中の場合のみ自動スクロールする
+        at_bottom = self.console.yview()[1] >= 0.999
+        self.console.configure(state="normal")
+        if skipped:
+            self.console.insert("end", f"... {skipped} lines skipped ...\n", "stderr")
+        for stream, line in lines:
+            self.console.insert("end", line + "\n", stream if stream == "stderr" else ())
+        overflow = int(self.console.index("end-1c").split(".")[0]) - CONSOLE_MAX_LINES
+        if overflow > 0:
+            self.console.delete("1.0", f"{overflow + 1}.0")
+        self.console.configure(state="disabled")
+        if at_bottom:
+            self.console.see("end")
+
+    def clear_console(self):
+        self.console.configure(state="normal")
+        self.console.delete("1.0", "end")
+        self.console.configure(state="disabled")
 
     def on_server_ready(self, url):
-        self.server_url = url
-        self.update_status("Running", "#2e7d32")
-        self.log_text.configure(text=f"Server Ready at {url}")
+        now = time.monotonic()
+        server_sec = now - self.started_at
+        total_sec = now - self.opened_at
+        logger.info(f"Server ready at {url}: {server_sec:.1f}s after start, {total_sec:.1f}s after launcher open")
+
+        self.update_status(f"Running (ready in {server_sec:.1f}s)", "#2e7d32")
+        self.log_text.configure(text=f"Server Ready at {url} (launch -> UI: {total_sec:.1f}s)")
         self.browser_btn.configure(state="normal")
 
+        # 無応答になったら再起動する (実行中のジョブがあれば終わるまで待つ)
+        self.watchdog = Watchdog(
+            url, config.LAUNCHER_WATCHDOG_INTERVAL_SEC, config.LAUNCHER_WATCHDOG_FAILURES,
+            busy=self.server_busy, max_defer=config.LAUNCHER_WATCHDOG_DEFER_MAX_SEC,
+        )
+        self.watchdog.start()
+
+    def server_busy(self):
+        """打刻ジョブが実行中なら True (API が応答しない場合は判断できないため False)"""
+        return bool(active_jobs(self.api_url))
+
+    def restart_server(self):
+        """
+        サーバーを再起動します。
+        LAUNCHER_RESTART_WINDOW_SEC 秒あたり LAUNCHER_MAX_RESTARTS 回までとし、回数ごとに待機秒数を倍にします。
+        """
+        now = time.monotonic()
+        self.restart_times = [t for t in self.restart_times if now - t < config.LAUNCHER_RESTART_WINDOW_SEC]
+        self.stop_server()
+        if len(self.restart_times) >= config.LAUNCHER_MAX_RESTARTS:
+            logger.error(f"Server restarted {len(self.restart_times)} times recently; giving up")
+            self.update_status("Unresponsive (restart limit reached)", "#c62828")
+            self.log_text.configure(text="Server kept failing health checks. See the console output.")
+            return
+        delay = config.LAUNCHER_RESTART_BACKOFF_SEC * (2 ** len(self.restart_times))
+        self.restart_times.append(now)
+        logger.warning(f"Restarting server in {delay:.0f}s (restart {len(self.restart_times)}/{config.LAUNCHER_MAX_RESTARTS})")
+        self.update_status(f"Restarting in {delay:.0f}s", "orange")
+        self.restart_after_id = self.after(int(delay * 1000), self._restart_now)
+
+    def cancel_pending_restart(self):
+        """待機中の再起動を取り消します (手動で開始・停止した場合)"""
+        if self.restart_after_id is not None:
+            self.after_cancel(self.restart_after_id)
+            self.restart_after_id = None
+
+    def _restart_now(self):
+        self.restart_after_id = None
+        self.start_server()
+
     def open_browser(self, event=None):
         if self.browser_btn.cget("state") == "disabled":
             return
@@ -233,6 +373,13 @@ class LauncherApp(ctk.CTk):
         webbrowser.open(self.server_url)
 
     def stop_server(self, event=None):
+        self.cancel_pending_restart()
+        for checker in (self.readiness, self.watchdog):
+            if checker:
+                checker.cancel()
+        self.readiness = None
+        self.watchdog = None
+
         if self.process:
             self.update_status("Stopping...", "orange")
             self.log_text.configure(text="Terminating process...")
@@ -246,6 +393,7 @@ class LauncherApp(ctk.CTk):
             except Exception as e:
                 print(f"Error killing process: {str(e)}")
             self.process = None
+            self.pump = None
         
         try:
             self.update_status("Stopped", "#c62828")
@@ -0,0 +1,104 @@
+"""
+子プロセス出力のポンプ
+
+stdout / stderr の両方をセレクタで監視し、ノンブロッキングで読み出した行を
+上限付きのリングバッファに保持します。
+片方のパイプだけを読んでもう片方のバッファが詰まり、サーバーが停止する問題を防ぎます。
+GUI (Tk メインループ) からは snapshot() で差分だけを取り出します。
+"""
+import os
+import selectors
+import threading
+from collections import deque
+from typing import IO, Deque, Dict, List, Optional, Tuple
+
+# 1回の read で読み込む最大バイト数
+READ_CHUNK = 64 * 1024
+# 改行のない出力をこの長さで区切る (1行が際限なく伸びないようにする)
+MAX_LINE_CHARS = 4096
+
+
+class OutputPump:
+    """
+    Args:
+        streams (Dict[str, IO[bytes]]): ストリーム名 ('stdout', 'stderr') -> バイナリのパイプ
+        maxlen (int): リングバッファに保持する最大行数 (古い行から捨てる)
+    """
+
+    def __init__(self, streams: Dict[str, IO[bytes]], maxlen: int = 2000):
+        self._streams = streams
+        self._lines: Deque[Tuple[int, str, str]] = deque(maxlen=maxlen)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.finished = threading.Event()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="output-pump", daemon=True)
+        self._thread.start()
+
+    def _append(self, stream: str, line: str) -> None:
+        with self._lock:
+            self._seq += 1
+            self._lines.append((self._seq, stream, line))
+
+    def _run(self) -> None:
+        selector = selectors.DefaultSelector()
+        partial: Dict[str, str] = {}
+        for name, pipe in self._streams.items():
+            if pipe is None:
+                continue
+            os.set_blocking(pipe.fileno(), False)
+            selector.register(pipe, selectors.EVENT_READ, name)
+            partial[name] = ""
+
+        try:
+            while selector.get_map():
+                for key, _ in selector.select(timeout=1.0):
+                    name = key.data
+                    try:
+                        chunk = os.read(key.fd, READ_CHUNK)
+                    except BlockingIOError:
+                        continue
+                    if not chunk:
+                        # EOF: 改行のない残りを吐き出して監視を終える
+                        if partial[name]:
+                            self._append(name, partial[name])
+                            partial[name] = ""
+                        selector.unregister(key.fileobj)
+                        continue
+
+                    text = partial[name] + chunk.decode("utf-8", errors="replace")
+                    *lines, rest = text.split("\n")
+                    while len(rest) > MAX_LINE_CHARS:
+                        lines.append(rest[:MAX_LINE_CHARS])
+                        rest = rest[MAX_LINE_CHARS:]
+                    partial[name] = rest
+                    for line in lines:
+                        self._append(name, line.rstrip("\r"))
+        finally:
+            selector.close()
+            self.finished.set()
+
+    def snapshot(self, since: int = 0, limit: Optional[int] = None) -> Tuple[List[Tuple[str, str]], int, int]:
+        """
+        since より後の行を返します。
+
+        Args:
+            since (int): 前回受け取った最後の通番
+            limit (int, optional): 返す最大行数 (超えた分は古い方を読み飛ばす)
+
+        Returns:
+            Tuple[List[Tuple[str, str]], int, int]: ((ストリーム名, 行) のリスト, 最後の通番, 読み飛ばした行数)
+        """
+        with self._lock:
+            last = self._seq
+            first_kept = self._lines[0][0] if self._lines else last + 1
+            pending = [(s, stream, line) for s, stream, line in self._lines if s > since] if last > since else []
+
+        # リングバッファから溢れた行 + limit を超えて読み飛ばした行
+        skipped = max(first_kept - since - 1, 0) if last > since else 0
+        if limit is not None and len(pending) > limit:
+            skipped += len(pending) - limit
+            pending = pending[-limit:]
+        return [(stream, line) for _, stream, line in pending], last, skipped
@@ -1,13 +1,27 @@
+import time
+import hashlib
+
+# 再実行ごとの描画時間計測 (スクリプト先頭からの経過時間)
+_rerun_started = time.perf_counter()
+
 import streamlit as st
 import streamlit.components.v1 as components
 import logging
-import time
-import pandas as pd
+from collections import deque
 from datetime import datetime, date, timedelta
-from apscheduler.schedulers.background import BackgroundScheduler
-from src.core.services.job_service import JobService
+# NOTE: pandas / selenium (JobService) / apscheduler は必要になるまで import しない
+from src.core.services.job_runner import get_job_runner, PHASE_LABELS, STATUS_SUCCESS, STATUS_FAILED, STATUS_CANCELLED
+from src.core.services.job_store import JobStore
+from src.core.services.schedule_service import ScheduleService, get_scheduler
+from src.core.services.canary import get_canary
+from src.core.log_summary import get_log_summary
+from src.core.log_tail import read_tail
 from src.core.bitwarden import BitwardenClient
+from src.core.browser_registry import ensure_reaper, get_browser_registry
 from src.core.credentials import CredentialManager
+from src.core.scheduling import pick_jittered_time
+from src.core.timesync import server_now
+from src.core import metrics, resilience
 from src.config import settings as config
 
 # -----------------------------------------------------------------------------
@@ -27,7 +41,7 @@ LBL_DETAIL = "細かく設定する (Alt+5)"
 # -----------------------------------------------------------------------------
 # 設定とセットアップ
 # -----------------------------------------------------------------------------
-from src.core.logger import setup_logging
+from src.core.logger import readable_log_path, setup_logging
 
 # -----------------------------------------------------------------------------
 # Configuration & Setup
@@ -36,17 +50,16 @@ st.set_page_config(page_title="TouchOnTime Automator", page_icon="⏰")
 
 # ログ設定 (集中管理モジュールを使用)
 logger = setup_logging("app")
-log_dir = "logs"
+log_dir = config.LOG_DIR
 import os
 
-# スケジューラ (シングルトン)
-@st.cache_resource
-def get_scheduler():
-    scheduler = BackgroundScheduler()
-    scheduler.start()
-    return scheduler
-
+# スケジューラ (プロセス共有。warm_start で事前に起動済みの場合はそれを使う)
 scheduler = get_scheduler()
+schedule_service = ScheduleService(scheduler)
+
+# 異常終了したジョブが残したブラウザの回収と、メトリクスのファイル出力 (プロセスで1度だけ起動)
+ensure_reaper()
+metrics.ensure_textfile_writer("web")
 
 # グローバル永続化 (シングルトン)
 # ブラウザを閉じてもサーバーが生きている限り値を保持する
@@ -57,9 +70,105 @@ class GlobalSession:
 
 global_session = GlobalSession()
 
+# ローカル制御 API (スケジューラを所有するこのプロセスで1度だけ起動する)
+@st.cache_resource
+def get_api_server():
+    from src.interfaces.api.server import ensure_api_server
+    server = ensure_api_server(schedule_service)
+    if server:
+        # UI でログインした Master Password を API からの実行にも使う
+        server.password_provider = lambda: global_session.master_password
+    return server
+
+api_server = get_api_server()
+
+# 早期警告 (リトライ・サーキットブレーカー作動) の保持 (シングルトン)
+@st.cache_resource
+def get_alert_buffer():
+    alerts = deque(maxlen=20)
+    resilience.register_alert_hook(
+        lambda event, message, details: alerts.append((datetime.now(), event, message))
+    )
+    return alerts
+
+alert_buffer = get_alert_buffer()
+
+# 起動中のブラウザのメモリ使用量 (/proc の走査を毎回行わない)
+@st.cache_data(ttl=10, show_spinner=False)
+def load_browser_memory():
+    return get_browser_registry().memory()
+
+# ローカル認証キャッシュの有無 (ファイル読み込みを毎回行わない)
+@st.cache_data(ttl=30, show_spinner=False)
+def check_credential_cache(item_name: str) -> bool:
+    return CredentialManager().is_cached(item_name)
+
+# 打刻中のまま残った打刻記録 (二重打刻防止で同じ打刻を止め続けるもの)
+@st.cache_data(ttl=5, show_spinner=False)
+def load_stuck_punches():
+    return resilience.IdempotencyStore().stuck()
+
+# 実行履歴 (JobStore) の件数・ページ取得
+@st.cache_data(ttl=5, show_spinner=False)
+def count_history(since, until) -> int:
+    return JobStore().count(since=since, until=until)
+
+@st.cache_data(ttl=5, show_spinner=False)
+def load_history(since, until, limit: int, offset: int):
+    return JobStore().query(since=since, until=until, limit=limit, offset=offset)
+
+# ログ末尾の取得 (ファイルサイズ・更新時刻が変わらない限り再読み込みしない)
+@st.cache_data(max_entries=16, show_spinner=False)
+def load_log_page(path: str, size: int, mtime_ns: int, max_lines: int, before, levels, contains):
+    return read_tail(path, max_lines, before=before, levels=list(levels) or None, contains=contains or None)
+
 # -----------------------------------------------------------------------------
 # ヘルパー関数 (バックグラウンドロジック)
 # -----------------------------------------------------------------------------
+job_runner = get_job_runner()
+
+@st.fragment(run_every=1)
+def render_run_progress():
+    """「今すぐ実行」で投入したジョブの進捗を表示します (1秒ごとに部分再描画)"""
+    run_ids = st.session_state.get('run_ids', [])
+    if not run_ids:
+        return
+
+    for job_id in reversed(run_ids):
+        progress = job_runner.get(job_id)
+        if progress is None:
+            continue
+        mode_str = "🧪 Test" if progress.is_dry_run else "🔴 Live"
+        header = f"{progress.clock_type.upper()} {mode_str} ({progress.submitted_at.strftime('%H:%M:%S')})"
+
+        if progress.status == STATUS_SUCCESS:
+            st.success(f"✅ {header}: 完了")
+        elif progress.status == STATUS_FAILED:
+            st.error(f"❌ {header}: {progress.error}")
+        elif progress.status == STATUS_CANCELLED:
+            st.warning(f"⏹️ {header}: {progress.error}")
+        else:
+            phase = PHASE_LABELS.get(progress.current_phase, progress.current_phase)
+            elapsed = (datetime.now() - progress.submitted_at).total_seconds()
+            c1, c2 = st.columns([5, 1])
+            c1.info(f"⏳ {header}: {phase}... ({elapsed:.0f}秒)")
+            if c2.button("中断", key=f"cancel_{job_id}"):
+                job_runner.cancel(job_id)
+                st.rerun(scope="fragment")
+
+        if progress.phases:
+            steps = " → ".join(
+                f"{PHASE_LABELS.get(name, name)} {ts.strftime('%H:%M:%S')}" for name, ts in progress.phases
+            )
+            st.caption(steps)
+        if progress.profile and progress.is_done:
+            st.caption(f"📈 プロファイル: {os.path.join(config.PROFILE_DIR, progress.job_id)}")
+
+    if st.button("完了した実行結果を消去", key="clear_runs"):
+        st.session_state['run_ids'] = [
+            j for j in run_ids if (p := job_runner.get(j)) is not None and not p.is_done
+        ]
+        st.rerun(scope="fragment")
 
 
 # -----------------------------------------------------------------------------
@@ -90,6 +199,240 @@ st.markdown("""
 
 st.title("⏰ Touch On Time Automator")
 
+# -----------------------------------------------------------------------------
+# キーボードショートカット (親ウィンドウに1度だけ登録する)
+# -----------------------------------------------------------------------------
+# この JS は iframe ではなく親ウィンドウのレルムで実行される (new window.parent.Function)。
+# そのため Streamlit の再描画で iframe が破棄されても、ハンドラと監視は動作し続ける。
+SHORTCUT_INSTALLER_JS = r"""
+const w = window;
+const doc = w.document;
+
+// 同じバージョンが登録済みなら、ID の再確認を予約するだけで終わる
+const existing = w._clockInShortcuts;
+if (existing && existing.version === VERSION) {
+    existing.schedule();
+    return;
+}
+if (existing) existing.dispose();
+// 旧方式 (再実行ごとに登録) のハンドラを除去
+if (w._clockInKeyHandler) {
+    doc.removeEventListener('keydown', w._clockInKeyHandler);
+    w._clockInKeyHandler = null;
+}
+
+const TRANSLATE = "translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')";
+// これらの要素が追加・削除されたときだけ再探索する
+const RELEVANT = 'button, label, input, [role="button"]';
+const DEBOUNCE_MS = 200;
+
+// testId -> 要素 (解決済みキャッシュ)
+const cache = new Map();
+
+// --- 1. 探索範囲 (Streamlit のメイン領域に限定) ---
+function scopeRoot() {
+    return doc.querySelector('[data-testid="stMain"]') || doc.querySelector('section.main') || doc.body;
+}
+
+function snapshot(xpath, root) {
+    return doc.evaluate(xpath, root, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+}
+
+function tag(el, testId) {
+    if (el.getAttribute('data-testid') !== testId) el.setAttribute('data-testid', testId);
+    cache.set(testId, el);
+    return el;
+}
+
+// --- 2. 属性注入ヘルパー ---
+function findByText(root, text, testId, tagName='*') {
+    const xpath = `.//${tagName}[contains(${TRANSLATE}, '${text.toLowerCase()}')]`;
+    const result = snapshot(xpath, root);
+    for (let i = 0; i < result.snapshotLength; i++) {
+        const el = result.snapshotItem(i);
+        // ヒューリスティック: テキストが長すぎる場合はスキップ（ボタンやラベルそのものではなくコンテナである可能性が高い）
+        if (el.innerText && el.innerText.length > text.length + 50) continue;
+
+        // クリック可能な要素を見つけるまで上にトラバース
+        let current = el;
+        while (current && current !== doc.body) {
+            if (current.tagName === 'BUTTON' || current.tagName === 'LABEL' || current.getAttribute('role') === 'button') {
+                return tag(current, testId);
+            }
+            current = current.parentElement;
+        }
+        if (tagName !== '*') return tag(el, testId);
+    }
+    return null;
+}
+
+function findInputByLabel(root, labelText, testId, isPassword=false) {
+    const inputs = Array.from(root.getElementsByTagName('input'));
+
+    // 1. パスワードの特別対応
+    if (isPassword) {
+        const pw = inputs.find(i => i.type === 'password');
+        return pw ? tag(pw, testId) : null;
+    }
+
+    const lowerLabel = labelText.toLowerCase();
+
+    // 2. aria-labelでの検索を試みる (大文字小文字無視)
+    const ariaTarget = inputs.find(i => {
+        const al = i.getAttribute('aria-label');
+        return al && al.toLowerCase().includes(lowerLabel);
+    });
+    if (ariaTarget) return tag(ariaTarget, testId);
+
+    // 3. 堅牢な検索: 'for'属性を持つラベル
+    const labels = snapshot(`.//label[contains(${TRANSLATE}, '${lowerLabel}')]`, root);
+    for (let i = 0; i < labels.snapshotLength; i++) {
+        const label = labels.snapshotItem(i);
+        if (label.innerText && label.innerText.length > labelText.length + 50) continue;
+        const forId = label.getAttribute('for');
+        const target = forId ? doc.getElementById(forId) : null;
+        if (target) return tag(target, testId);
+    }
+
+    // 4. フォールバック: 近接検索
+    const generic = snapshot(
+        `.//*[self::p or self::div or self::span or self::label][contains(${TRANSLATE}, '${lowerLabel}')]`, root
+    );
+    for (let i = 0; i < generic.snapshotLength; i++) {
+        const labelEl = generic.snapshotItem(i);
+        if (labelEl.innerText && labelEl.innerText.length > labelText.length + 50) continue;
+        let parent = labelEl.parentElement;
+        for (let levels = 0; parent && parent !== doc.body && levels < 5; levels++) {
+            const input = parent.querySelector('input');
+            // 異なるIDがまだ割り当てられていない場合のみ割り当て
+            if (input && (!input.hasAttribute('data-testid') || input.getAttribute('data-testid') === testId)) {
+                return tag(input, testId);
+            }
+            parent = parent.parentElement;
+        }
+    }
+    return null;
+}
+
+const TARGETS = {
+    'btn-run-now': r => findByText(r, SEARCH_KEYS.RUN, 'btn-run-now'),
+    'btn-add-schedule': r => findByText(r, SEARCH_KEYS.SCHEDULE, 'btn-add-schedule'),
+    'radio-in': r => findByText(r, SEARCH_KEYS.TYPE_IN, 'radio-in', 'label'),
+    'radio-out': r => findByText(r, SEARCH_KEYS.TYPE_OUT, 'radio-out', 'label'),
+    'radio-dry': r => findByText(r, SEARCH_KEYS.MODE_TEST, 'radio-dry', 'label'),
+    'radio-live': r => findByText(r, SEARCH_KEYS.MODE_LIVE, 'radio-live', 'label'),
+    'chk-detail': r => findByText(r, SEARCH_KEYS.DETAIL, 'chk-detail', 'label'),
+    'input-date': r => findInputByLabel(r, SEARCH_KEYS.DATE, 'input-date'),
+    'input-time': r => findInputByLabel(r, SEARCH_KEYS.TIME, 'input-time'),
+    'input-mp': r => findInputByLabel(r, SEARCH_KEYS.MP, 'input-mp', true),
+};
+
+// キャッシュが有効ならそのまま返し、DOM から外れていた場合のみ再探索する
+function resolve(testId, root) {
+    const cached = cache.get(testId);
+    if (cached && cached.isConnected && cached.getAttribute('data-testid') === testId) return cached;
+    cache.delete(testId);
+    return TARGETS[testId](root || scopeRoot());
+}
+
+// --- 3. DOM 監視 (デバウンス付き) ---
+let observedRoot = null;
+let timer = null;
+
+function refreshAll() {
+    timer = null;
+    const root = scopeRoot();
+    attach(root);
+    for (const testId in TARGETS) resolve(testId, root);
+}
+
+function schedule() {
+    if (timer === null) timer = w.setTimeout(refreshAll, DEBOUNCE_MS);
+}
+
+function isRelevant(node) {
+    return node.nodeType === 1 && (node.matches(RELEVANT) || node.querySelector(RELEVANT) !== null);
+}
+
+const observer = new w.MutationObserver(mutations => {
+    if (timer !== null) return;
+    for (const m of mutations) {
+        for (const n of m.addedNodes) {
+            if (isRelevant(n)) { schedule(); return; }
+        }
+        for (const n of m.removedNodes) {
+            if (n.nodeType !== 1) continue;
+            for (const el of cache.values()) {
+                if (n === el || n.contains(el)) { schedule(); return; }
+            }
+        }
+    }
+});
+
+function attach(root) {
+    if (root === observedRoot) return;
+    observer.disconnect();
+    observer.observe(root, { childList: true, subtree: true });
+    observedRoot = root;
+}
+
+// --- 4. IDを使用したイベントハンドラ ---
+function clickById(id) {
+    const el = resolve(id);
+    if (el) el.click();
+}
+function focusById(id) {
+    const el = resolve(id);
+    if (el) el.focus();
+}
+
+function onKeyDown(e) {
+    const activeTag = doc.activeElement ? doc.activeElement.tagName.toLowerCase() : "";
+    const activeType = doc.activeElement ? doc.activeElement.type : "";
+    const isTypingSensitive = (activeType === 'password' || activeTag === 'textarea');
+
+    // アクション
+    if (e.shiftKey && e.key === 'Enter') {
+        clickById('btn-run-now'); e.preventDefault();
+    }
+    if (e.shiftKey && (e.key === 's' || e.key === 'S')) {
+        if (!isTypingSensitive) { clickById('btn-add-schedule'); e.preventDefault(); }
+    }
+
+    // トグルとフォーカス
+    if (e.altKey) {
+        if (!e.shiftKey) {
+            if (e.key === '1') clickById('radio-in');
+            if (e.key === '2') clickById('radio-out');
+            if (e.key === '3') clickById('radio-dry');
+            if (e.key === '4') clickById('radio-live');
+            if (e.key === '5') clickById('chk-detail');
+        }
+        if (e.shiftKey) {
+            if (e.key === 'D' || e.key === 'd') { focusById('input-date'); e.preventDefault(); }
+            if (e.key === 'T' || e.key === 't') { focusById('input-time'); e.preventDefault(); }
+            if (e.key === 'M' || e.key === 'm') { focusById('input-mp'); e.preventDefault(); }
+        }
+    }
+}
+
+doc.addEventListener('keydown', onKeyDown);
+
+w._clockInShortcuts = {
+    version: VERSION,
+    schedule: schedule,
+    dispose() {
+        observer.disconnect();
+        if (timer !== null) w.clearTimeout(timer);
+        doc.removeEventListener('keydown', onKeyDown);
+        cache.clear();
+    },
+};
+
+// IDを設定するための初回実行
+refreshAll();
+"""
+
 # === ショートカットと属性の注入 ===
 def add_keyboard_shortcuts():
     # Pythonの定数をJSに渡す
@@ -124,202 +467,23 @@ def add_keyboard_shortcuts():
     }};
     """
 
-    js_code = f"""
-    <script>
-    {js_variables}
-    
-    const doc = window.parent.document;
-    
-    // --- 1. 属性注入ヘルパー ---
-    function assignTestIds() {{
-        // ボタン
-        assignIdByText(SEARCH_KEYS.RUN, 'btn-run-now');
-        assignIdByText(SEARCH_KEYS.SCHEDULE, 'btn-add-schedule');
-        
-        // ラジオボタンのラベル
-        assignIdByText(SEARCH_KEYS.TYPE_IN, 'radio-in', 'label');
-        assignIdByText(SEARCH_KEYS.TYPE_OUT, 'radio-out', 'label');
-        assignIdByText(SEARCH_KEYS.MODE_TEST, 'radio-dry', 'label');
-        assignIdByText(SEARCH_KEYS.MODE_LIVE, 'radio-live', 'label');
-        assignIdByText(SEARCH_KEYS.DETAIL, 'chk-detail', 'label');
-
-        // 入力フィールド
-        assignInputIdByLabel(SEARCH_KEYS.DATE, 'input-date');
-        assignInputIdByLabel(SEARCH_KEYS.TIME, 'input-time');
-        assignInputIdByLabel(SEARCH_KEYS.MP, 'input-mp', true); 
-    }}
-
-    function assignIdByText(text, testId, tagName='*') {{
-        const lowerText = text.toLowerCase();
-        const translate = "translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')";
-        const xpath = `//${{tagName}}[contains(${{translate}}, '${{lowerText}}')]`;
-        
-        const result = doc.evaluate(xpath, doc, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
-        for (let i = 0; i < result.snapshotLength; i++) {{
-            let el = result.snapshotItem(i);
-            
-            // ヒューリスティック: テキストが長すぎる場合はスキップ（ボタンやラベルそのものではなくコンテナである可能性が高い）
-            if (el.innerText && el.innerText.length > text.length + 50) continue;
-
-            if (testId.startsWith('btn') || testId.startsWith('radio') || testId.startsWith('chk')) {{
-                 let current = el;
-                 let found = false;
-                 // クリック可能な要素を見つけるまで上にトラバース
-                 while(current && current !== doc.body) {{
-                    if (current.tagName === 'BUTTON' || current.tagName === 'LABEL' || current.getAttribute('role') === 'button') {{
-                        // 可能なら上書きしないが、優先度を保証する
-                        if (!current.hasAttribute('data-testid') || current.getAttribute('data-testid') !== testId) {{
-                            current.setAttribute('data-testid', testId);
-                        }}
-                        found = true;
-                        break;
-                    }}
-                    current = current.parentElement;
-                 }}
-                 if (!found && tagName !== '*') {{
-                     el.setAttribute('data-testid', testId);
-                 }}
-            }} else {{
-                el.setAttribute('data-testid', testId);
-            }}
-        }}
-    }}
-
-    function assignInputIdByLabel(labelText, testId, isPassword=false) {{
-        // 1. パスワードの特別対応
-        if (isPassword) {{
-           const inputs = Array.from(doc.getElementsByTagName('input'));
-           const pw = inputs.find(i => i.type === 'password');
-           if (pw) {{ pw.setAttribute('data-testid', testId); return; }}
-        }}
-
-        const lowerLabel = labelText.toLowerCase();
-
-        // 2. aria-labelでの検索を試みる (大文字小文字無視)
-        const inputs = Array.from(doc.getElementsByTagName('input'));
-        const ariaTarget = inputs.find(i => {{
-            const al = i.getAttribute('aria-label');
-            return al && al.toLowerCase().includes(lowerLabel);
-        }});
-        if (ariaTarget) {{
-            ariaTarget.setAttribute('data-testid', testId);
-            console.log(`Success: Found ${{labelText}} via aria-label`);
-            return; 
-        }}
-
-        // 3. 堅牢な検索: 'for'属性を持つラベル
-        const translate = "translate(., 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')";
-        const xpathLabel = `//label[contains(${{translate}}, '${{lowerLabel}}')]`;
-        const labelResult = doc.evaluate(xpathLabel, doc, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
-        
-        for (let i = 0; i < labelResult.snapshotLength; i++) {{
-             const label = labelResult.snapshotItem(i);
-             // ラベルテキストが長すぎる場合はスキップ
-             if (label.innerText && label.innerText.length > labelText.length + 50) continue;
-
-             const forId = label.getAttribute('for');
-             if (forId) {{
-                 const targetInput = doc.getElementById(forId);
-                 if (targetInput) {{
-                     targetInput.setAttribute('data-testid', testId);
-                     console.log(`Success: Found ${{labelText}} via 'for' attribute`);
-                     return; 
-                 }}
-             }}
-        }}
-
-        // 4. フォールバック: 近接検索
-        // テキストを含む任意の要素を探す
-        const xpathGeneric = `//*[self::p or self::div or self::span or self::label][contains(${{translate}}, '${{lowerLabel}}')]`;
-        const result = doc.evaluate(xpathGeneric, doc, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
-        
-        for (let i = 0; i < result.snapshotLength; i++) {{
-             let labelEl = result.snapshotItem(i);
-             if (labelEl.innerText && labelEl.innerText.length > labelText.length + 50) continue;
-             
-             let parent = labelEl.parentElement;
-             let levels = 0;
-             while(parent && levels < 5) {{
-                 // input, select, または textarea を探す
-                 const input = parent.querySelector('input');
-                 if (input) {{ 
-                     // 異なるIDがまだ割り当てられていない場合のみ割り当て
-                     if (!input.hasAttribute('data-testid') || input.getAttribute('data-testid') === testId) {{
-                        input.setAttribute('data-testid', testId); 
-                        console.log(`Success: Found ${{labelText}} via proximity`);
-                        return; 
-                     }}
-                 }}
-                 parent = parent.parentElement;
-                 if (parent === doc.body) break;
-                 levels++;
-            }}
-        }}
-        console.warn(`FAIL: Could not find input for label: ${{labelText}}`);
-    }}
-    
-    // --- 2. IDを使用したイベントハンドラ ---
-    if (window.parent._clockInKeyHandler) {{
-        doc.removeEventListener('keydown', window.parent._clockInKeyHandler);
-    }}
-
-    window.parent._clockInKeyHandler = function(e) {{
-        assignTestIds(); // IDを再チェック
-
-        const activeTag = doc.activeElement ? doc.activeElement.tagName.toLowerCase() : "";
-        const activeType = doc.activeElement ? doc.activeElement.type : "";
-        const isTypingSensitive = (activeType === 'password' || activeTag === 'textarea');
-
-        if (e.altKey && e.shiftKey) {{
-             console.log(`Key Detected: Alt+Shift+${{e.key}}`); // デバッグログ
-        }}
-
-        // アクション
-        if (e.shiftKey && e.key === 'Enter') {{
-            clickById('btn-run-now'); e.preventDefault();
-        }}
-        if (e.shiftKey && (e.key === 's' || e.key === 'S')) {{
-            if (!isTypingSensitive) {{ clickById('btn-add-schedule'); e.preventDefault(); }}
-        }}
-
-        // トグルとフォーカス
-        if (e.altKey) {{
-            if (!e.shiftKey) {{
-                    if (e.key === '1') clickById('radio-in');
-                    if (e.key === '2') clickById('radio-out');
-                    if (e.key === '3') clickById('radio-dry');
-                    if (e.key === '4') clickById('radio-live');
-                    if (e.key === '5') clickById('chk-detail');
-            }}
-            if (e.shiftKey) {{
-                if (e.key === 'D' || e.key === 'd') {{ focusById('input-date'); e.preventDefault(); }}
-                if (e.key === 'T' || e.key === 't') {{ focusById('input-time'); e.preventDefault(); }}
-                if (e.key === 'M' || e.key === 'm') {{ focusById('input-mp'); e.preventDefault(); }}
-            }}
-        }}
-    }};
+    installer = js_variables + SHORTCUT_INSTALLER_JS
+    version = hashlib.sha1(installer.encode("utf-8")).hexdigest()[:12]
 
-    doc.addEventListener('keydown', window.parent._clockInKeyHandler);
-    
-    // IDを設定するための初回実行
-    assignTestIds();
-    // DOMの変更を監視 (Streamlitの再描画対応)
-    const observer = new MutationObserver(() => {{
-        assignTestIds();
-    }});
-    observer.observe(doc.body, {{ childList: true, subtree: true }});
-
-
-    // ヘルパー
-    function clickById(id) {{
-        const el = doc.querySelector(`[data-testid="${{id}}"]`);
-        if (el) el.click();
-    }}
-    function focusById(id) {{
-        const el = doc.querySelector(`[data-testid="${{id}}"]`);
-        if (el) el.focus();
-    }}
+    # 同じページ (セッション) では1度だけ注入する
+    if st.session_state.get('_shortcuts_version') == version:
+        return
+    st.session_state['_shortcuts_version'] = version
 
+    js_code = f"""
+    <script type="text/plain" id="clockin-installer">
+    const VERSION = '{version}';
+    {installer}
+    </script>
+    <script>
+    // 親ウィンドウのレルムで実行する (この iframe が破棄されてもハンドラは残る)
+    const source = document.getElementById('clockin-installer').textContent;
+    new window.parent.Function(source)();
     </script>
     """
     components.html(js_code, height=0, width=0)
@@ -342,6 +506,8 @@ def authenticate():
             key = bw.unlock(mp_input)
             if key:
                 global_session.master_password = mp_input
+                # 認証キャッシュの有無の表示を古いまま残さない
+                check_credential_cache.clear()
                 s.update(label="同期中...", state="running")
                 bw.sync()
                 s.update(label="認証成功！準備完了", state="complete")
@@ -353,8 +519,7 @@ def authenticate():
             st.error(f"エラー: {e}")
 
 # ローカルキャッシュの確認
-cm = CredentialManager()
-has_cache = cm.is_cached(config.BITWARDEN_ITEM_NAME)
+has_cache = check_credential_cache(config.BITWARDEN_ITEM_NAME)
 
 # 認証状態のロジック
 # 以下の条件で認証済みとする:
@@ -401,6 +566,7 @@ if not is_authenticated:
 def logout_callback():
     st.session_state['master_password'] = ""
     global_session.master_password = None
+    check_credential_cache.clear()
     # 注意: ログアウトは現在メモリセッションのみをクリアします。
     # ローカルファイルキャッシュは削除しません（必要ならユーザーがファイルシステムから削除）。
     # "ログアウト"で"キャッシュクリア"も行いたい場合は、ここで cm.clear_cache() を呼びます。
@@ -409,6 +575,352 @@ def logout_callback():
     # キャッシュ利用下で本当に"ログアウト"するには、"デバイスを削除"ボタンが必要かもしれません。
     # 今回の修正では、状態ロジックに任せるために単にリロードします。
 
+# -----------------------------------------------------------------------------
+# タブ (各タブは st.fragment として独立して再実行される)
+# -----------------------------------------------------------------------------
+@st.fragment
+def render_action_tab():
+    """🚀 実行・予約 タブ"""
+    st.subheader("Action")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        clock_type = st.radio("Type", [LBL_TYPE_IN, LBL_TYPE_OUT])
+        type_code = "in" if "IN" in clock_type else "out"
+    with col2:
+        mode = st.radio("Mode", [LBL_MODE_TEST, LBL_MODE_LIVE])
+        is_dry = "Dry" in mode
+
+        # ヘッドレストグル
+        is_headless = st.checkbox("Headless Mode (ブラウザ非表示)", value=True)
+        # 「今すぐ実行」をプロファイラの下で実行する
+        use_profile = st.checkbox("プロファイルを取得する", value=False, key="use_profile")
+
+    st.subheader("Schedule")
+    # 日付/時間ロジック (安定したデフォルト)
+    # レイアウト調整: 日付と時間を等しいカラム幅に
+    dc1, dc2 = st.columns(2)
+
+    with dc1:
+        d_val = st.date_input(LBL_DATE, date.today())
+
+    with dc2:
+        # チェックボックスの状態に基づく時間ステップのロジック (下に配置するためにsession_state経由で処理)
+        use_minute_step_key = "use_minute_step"
+        # デフォルトはTrue (1分刻み)
+        current_step_mode = st.session_state.get(use_minute_step_key, True)
+        step_val = 60 if current_step_mode else 300
+
+        # タイプに基づいてデフォルト時間を定義
+        if type_code == "in":
+            def_t = datetime.strptime("08:55", "%H:%M").time()
+        else:
+            def_t = datetime.strptime("18:05", "%H:%M").time()
+
+        # 時間入力 (日付入力と整列)
+        t_val = st.time_input(LBL_TIME, value=def_t, step=step_val)
+
+        st.checkbox(LBL_DETAIL, key=use_minute_step_key, value=True)
+
+    # 負荷分散: 許容ウィンドウ内で実行時刻をランダムにずらす
+    use_spread = st.checkbox("時間を分散する (許容ウィンドウ内でランダム実行)", value=False)
+    if use_spread:
+        def_end = (datetime.combine(d_val, t_val) + timedelta(minutes=3)).time()
+        t_end = st.time_input("許容ウィンドウ終了", value=def_end, step=step_val)
+        st.caption(f"{t_val.strftime('%H:%M')} - {t_end.strftime('%H:%M')} の間 (推奨時間帯の範囲内) で実行されます。")
+
+    run_dt = datetime.combine(d_val, t_val)
+
+    # Actions
+    st.divider()
+    ac1, ac2 = st.columns(2)
+
+    mp = st.session_state['master_password']
+
+    with ac1:
+        if st.button(LBL_RUN, type="primary"):
+            # バックグラウンドワーカーに投入して即座に戻る (進捗は下の領域に表示)
+            job_id = job_runner.submit(type_code, is_dry, mp, headless=is_headless, profile=use_profile)
+            st.session_state.setdefault('run_ids', []).append(job_id)
+
+    with ac2:
+        if st.button(LBL_SCHEDULE):
+            if use_spread:
+                try:
+                    run_dt = pick_jittered_time(
+                        type_code, run_dt, datetime.combine(d_val, t_end), not_before=server_now()
+                    )
+                except ValueError as e:
+                    st.error(f"{e}")
+                    run_dt = None
+
+            if run_dt is None:
+                pass
+            elif run_dt <= server_now():
+                st.error("未来の日時を指定してください")
+            else:
+                try:
+                    schedule_service.add(
+                        type_code, run_dt, is_dry, mp, is_headless, name=f"{clock_type} ({mode})"
+                    )
+                    st.success(f"予約しました: {run_dt}")
+                except Exception as e:
+                    st.error(f"予約できませんでした: {e}")
+
+    render_stuck_punches()
+
+    # 実行中・実行済みジョブの進捗
+    render_run_progress()
+
+
+def render_stuck_punches():
+    """打刻中のまま残った記録を表示し、確認のうえで削除できるようにします"""
+    stuck = load_stuck_punches()
+    for key, record in stuck.items():
+        st.warning(
+            f"⚠️ 打刻 {key} が打刻中のまま残っています (job={record.get('job_id')}, at={record.get('updated_at')})。"
+            "結果が不明なため、この打刻は再実行できません。Touch On Time 側で打刻されていないことを確認してから削除してください。"
+        )
+        if st.button("記録を削除して再打刻を許可", key=f"clear_punch_{key}"):
+            resilience.IdempotencyStore().clear(key)
+            load_stuck_punches.clear()
+            logger.warning(f"打刻中の記録を手動で削除しました: {key}")
+            st.rerun(scope="fragment")
+
+
+def render_schedule_import():
+    """CSV / ICS からの一括予約"""
+    from src.core.schedule_import import load_schedule_file, validate_schedule
+
+    st.caption("CSV 列: date, time, type (in/out), mode (dry/live, 省略時は下の既定値)。ICS は DTSTART と SUMMARY を使用します。")
+    uploaded = st.file_uploader("予約ファイル", type=["csv", "ics"], key="import_file")
+    i1, i2 = st.columns(2)
+    default_dry = i1.radio("mode 未指定時", ["テスト (Dry Run)", "本番 (Live)"], key="import_mode") == "テスト (Dry Run)"
+    headless = i2.checkbox("Headless Mode (ブラウザ非表示)", value=True, key="import_headless")
+    if uploaded is None:
+        return
+
+    try:
+        candidates = load_schedule_file(uploaded.name, uploaded.getvalue(), default_dry)
+    except Exception as e:
+        st.error(f"ファイルを読み込めませんでした: {e}")
+        return
+
+    checked = validate_schedule(candidates, schedule_service.existing_keys(), now=server_now())
+    valid = checked[checked["error"].isna()]
+    st.dataframe(
+        checked.assign(
+            run_at=checked["run_at"].dt.strftime('%Y-%m-%d %H:%M:%S'),
+            is_dry_run=checked["is_dry_run"].map({True: "🧪 Test", False: "🔴 Live"}),
+            error=checked["error"].fillna("✅ OK"),
+        ).rename(columns={"run_at": "Run At", "clock_type": "Type", "is_dry_run": "Mode", "error": "Check"}),
+        use_container_width=True, hide_index=True,
+    )
+    st.caption(f"{len(checked)} 件中 有効 {len(valid)} 件 / エラー {len(checked) - len(valid)} 件")
+
+    if st.button(f"有効な {len(valid)} 件を予約", disabled=valid.empty, key="import_submit"):
+        mp = st.session_state['master_password']
+        added, failed = 0, []
+        for row in valid.itertuples(index=False):
+            try:
+                schedule_service.add(row.clock_type, row.run_at.to_pydatetime(), row.is_dry_run, mp, headless)
+                added += 1
+            except Exception as e:
+                failed.append(f"{row.run_at}: {e}")
+        st.success(f"{added} 件を予約しました。")
+        for message in failed:
+            st.error(message)
+
+
+@st.fragment
+def render_jobs_tab():
+    """📋 予約リスト タブ"""
+    import pandas as pd
+
+    st.subheader("Jobs")
+    with st.expander("一括インポート (CSV / ICS)"):
+        render_schedule_import()
+
+    punches = schedule_service.list_punches()
+    if not punches:
+        st.caption("No active jobs")
+        return
+
+    sort_keys = {"実行日時": "Run At", "タイプ": "Type", "モード": "Mode", "名前": "Name"}
+    s1, s2, s3, s4 = st.columns([2, 1, 1, 1])
+    sort_by = s1.selectbox("並び替え", list(sort_keys), key="jobs_sort")
+    descending = s2.checkbox("降順", key="jobs_desc")
+    page_size = s3.selectbox("表示件数", [20, 50, 100], key="jobs_page_size")
+    max_page = max((len(punches) - 1) // page_size + 1, 1)
+    page = s4.number_input("ページ", min_value=1, max_value=max_page, value=1, key="jobs_page")
+
+    table = pd.DataFrame([
+        {
+            "選択": False,
+            "Run At": p.run_at,
+            "Type": p.clock_type,
+            "Mode": "🧪 Test" if p.is_dry_run else "🔴 Live",
+            "Name": p.name,
+            "Job ID": p.job_id,
+        }
+        for p in punches
+    ]).sort_values([sort_keys[sort_by], "Run At"], ascending=not descending, kind="stable")
+    page_rows = table.iloc[(page - 1) * page_size:page * page_size].reset_index(drop=True)
+
+    # 一括操作のたびにキーを変えて選択状態をリセットする
+    revision = st.session_state.setdefault('jobs_table_rev', 0)
+    edited = st.data_editor(
+        page_rows,
+        column_config={"Run At": st.column_config.DatetimeColumn(format="YYYY-MM-DD HH:mm:ss")},
+        disabled=[c for c in page_rows.columns if c != "選択"],
+        use_container_width=True, hide_index=True,
+        key=f"jobs_table_{revision}_{page}_{sort_by}_{descending}_{page_size}",
+    )
+    selected = edited.loc[edited["選択"], "Job ID"].tolist()
+    st.caption(f"{len(table)} 件中 {(page - 1) * page_size + 1} - {(page - 1) * page_size + len(page_rows)} 件 / 選択 {len(selected)} 件")
+
+    b1, b2, b3 = st.columns([1, 1, 1])
+    shift_min = b2.number_input("ずらす (分)", min_value=-120, max_value=120, value=5, step=1, key="jobs_shift")
+    if b1.button(f"選択を削除 ({len(selected)})", disabled=not selected):
+        dropped = schedule_service.drop(selected)
+        st.session_state['jobs_table_rev'] += 1
+        st.session_state['jobs_notice'] = f"{dropped} 件の予約を削除しました。"
+        st.rerun(scope="fragment")
+    if b3.button(f"選択を再スケジュール ({len(selected)})", disabled=not selected or shift_min == 0):
+        moved, errors = schedule_service.shift(selected, timedelta(minutes=shift_min))
+        st.session_state['jobs_table_rev'] += 1
+        st.session_state['jobs_notice'] = "\n".join([f"{moved} 件の予約を {shift_min:+d} 分ずらしました。", *errors])
+        st.rerun(scope="fragment")
+
+    notice = st.session_state.pop('jobs_notice', None)
+    if notice:
+        st.info(notice)
+
+
+@st.fragment
+def render_history_tab():
+    """📊 ログ概要 タブ"""
+    import pandas as pd
+
+    st.subheader("実行履歴 (概要)")
+
+    f1, f2, f3 = st.columns([2, 1, 1])
+    with f1:
+        date_range = st.date_input(
+            "期間", value=(date.today() - timedelta(days=7), date.today()), key="history_range"
+        )
+    with f2:
+        page_size = st.selectbox("表示件数", [20, 50, 100], key="history_page_size")
+
+    # 期間選択中 (片側のみ選択) は開始日のみで絞り込む
+    since = date_range[0] if date_range else None
+    until = date_range[1] if len(date_range) > 1 else None
+    total = count_history(since, until)
+    max_page = max((total - 1) // page_size + 1, 1)
+    with f3:
+        page = st.number_input("ページ", min_value=1, max_value=max_page, value=1, key="history_page")
+
+    records = load_history(since, until, page_size, (page - 1) * page_size)
+    if records:
+        status_labels = {"success": "✅ Success", "failed": "❌ Error", "running": "Running..."}
+        history_data = []
+        for r in records:
+            started = datetime.fromisoformat(r["started_at"])
+            ended = datetime.fromisoformat(r["ended_at"]) if r["ended_at"] else None
+            status_str = status_labels.get(r["status"], r["status"])
+            if r["status"] == "failed":
+                status_str = f"{status_str} ({r['error_class']}): {r['error_message']}"
+            history_data.append({
+                "Date": started.strftime('%Y-%m-%d'),
+                "Start Time": started.strftime('%H:%M:%S'),
+                "End Time": ended.strftime('%H:%M:%S') if ended else "-",
+                "Mode": "🧪 Test" if r["mode"] == "dry" else "🔴 Live",
+                "Type": r["clock_type"],
+                "Trigger": r["trigger"],
+                "Attempts": r["attempts"],
+                "Phases": ", ".join(f"{k} {v:.1f}s" for k, v in r["phases"].items()),
+                "Status": status_str,
+                "Job ID": r["job_id"],
+            })
+        st.dataframe(pd.DataFrame(history_data), use_container_width=True)
+        st.caption(f"{total} 件中 {(page - 1) * page_size + 1} - {(page - 1) * page_size + len(records)} 件")
+    else:
+        st.info("この期間の実行履歴はありません。")
+
+    # ログファイルの日別集計 (追記分のみ増分解析)
+    with st.expander("ログ集計"):
+        summary = get_log_summary(readable_log_path(log_dir))
+        rows, errors = summary.daily_rows(), summary.errors()
+        if rows:
+            st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+            if errors:
+                st.caption("直近のエラー")
+                for ts, message in errors:
+                    st.text(f"{ts}  {message}")
+        else:
+            st.info("ログデータがまだありません。")
+
+
+@st.fragment
+def render_log_detail_tab():
+    """📝 ログ詳細 タブ"""
+    st.subheader("実行ログ (詳細)")
+    log_file_path = readable_log_path(log_dir)
+    if os.path.exists(log_file_path):
+        l1, l2, l3 = st.columns([1, 2, 2])
+        with l1:
+            tail_lines = st.selectbox("行数", [200, 500, 1000], key="log_tail_lines")
+        with l2:
+            tail_levels = st.multiselect(
+                "レベル", ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"], key="log_tail_levels"
+            )
+        with l3:
+            tail_filter = st.text_input("文字列 / Job ID", key="log_tail_filter")
+
+        # 条件が変わったら最新ページに戻す
+        tail_query = (tail_lines, tuple(tail_levels), tail_filter)
+        if st.session_state.get('log_tail_query') != tail_query:
+            st.session_state['log_tail_query'] = tail_query
+            st.session_state['log_tail_pages'] = [None]
+
+        # ページ履歴: 各ページの before オフセット (None = EOF)
+        pages = st.session_state['log_tail_pages']
+        stat = os.stat(log_file_path)
+        page = load_log_page(
+            log_file_path, stat.st_size, stat.st_mtime_ns, tail_lines, pages[-1], tuple(tail_levels), tail_filter
+        )
+        st.text_area("Log Output", "\n".join(page.lines), height=400)
+        st.caption(f"ページ {len(pages)} ({len(page.lines)} 行)")
+
+        b1, b2, b3, b4 = st.columns(4)
+        if b1.button("← 古いログ", disabled=page.at_start):
+            pages.append(page.start_offset)
+            st.rerun(scope="fragment")
+        if b2.button("新しいログ →", disabled=len(pages) == 1):
+            pages.pop()
+            st.rerun(scope="fragment")
+        # 自動更新ボタン
+        if b3.button("最新の情報に更新"):
+            st.session_state['log_tail_pages'] = [None]
+            st.rerun(scope="fragment")
+        if b4.button("ログ削除 (リセット)", key="clear_logs"):
+            # テキストログと構造化ログの両方を空にする
+            for path in (f"{log_dir}/app.log", f"{log_dir}/app.jsonl"):
+                if os.path.exists(path):
+                    open(path, 'w').close()
+            st.session_state['log_tail_pages'] = [None]
+            st.rerun(scope="fragment")
+    else:
+        st.info("ログファイルなし")
+
+
+TAB_RENDERERS = {
+    "🚀 実行・予約": render_action_tab,
+    "📋 予約リスト": render_jobs_tab,
+    "📊 ログ概要": render_history_tab,
+    "📝 ログ詳細": render_log_detail_tab,
+}
+
 # ステータス表示 & メインコンテンツ制御
 if is_authenticated:
     # ログイン済みヘッダー
@@ -437,204 +949,45 @@ if is_authenticated:
         # しかし一貫性のために"ログアウト"のままにします。
         st.button("ログアウト", on_click=logout_callback, type="secondary", use_container_width=True)
     
-    # === メイン: 実行コンソール (認証済み) ===
-    tab1, tab2, tab3, tab4 = st.tabs(["🚀 実行・予約", "📋 予約リスト", "📊 ログ概要", "📝 ログ詳細"])
-
-    with tab3:
-        st.subheader("実行履歴 (概要)")
-        log_file_path = f"{log_dir}/app.log"
-        if os.path.exists(log_file_path):
-            with open(log_file_path, "r") as f:
-                lines = f.readlines()
-            
-            # ログ集約: ジョブ開始 -> ジョブ完了/失敗
-            # 可能ならスレッド/コンテキストで実行中ジョブを追跡する辞書を使うべきだが、
-            # ここでは線形実行または近接マッチングを仮定する。
-            # 簡易ロジック: "Started" を反復し、次の "Completed/Failed" と結合する
-            
-            history_data = []
-            current_job = {}
-            
-            for line in lines:
-                ts_str = line.split("[")[0].strip()
-                # ソート用にタイムスタンプをパース
-                try:
-                    ts = datetime.strptime(ts_str.split(',')[0], "%Y-%m-%d %H:%M:%S")
-                except:
-                    continue
-
-                if "Job Started" in line:
-                    # 新規エントリ
-                    # 前のジョブが未完了なら、実行中/不明としてプッシュ
-                    if current_job:
-                        history_data.append(current_job)
-                    
-                    parts = line.split("Job Started:")
-                    desc = parts[1].strip()
-                    
-                    # Mode判定
-                    if "Dry=True" in desc:
-                        mode_str = "🧪 Test"
-                    elif "Dry=False" in desc:
-                        mode_str = "🔴 Live"
-                    else:
-                        mode_str = "-"
-                    
-                    clean_desc = desc.replace(" (Dry=True)", "").replace(" (Dry=False)", "")
-                    
-                    current_job = {
-                        "Date": ts.strftime('%Y-%m-%d'),
-                        "Start Time": ts.strftime('%H:%M:%S'),
-                        "End Time": "-",
-                        "Mode": mode_str,
-                        "Detail": clean_desc,
-                        "Status": "Running..." 
-                    }
-                
-                elif "Job Completed Successfully" in line:
-                    if current_job:
-                        current_job["End Time"] = ts.strftime('%H:%M:%S')
-                        current_job["Status"] = "✅ Success"
-                        history_data.append(current_job)
-                        current_job = {} # リセット
-                
-                elif "Job Failed" in line:
-                    if current_job:
-                        parts = line.split("Job Failed:")
-                        err = parts[1].strip() if len(parts) > 1 else "Error"
-                        current_job["End Time"] = ts.strftime('%H:%M:%S')
-                        current_job["Status"] = f"❌ Error: {err}"
-                        history_data.append(current_job)
-                        current_job = {} # リセット
-
-            # まだ実行中なら最後のジョブを追加
-            if current_job:
-                 history_data.append(current_job)
-
-            if history_data:
-                # 最新を最初に表示
-                df = pd.DataFrame(history_data[::-1])
-                st.dataframe(df, use_container_width=True)
-                if st.button("ログ削除 (リセット)", key="clear_logs"):
-                    open(log_file_path, 'w').close()
-                    st.rerun()
-            else:
-                st.info("ログデータがまだありません。")
-        else:
-            st.info("ログファイルはまだ作成されていません。")
-
-    with tab4:
-        st.subheader("実行ログ (詳細)")
-        log_file_path = f"{log_dir}/app.log"
-        if os.path.exists(log_file_path):
-            with open(log_file_path, "r") as f:
-                raw_logs = f.read()
-            st.text_area("Log Output", raw_logs, height=400)
-            # 自動更新ボタン
-            if st.button("最新の情報に更新"):
-                st.rerun()
-        else:
-            st.info("ログファイルなし")
-
-    with tab1:
-        st.subheader("Action")
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            clock_type = st.radio("Type", [LBL_TYPE_IN, LBL_TYPE_OUT])
-            type_code = "in" if "IN" in clock_type else "out"
-        with col2:
-            mode = st.radio("Mode", [LBL_MODE_TEST, LBL_MODE_LIVE])
-            is_dry = "Dry" in mode
-            
-            # ヘッドレストグル
-            is_headless = st.checkbox("Headless Mode (ブラウザ非表示)", value=True)
-
-        st.subheader("Schedule")
-        # 日付/時間ロジック (安定したデフォルト)
-        # レイアウト調整: 日付と時間を等しいカラム幅に
-        dc1, dc2 = st.columns(2)
-        
-        with dc1:
-            d_val = st.date_input(LBL_DATE, date.today())
-        
-        with dc2:
-            # チェックボックスの状態に基づく時間ステップのロジック (下に配置するためにsession_state経由で処理)
-            use_minute_step_key = "use_minute_step"
-            # デフォルトはTrue (1分刻み)
-            current_step_mode = st.session_state.get(use_minute_step_key, True)
-            step_val = 60 if current_step_mode else 300
-
-            # タイプに基づいてデフォルト時間を定義
-            if type_code == "in":
-                def_t = datetime.strptime("08:55", "%H:%M").time()
-            else:
-                def_t = datetime.strptime("18:05", "%H:%M").time()
+    # 直近1時間の早期警告を表示
+    recent_alerts = [a for a in alert_buffer if a[0] >= datetime.now() - timedelta(hours=1)]
+    for ts, event, message in recent_alerts[-3:]:
+        st.warning(f"⚠️ {ts.strftime('%H:%M:%S')} {message}")
 
-            # 時間入力 (日付入力と整列)
-            t_val = st.time_input(LBL_TIME, value=def_t, step=step_val)
-            
-            st.checkbox(LBL_DETAIL, key=use_minute_step_key, value=True)
-
-        run_dt = datetime.combine(d_val, t_val)
-
-        # Actions
-        st.divider()
-        ac1, ac2 = st.columns(2)
-        
-        mp = st.session_state['master_password']
-
-        with ac1:
-            if st.button(LBL_RUN, type="primary"):
-                with st.status("実行プロセス起動...", expanded=True) as status:
-                    st.write("認証 & 同期中...")
-                    # Streamlitスレッド内で実行（UIにログが出せる利点）
-                    try:
-                        # JobServiceに委譲
-                        svc = JobService()
-                        svc.run_job(type_code, is_dry, mp, headless=is_headless)
-                            
-                        status.update(label="完了！", state="complete")
-                        st.success("成功しました")
-                    except Exception as e:
-                        status.update(label="失敗", state="error")
-                        st.error(f"{e}")
-
-        with ac2:
-            if st.button(LBL_SCHEDULE):
-                if run_dt <= datetime.now():
-                    st.error("未来の日時を指定してください")
-                else:
-                    job_id = f"{type_code}_{run_dt.strftime('%Y%m%d%H%M%S')}"
-                    job = scheduler.add_job(
-                        JobService().run_job,
-                        trigger='date',
-                        run_date=run_dt,
-                        args=[type_code, is_dry, mp, is_headless], # MP, Headlessを渡す
-                        id=job_id,
-                        name=f"{clock_type} ({mode})",
-                        misfire_grace_time=3600 # 1時間の遅延まで許容(これがないと少し過ぎただけで実行されない)
-                    )
-                    st.success(f"予約しました: {run_dt}")
-                    logging.info(f"Job Scheduled: {run_dt} id={job_id}")
-
-    with tab2:
-        st.subheader("Jobs")
-        jobs = scheduler.get_jobs()
-        if not jobs:
-            st.caption("No active jobs")
-        else:
-            for j in jobs:
-                c1, c2, c3 = st.columns([3,2,1])
-                c1.write(f"**{j.name}**")
-                c2.write(f"{j.next_run_time.strftime('%Y-%m-%d %H:%M')}")
-                if c3.button("Drop", key=j.id):
-                    j.remove()
-                    st.rerun()
-                st.divider()
+    # === メイン: 実行コンソール (認証済み) ===
+    # st.tabs は非表示のタブも毎回実行してしまうため、選択中のタブだけを描画する
+    selected_tab = st.radio(
+        "メニュー", list(TAB_RENDERERS), horizontal=True, key="main_tab", label_visibility="collapsed"
+    )
+    TAB_RENDERERS[selected_tab]()
 
 else:
     # --- 未認証状態 ---
     # トップブロックですでに処理済み
     pass
     # レイアウトシフトのアーティファクトを防ぐために st.stop() を削除
+
+# -----------------------------------------------------------------------------
+# 描画時間の計測 (フラグメント単位の再実行はここを通らない)
+# -----------------------------------------------------------------------------
+# 描画時間をログに記録する間隔 (回) と、毎回記録する遅い描画の閾値 (ミリ秒)
+RERUN_LOG_EVERY = 20
+RERUN_SLOW_MS = 1000.0
+_rerun_ms = (time.perf_counter() - _rerun_started) * 1000
+_rerun_history = st.session_state.setdefault('rerun_ms', deque(maxlen=20))
+_rerun_history.append(_rerun_ms)
+# 既定の INFO レベルで確認できるよう、セッションごとに RERUN_LOG_EVERY 回に1回 (遅い回は毎回) 記録する
+_rerun_count = st.session_state['rerun_count'] = st.session_state.get('rerun_count', 0) + 1
+if _rerun_ms >= RERUN_SLOW_MS or _rerun_count % RERUN_LOG_EVERY == 1:
+    logger.info(
+        f"Full rerun took {_rerun_ms:.1f} ms "
+        f"(avg {sum(_rerun_history) / len(_rerun_history):.1f} ms over last {len(_rerun_history)}, rerun #{_rerun_count})",
+        extra={"duration_ms": round(_rerun_ms, 1)},
+    )
+_browsers = load_browser_memory()
+_canary = get_canary().latest()
+st.caption(
+    f"描画 {_rerun_ms:.0f} ms (直近{len(_rerun_history)}回平均 {sum(_rerun_history) / len(_rerun_history):.0f} ms)"
+    f" / ブラウザ {_browsers.browsers} 個 ({_browsers.rss_mb:.0f} MB)"
+    + (f" / 事前チェック {_canary.checked_at.strftime('%m/%d %H:%M')} {_canary.summary()}" if _canary else "")
+)
@@ -0,0 +1,69 @@
+"""
+Web UI の事前起動 (warm start) エントリーポイント
+
+`streamlit run app.py` と同じサーバーを起動しつつ、最初のブラウザ接続を待たずに
+スケジューラ・JobRunner・制御 API・残存ブラウザの回収の起動、重いモジュール (pandas, selenium) の import、
+Bitwarden CLI の状態確認をバックグラウンドで済ませます。
+app.py はこれらのプロセス共有インスタンスをそのまま使うため、初回表示が速くなります。
+
+Usage:
+    PYTHONPATH=. python src/interfaces/web/warm_start.py --server.headless true
+"""
+import logging
+import os
+import sys
+import threading
+import time
+
+from src.config import settings as config
+from src.core.logger import setup_logging
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+logger = logging.getLogger(__name__)
+
+
+def prewarm() -> None:
+    """スケジューラ・API・重いモジュール・保管庫を事前に準備します (失敗してもサーバーは起動を続けます)"""
+    started = time.perf_counter()
+    try:
+        from src.core import metrics
+        from src.core.browser_registry import ensure_reaper
+        from src.core.services.job_runner import get_job_runner
+        from src.core.services.schedule_service import ScheduleService, get_scheduler
+
+        scheduler = get_scheduler()
+        get_job_runner()
+        ensure_reaper()
+        metrics.ensure_textfile_writer("web")
+        if config.API_ENABLED:
+            from src.interfaces.api.server import ensure_api_server
+            ensure_api_server(ScheduleService(scheduler))
+
+        # 初回の「今すぐ実行」・ログ概要タブで読み込まれるモジュール
+        import pandas  # noqa: F401
+        from src.core.services.job_service import JobService  # noqa: F401
+
+        # 保管庫: 認証キャッシュがなければ bw を1度起動しておく (Node.js の起動コストを先に払う)
+        from src.core.credentials import CredentialManager
+        if not CredentialManager().is_cached(config.BITWARDEN_ITEM_NAME):
+            from src.core.bitwarden import BitwardenClient
+            logger.info(f"Vault status: {BitwardenClient().get_status()}")
+    except Exception as e:
+        logger.warning(f"Prewarm incomplete: {e}")
+    logger.info("Prewarm finished", extra={"duration_ms": round((time.perf_counter() - started) * 1000, 1)})
+
+
+def main() -> None:
+    setup_logging("app")
+    threading.Thread(target=prewarm, name="prewarm", daemon=True).start()
+
+    # streamlit の CLI をこのプロセス内で実行する (プロセス共有のシングルトンを app.py と共有するため)
+    from streamlit.web import cli as stcli
+
+    sys.argv = ["streamlit", "run", APP_PATH, *sys.argv[1:]]
+    sys.exit(stcli.main())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+import 時間プロファイル
+
+`python -X importtime` を別プロセスで実行し、モジュールごとの import コストを集計します。
+計測対象のモジュールがすでに読み込まれた現在のプロセスではなく、新しいインタプリタで計測します。
+"""
+import os
+import subprocess
+import sys
+from dataclasses import dataclass
+from typing import List, Optional
+
+# 'import time: self [us] | cumulative | imported package' 形式の1行
+_PREFIX = "import time:"
+
+
+@dataclass
+class ImportCost:
+    """
+    Attributes:
+        module (str): モジュール名
+        self_us (int): そのモジュール自身の実行時間 (マイクロ秒)
+        cumulative_us (int): 依存モジュールを含む時間 (マイクロ秒)
+        depth (int): import のネスト深さ (0 = 直接 import したもの)
+    """
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(stderr: str) -> List[ImportCost]:
+    """-X importtime の出力を解析します"""
+    costs: List[ImportCost] = []
+    for line in stderr.splitlines():
+        if not line.startswith(_PREFIX):
+            continue
+        fields = line[len(_PREFIX):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # ヘッダー行
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        costs.append(ImportCost(name.strip(), int(fields[0]), int(fields[1]), depth))
+    return costs
+
+
+def profile_imports(module: str, cwd: Optional[str] = None) -> List[ImportCost]:
+    """
+    新しいインタプリタで module を import し、モジュールごとのコストを返します。
+
+    Raises:
+        RuntimeError: import に失敗した場合
+    """
+    env = dict(os.environ)
+    root = cwd or os.getcwd()
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=root, env=env,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{module} の import に失敗しました:\n{result.stderr.strip().splitlines()[-1]}")
+    return parse_importtime(result.stderr)
+
+
+def format_report(costs: List[ImportCost], top: int = 20) -> str:
+    """
+    上位のトップレベルパッケージ (cumulative 順) と、自身のコストが大きいモジュールを表形式で返します。
+    """
+    total = sum(c.cumulative_us for c in costs if c.depth == 0)
+    lines = [f"Total import time: {total / 1000:.1f} ms ({len(costs)} modules)", ""]
+
+    lines.append(f"{'cumulative [ms]':>16} {'self [ms]':>10}  package")
+    for c in sorted((c for c in costs if c.depth == 0), key=lambda c: c.cumulative_us, reverse=True)[:top]:
+        lines.append(f"{c.cumulative_us / 1000:>16.1f} {c.self_us / 1000:>10.1f}  {c.module}")
+
+    lines += ["", f"{'self [ms]':>16}  module (heaviest own cost)"]
+    for c in sorted(costs, key=lambda c: c.self_us, reverse=True)[:top]:
+        lines.append(f"{c.self_us / 1000:>16.1f}  {c.module}")
+    return "\n".join(lines)
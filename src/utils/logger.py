@@ -1,34 +1,18 @@
 import logging
 import os
-import sys
+
+from src.core.logger import setup_logging
+
 
 def setup_logger(name: str, log_file: str = None, level: int = logging.INFO) -> logging.Logger:
     """
     ロガーをセットアップして返します。
-    コンソール出力とファイル出力（オプション）を設定します。
-    """
-    logger = logging.getLogger(name)
-    logger.setLevel(level)
-    
-    # 既存のハンドラがある場合は追加しない（重複防止）
-    if logger.handlers:
-        return logger
+    コンソール出力とファイル出力を設定します。
 
-    formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
-
-    # Console Handler
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
-
-    # File Handler
+    互換用のラッパーです。実体は src.core.logger.setup_logging (キュー経由・ローテーション付き) で、
+    log_file を省略した場合は logs/app.log に出力します。
+    """
     if log_file:
-        log_dir = os.path.dirname(log_file)
-        if log_dir and not os.path.exists(log_dir):
-            os.makedirs(log_dir, exist_ok=True)
-            
-        file_handler = logging.FileHandler(log_file, encoding='utf-8')
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-        
-    return logger
+        log_dir, file_name = os.path.split(log_file)
+        return setup_logging(name, log_file=file_name, log_dir=log_dir or ".", level=level)
+    return setup_logging(name, level=level)